@@ -1,78 +1,75 @@
+import sys
+sys.path.insert(0, ".")  # run from the repo root so the shared `pipeline` helpers import
+
 import rasterio
 import numpy as np
-import matplotlib.pyplot as plt
-from rasterio.enums import Resampling
 from matplotlib import colors
 
-# Load DEM
-dem_path = "1-DEM//dem_irl_itm-1.tif"
-
-with rasterio.open(dem_path) as src:
-    print("CRS:", src.crs)  # Expected: EPSG:2157
-    dem = src.read(1)
-    transform = src.transform
-    profile = src.profile
-
-# Calculate gradients in x and y directions
-x, y = np.gradient(dem, transform.a, transform.e)
-
-# Slope in degrees
-slope = np.degrees(np.arctan(np.sqrt(x**2 + y**2)))
-
-# Aspect in degrees: 0=N, 90=E, 180=S, 270=W
-aspect = np.degrees(np.arctan2(-x, y))
-aspect = np.mod(aspect + 360, 360)  # Normalize between 0-360
-
-
-# Use PowerNorm to emphasize lower values
-norm = colors.PowerNorm(gamma=0.4)  # try gamma between 0.3 - 0.6
-
-plt.figure(figsize=(10, 6))
-plt.imshow(masked_dem, cmap="terrain", norm=norm)
-plt.colorbar(label="Elevation (m)")
-plt.title("Original Digital Elevation Model")
-plt.axis("off")  # Turns off x/y axis lines and ticks
-plt.show()
-
-
-
-# Create masks
-south_facing = (aspect >= 135) & (aspect <= 225)
-flat_land = slope < 5
-non_sea_level = dem > 0
+from pipeline import instrument, plots
+from pipeline.raster import iter_windows, read_with_halo, read_overview, block_profile
+from pipeline.terrain import terrain_mask
 
-# Combine masks
-desired_mask = (flat_land | south_facing) & non_sea_level
+instrument.enable()
 
-# Create binary output: 1 = yes, 0 = no
-binary_filtered = np.where(desired_mask, 1, 0).astype(np.uint8)
-
-
-# Visualize the binary mask
-plt.figure(figsize=(10, 6))
-plt.imshow(binary_filtered, cmap="gray")
-plt.colorbar(label="1 = Yes, 0 = No")
-plt.title("South-facing Slopes or Flat Land Indicator")
-plt.axis("off")  # Turns off x/y axis lines and ticks
-plt.show()
+# Load DEM
+dem_path = "1-DEM//dem_irl_itm-1.tif"
 
 # Define output path
 output_path = "1-DEM//binary_filtered_dem.tif"
 
-# Update profile for binary output
-profile.update(
-    dtype=rasterio.uint8,
-    nodata=None,
-)
+# Rows/cols per processing tile. Peak memory scales with this, not with the DEM,
+# so the 10 m LiDAR DEM runs in the same footprint as the coarse one.
+# Set to None to process the whole DEM as a single tile.
+tile_size = 2048
 
-# Write the binary raster
-with rasterio.open(output_path, 'w', **profile) as dst:
+# Suitable terrain: flatter than max_slope degrees, or facing within aspect_range
+# (degrees clockwise from north, 135-225 = south-facing)
+max_slope = 5
+aspect_range = (135, 225)
+
+with rasterio.open(dem_path) as src:
     print("CRS:", src.crs)  # Expected: EPSG:2157
-    dst.write(binary_filtered, 1)
+    transform = src.transform
+    profile = src.profile
+    overview = read_overview(src) if plots.enabled() else None
+
+    if tile_size is None:
+        tile_size = max(src.width, src.height)
+
+    # Update profile for binary output
+    profile = block_profile(
+        profile,
+        tile_size,
+        dtype=rasterio.uint8,
+        nodata=None,
+    )
+
+    # Write the binary raster tile by tile
+    with instrument.step("terrain mask"), rasterio.open(output_path, 'w', **profile) as dst:
+        print("CRS:", dst.crs)  # Expected: EPSG:2157
+        for window in iter_windows(src.width, src.height, tile_size):
+            # One-pixel halo keeps np.gradient's central differences correct at tile seams
+            block, inner = read_with_halo(src, window, halo=1)
+
+            # (slope < 5 | south-facing) & above sea level, without any trig calls
+            desired_mask = terrain_mask(block, transform.a, transform.e, max_slope, aspect_range)
+
+            # Create binary output: 1 = yes, 0 = no
+            binary_filtered = desired_mask[inner].view(np.uint8)
+            dst.write(binary_filtered, 1, window=window)
+            instrument.count(tiles=1, pixels=binary_filtered.size)
+    instrument.read(dem_path, pixels=src.width * src.height)
+    instrument.wrote(output_path, pixels=src.width * src.height)
 
 print(f"Binary Filtered DEM saved to {output_path}")
 
 
+# Use PowerNorm to emphasize lower values
+norm = colors.PowerNorm(gamma=0.4)  # try gamma between 0.3 - 0.6
+if plots.enabled():
+    masked_dem = np.ma.masked_less_equal(overview, 0)  # hide the sea
+    plots.image(masked_dem, "Original Digital Elevation Model", figsize=(10, 6),
+                cmap="terrain", norm=norm, colorbar="Elevation (m)")
 
 
 
@@ -80,18 +77,23 @@ print(f"Binary Filtered DEM saved to {output_path}")
 # Reimport the saved binary raster
 reimport_path = "1-DEM//binary_filtered_dem.tif"
 
-with rasterio.open(reimport_path) as reimp_src:
-    reimp_data = reimp_src.read(1)
-    reimp_transform = reimp_src.transform
-    reimp_crs = reimp_src.crs
+# Count values tile by tile so the check stays within the same memory budget
+counts = np.zeros(256, dtype=np.int64)
+with instrument.step("check"):
+    with rasterio.open(reimport_path) as reimp_src:
+        reimp_crs = reimp_src.crs
+        for window in iter_windows(reimp_src.width, reimp_src.height, tile_size):
+            counts += np.bincount(reimp_src.read(1, window=window).ravel(), minlength=256)
+        reimp_data = read_overview(reimp_src) if plots.enabled() else None
+    instrument.count(suitable_pixels=counts[1])
 
 # Print CRS and unique values for sanity check
 print("Reimported Raster CRS:", reimp_crs)
 
 
 # Get unique values and counts
-unique_vals, counts = np.unique(reimp_data, return_counts=True)
-for val, count in zip(unique_vals, counts):
+for val in np.flatnonzero(counts):
+    count = counts[val]
     if val == 1:
         label = "Suitable (1)"
     elif val == 0:
@@ -102,9 +104,5 @@ for val, count in zip(unique_vals, counts):
 
 
 # Visualize reimported binary raster
-plt.figure(figsize=(10, 6))
-plt.imshow(reimp_data, cmap="gray_r", vmin=0, vmax=1)
-plt.colorbar(label="1 = Suitable, 0 = Unsuitable")
-plt.title("Reimported Binary Filtered DEM (Black = Suitable)")
-plt.show()
-
+plots.image(reimp_data, "Reimported Binary Filtered DEM (Black = Suitable)", figsize=(10, 6),
+            cmap="gray_r", vmin=0, vmax=1, colorbar="1 = Suitable, 0 = Unsuitable", axis_off=False)
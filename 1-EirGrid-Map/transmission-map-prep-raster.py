@@ -1,70 +1,48 @@
 # --- Step 1: Import Required Libraries ---
+import sys
+sys.path.insert(0, ".")  # run from the repo root so the shared `pipeline` helpers import
+
+import time
+
 import rasterio
 from rasterio.plot import reshape_as_image, reshape_as_raster
 from rasterio.transform import xy
-from shapely.geometry import LineString
+import shapely
 import cv2
 import numpy as np
-import matplotlib.pyplot as plt
-import pytesseract
-from pytesseract import Output
-import pandas as pd
 import geopandas as gpd
 
+from pipeline import instrument, plots
+from pipeline.centreline import mask_to_centrelines
+from pipeline.colour import blank_boxes, classify, ink_lut
+from pipeline.ocr import find_text, text_boxes
+from pipeline.vectorize import contours_to_lines
+from pipeline.vectors import write_layer
+
+instrument.enable()
+
 # --- Step 2: Helper Functions ---
 def plot_image(image, title, figsize=(10, 8)):
-    plt.figure(figsize=figsize)
-    plt.imshow(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-    plt.title(title)
-    plt.axis("off")
-    plt.show()
-
-def plot_geometries(gdf, title="Geometries"):
-    gdf.plot(figsize=(10, 8), edgecolor='black')
-    plt.title(title)
-    plt.axis("equal")
-    plt.show()
-
-def create_exclusion_mask(image, manual_excludes):
-    exclude_mask = np.zeros(image.shape[:2], dtype=np.uint8)
-    for (x1, y1), (x2, y2) in manual_excludes:
-        cv2.rectangle(exclude_mask, (x1, y1), (x2, y2), 255, -1)
-    return exclude_mask
-
-def apply_exclusion_mask(image, exclude_mask):
-    image_with_exclusions = image.copy()
-    image_with_exclusions[exclude_mask == 255] = (255, 255, 255)
-    return image_with_exclusions
-
-def extract_color_regions(image, hsv_image, color_ranges):
-    combined_result = np.full_like(image, 255)
-    for color, ranges in color_ranges.items():
-        mask_total = None
-        for lower, upper in ranges:
-            mask = cv2.inRange(hsv_image, lower, upper)
-            mask_total = mask if mask_total is None else cv2.bitwise_or(mask_total, mask)
-        result = np.where(mask_total[:, :, np.newaxis] == 255, image, combined_result)
-        combined_result = result
-    return combined_result
-
-def remove_text(image, df_filtered):
-    text_mask = np.zeros(image.shape[:2], dtype=np.uint8)
-    for i in df_filtered.index:
-        x, y, w, h = df_filtered.loc[i, 'left'], df_filtered.loc[i, 'top'], df_filtered.loc[i, 'width'], df_filtered.loc[i, 'height']
-        cv2.rectangle(text_mask, (x, y), (x + w, y + h), 255, -1)
-    image_without_text = image.copy()
-    image_without_text[text_mask == 255] = (255, 255, 255)
-    return image_without_text
+    plots.image(image, title, figsize=figsize, bgr=True, cmap="gray" if image.ndim == 2 else None)
+
+def plot_mask(mask, title):
+    # Ink black on white; only built when the plot is actually made
+    if plots.enabled():
+        plot_image(255 - mask, title)
+
+def plot_geometries(gdf, title="Geometries", source=None):
+    plots.vector(gdf, title, source=source, edgecolor='black', equal=True)
 
 # --- Step 3: Load Raster Image ---
 raster_path = "1-EirGrid-Map/EirGridMap-raster/EirGridMap.tif"
-with rasterio.open(raster_path) as src:
+with instrument.step("read"), rasterio.open(raster_path) as src:
     raster_meta = src.meta.copy()
     crs = src.crs
     transform = src.transform
     bounds = src.bounds
     img_array = src.read()
     img = reshape_as_image(img_array)
+instrument.read(raster_path, pixels=img.shape[0] * img.shape[1])
 
 plot_image(img, "Original Image")
 
@@ -83,15 +61,13 @@ manual_excludes = [
     ((4645, 1068),  (5251, 1719)),  #Belfast Box   
 ]
 
-# Apply Manual Exclusions
-exclude_mask = create_exclusion_mask(img, manual_excludes)
-img_with_exclusions = apply_exclusion_mask(img, exclude_mask)
-
 # --- Plot: Image with Manual Exclusions Applied ---
-plot_image(img_with_exclusions, "Map with Manual Exclusions")
-
-# Convert Image to HSV
-hsv = cv2.cvtColor(img_with_exclusions, cv2.COLOR_BGR2HSV)
+if plots.enabled():
+    img_with_exclusions = img.copy()
+    for (x1, y1), (x2, y2) in manual_excludes:
+        cv2.rectangle(img_with_exclusions, (x1, y1), (x2, y2), (255, 255, 255), -1)
+    plot_image(img_with_exclusions, "Map with Manual Exclusions")
+    del img_with_exclusions
 
 # Define Color Ranges for Extraction
 color_ranges = {
@@ -105,58 +81,45 @@ color_ranges = {
     ]
 }
 
-# Extract Color Regions
-detected_img = extract_color_regions(img_with_exclusions, hsv, color_ranges)
-
-# --- Plot: Detected Color Regions ---
-plot_image(detected_img, "Detected Colors")
-
-# Create a copy of the detected image
-non_white_to_black = detected_img.copy()
-
 # Define the RGB threshold for "white" (tweak if needed)
 threshold = 240
 
-# Create a new image where non-white pixels become black
-bw_mask = np.where(np.all(non_white_to_black >= threshold, axis=-1, keepdims=True),
-                   [255, 255, 255],
-                   [0, 0, 0]).astype(np.uint8)
-
-# --- Plot: Image with Non-White Pixels Converted to Black ---
-plot_image(bw_mask, "Black/White Mask")
-
-# --- Step 7: Text Removal ---
-rgb = cv2.cvtColor(bw_mask, cv2.COLOR_BGR2RGB)
-custom_config = r'--psm 6'  # Assume a single uniform block of text
-data = pytesseract.image_to_data(rgb, output_type=Output.DICT, config=custom_config)
-df = pd.DataFrame(data)
-df['text'] = df['text'].str.strip()
-df_filtered = df[(df['text'] != '') & (df['conf'] > 1) & (df['text'].str.len() > 2)] # Filter out empty text and low confidence
-
-# Remove Text from Image
-first_text_removal = remove_text(bw_mask, df_filtered)
-
-# --- Plot: Final Image (Text Removed) ---
-plot_image(first_text_removal, "First Round of Text Removed")
+# Classify every pixel in one pass: a colour is line ink when it falls in one of
+# the ranges and isn't near-white, looked up in a table built once for all
+# 2**24 colours. The exclusions are blanked straight in the uint8 mask
+# (255 = ink), so no full-size copies of the RGB image are made.
+with instrument.step("classify"):
+    lut = ink_lut(color_ranges["selected_colors"], white_threshold=threshold)
+    line_mask = classify(img, lut, excludes=manual_excludes)
+    instrument.count(pixels_in=line_mask.size, ink_pixels=np.count_nonzero(line_mask))
 
+# --- Plot: Detected Color Regions ---
+if plots.enabled():
+    plot_image(np.where(line_mask[..., np.newaxis] == 255, img, 255).astype(np.uint8), "Detected Colors")
 
+# --- Plot: Black/White Mask (non-white pixels black) ---
+plot_mask(line_mask, "Black/White Mask")
 
-# Extract Text Data from Image (for removal)
-rgb2 = cv2.cvtColor(first_text_removal, cv2.COLOR_BGR2RGB)
+# --- Step 7: Text Removal ---
+# OCR only the letter-sized blobs of the mask, as padded crops in parallel, in
+# up to two passes (the second over what the first didn't remove), stopping
+# early when a pass finds nothing new
 custom_config = r'--psm 6'  # Assume a single uniform block of text
-data2 = pytesseract.image_to_data(rgb2, output_type=Output.DICT, config=custom_config)
-df2 = pd.DataFrame(data2)
-df2['text'] = df2['text'].str.strip()
-df_filtered2 = df2[(df2['text'] != '') & (df2['conf'] > 1) & (df2['text'].str.len() > 2)]
+with instrument.step("ocr"):
+    df_filtered = find_text(255 - line_mask, config=custom_config, max_passes=2)
+    print(f"Found {len(df_filtered)} text boxes")
 
-# Remove Text from Image
-text_removed_2 = remove_text(first_text_removal, df_filtered2)
+    # Remove Text from the mask, in place
+    blank_boxes(line_mask, text_boxes(df_filtered))
+    instrument.count(text_boxes=len(df_filtered), ink_pixels=np.count_nonzero(line_mask))
 
 # --- Plot: Final Image (Text Removed) ---
-plot_image(text_removed_2, "Text Removed")
+plot_mask(line_mask, "Text Removed")
 
 
 # --- Step 7b Manual Exclusions ---
+# Labels the OCR still misses (mostly text touching a line, which merges it
+# into one large blob)
 manual_text_excludes = [
     ((2075, 4678),  (2224, 4732)),   #Dromada
     ((1740, 4606),  (1860, 4648)),   #Drombeg
@@ -186,64 +149,83 @@ manual_text_excludes = [
 ]
 
 # Apply Manual Exclusions
-text_exclude_mask = create_exclusion_mask(text_removed_2, manual_text_excludes)
-text_removed_3 = apply_exclusion_mask(text_removed_2, text_exclude_mask)
+blank_boxes(line_mask, manual_text_excludes)
 
 
 # --- Plot: Image with Manual Exclusions Applied ---
-plot_image(text_removed_3, "Final Text Exclusions")
+plot_mask(line_mask, "Final Text Exclusions")
 
 
 
-# --- Step 8: Contour Detection ---
-gray = cv2.cvtColor(text_removed_3, cv2.COLOR_BGR2GRAY)
-_, binary = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY_INV)
+# --- Step 8: Line Tracing ---
+# The mask is already the inverted binary image (255 = line)
+binary = line_mask
 
 # DEBUG: Plot the binary image after thresholding
-plot_image(cv2.cvtColor(binary, cv2.COLOR_GRAY2BGR), "Binary Image for Contour Detection")
+plot_image(binary, "Binary Image for Line Tracing")
+
+# "centreline" thins the mask to a skeleton and traces it as one network of
+# lines between junctions; "contour" traces the outline of every drawn line
+# (a closed loop around both edges, about twice the vertices)
+line_mode = "centreline"
+compare_line_modes = False  # also run the other mode and print both timings
+
+# Douglas-Peucker tolerance for the traced lines, in map pixels (topology is
+# preserved); None keeps every traced vertex
+simplify_pixels = 1
+# Centreline branches with a free end shorter than this (map pixels) are
+# thinning spurs or anti-aliasing specks, and are dropped
+spur_pixels = 10
 
+pixel_size = abs(transform.a)
+tolerance = simplify_pixels * pixel_size if simplify_pixels else None
 
-contours, _ = cv2.findContours(binary, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
 
-print(f"Found {len(contours)} contours")
+def trace_contours():
+    contours, _ = cv2.findContours(binary, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    print(f"Found {len(contours)} contours")
 
+    if plots.enabled():
+        # Create a blank white canvas same size as input
+        polyline_image = np.full_like(img, 255)
 
-# Create a blank white canvas same size as input
-polyline_image = np.full_like(text_removed_3 , 255)
+        # Draw polylines (contours)
+        cv2.drawContours(polyline_image, contours, -1, (0, 0, 255), 2)  # color=black, thickness=1
 
-# Draw polylines (contours)
-cv2.drawContours(polyline_image, contours, -1, (0, 0, 255), 2)  # color=black, thickness=1
+        plot_image(polyline_image, "Detected Polylines")
 
-plot_image(polyline_image, "Detected Polylines")
+    # Georeference every contour vertex in one affine product and build all
+    # the lines with shapely's array constructors
+    return contours_to_lines(contours, transform, tolerance=tolerance)
 
 
-def pixel_to_coords(transform, row, col):
-    x, y = rasterio.transform.xy(transform, row, col)
-    return (x, y)
+def trace_centrelines():
+    return mask_to_centrelines(binary, transform, min_spur_length=spur_pixels * pixel_size, tolerance=tolerance)
 
-geometry_list = []
-for contour in contours:
-    coords = contour.squeeze()
-    if coords.ndim != 2 or coords.shape[0] < 2:
-        continue
-    try:
-        spatial_coords = [pixel_to_coords(transform, int(pt[1]), int(pt[0])) for pt in coords]
-        line = LineString(spatial_coords)
-        if line.is_valid:
-            geometry_list.append(line)
-    except Exception as e:
-        print(f"Error creating line: {e}")
 
+tracers = {"contour": trace_contours, "centreline": trace_centrelines}
+for mode in sorted(tracers, key=lambda m: m != line_mode)[:2 if compare_line_modes else 1]:
+    start = time.perf_counter()
+    with instrument.step(f"trace {mode}"):
+        lines = tracers[mode]()
+        instrument.count(lines=len(lines), vertices=shapely.get_num_coordinates(lines).sum())
+    print(f"{mode}: {len(lines)} lines with {shapely.get_num_coordinates(lines).sum()} vertices "
+          f"in {time.perf_counter() - start:.1f} s")
+    if mode == line_mode:
+        geometry_list = lines
 
-output_shapefile = "1-EirGrid-Map/Shp_File/transmission_map_lines.shp"
+output_path = "1-EirGrid-Map/transmission_map_lines.parquet"
+output_shapefile = "1-EirGrid-Map/Shp_File/transmission_map_lines.shp"  # SOLAR_EXPORT_SHP=1 only
 
 # Create GeoDataFrame
 
-if geometry_list:
+if len(geometry_list):
     gdf = gpd.GeoDataFrame(geometry=geometry_list, crs=crs)
-    gdf.to_file(output_shapefile)
-    print(f"Shapefile with polylines saved to: {output_shapefile}")
-    plot_geometries(gdf, title="Extracted Line Geometries")
+    with instrument.step("write"):
+        write_layer(gdf, output_path, shapefile=output_shapefile)
+    instrument.wrote(output_path, features=len(gdf))
+    print(f"Polylines saved to: {output_path}")
+    plot_geometries(gdf, title="Extracted Line Geometries", source=output_path)
 else:
     print("No valid polylines were generated.")
 
@@ -1,28 +1,51 @@
-import geopandas as gpd
-import matplotlib.pyplot as plt
-import textwrap
-
-# Replace with your actual file path
-shapefile_path = "1-Land-Cover//CLC18_IE//CLC18_IE.shp"
-land_cover = gpd.read_file(shapefile_path)
+import sys
+sys.path.insert(0, ".")  # run from the repo root so the shared `pipeline` helpers import
 
-land_cover.plot(
-    figsize=(10, 10),
-    column='Class_Desc',
-    legend=True,
-    legend_kwds={'loc': 'upper left', 'bbox_to_anchor': (1.05, 1)}  # moves legend outside
-)
+import pyogrio
+import textwrap
+from rasterio.warp import transform_bounds
 
-plt.title("Land Cover Types")
-plt.tight_layout()  # adjusts layout to avoid clipping
-plt.show()
+from pipeline import instrument, plots
+from pipeline.shards import CRS, land_cover_key, land_cover_task, make_shards, merge_frames, run_sharded
+from pipeline.vectors import read_source, sql_in, write_layer
 
-# Take a peek at the data
-print(land_cover.head())
-print(land_cover.crs)  # Check the coordinate reference system
+instrument.enable()
 
+# Replace with your actual file path
+shapefile_path = "1-Land-Cover//CLC18_IE//CLC18_IE.shp"
 
-land_cover['Class_Desc'].value_counts()
+# Side length of the square shards processed in parallel (metres, EPSG:2157);
+# None processes the whole island in one piece
+shard_size = 25000
+workers = None  # default: one per core
+
+# CORINE attribute holding the class names matched against `suitable_types`
+class_column = "Class_Desc"
+# Attributes kept in the output (the geometry always is)
+columns = ["Code_18", class_column]
+
+if plots.enabled():
+    # Only the overview plot needs every polygon in memory at once, and only
+    # the class names
+    with instrument.step("read overview"):
+        land_cover = read_source(shapefile_path, columns=[class_column])
+
+    plots.vector(
+        land_cover,
+        "Land Cover Types",
+        figsize=(10, 10),
+        source=shapefile_path,
+        column=class_column,
+        legend=True,
+        legend_kwds={'loc': 'upper left', 'bbox_to_anchor': (1.05, 1)},  # moves legend outside
+        tight=True,  # adjusts layout to avoid clipping
+    )
+
+    # Take a peek at the data
+    print(land_cover.head())
+    print(land_cover.crs)  # Check the coordinate reference system
+
+    print(land_cover[class_column].value_counts())
 
 # Updated list of suitable land types (excludes mineral extraction sites)
 suitable_types = [
@@ -35,8 +58,21 @@ suitable_types = [
     "Dump sites"
 ]
 
-# Filter the GeoDataFrame
-suitable_land = land_cover[land_cover['Class_Desc'].isin(suitable_types)]
+# Filter the shards in parallel. The class filter, the shard's bbox and the
+# column selection are pushed down into the reader, so each shard only builds
+# (and reprojects to EPSG:2157) the suitable polygons in its bbox, then keeps
+# the ones it owns
+where = sql_in(class_column, suitable_types)
+info = pyogrio.read_info(shapefile_path, force_total_bounds=True)
+bounds = transform_bounds(info["crs"], CRS, *info["total_bounds"], densify_pts=21)
+shards = make_shards(bounds, shard_size)
+print(f"Filtering land cover in {len(shards)} shards")
+with instrument.step("filter shards"):
+    suitable_land = merge_frames(
+        run_sharded(land_cover_task, shards, shapefile_path, where, columns, workers=workers, key=land_cover_key), crs=CRS
+    )
+    instrument.count(shards=len(shards), features_in=info["features"], features_out=len(suitable_land))
+instrument.read(shapefile_path, features=info["features"])
 
 
 
@@ -44,33 +80,31 @@ suitable_land = land_cover[land_cover['Class_Desc'].isin(suitable_types)]
 wrap_width = 25
 
 # Manually wrap the class descriptions
-suitable_land = suitable_land.copy()
-suitable_land['Wrapped_Class_Desc'] = suitable_land['Class_Desc'].apply(
+suitable_land['Wrapped_Class_Desc'] = suitable_land[class_column].apply(
     lambda x: '\n'.join(textwrap.wrap(x, wrap_width))
 )
 
-# Plot using the wrapped column
-fig, ax = plt.subplots(figsize=(10, 10))
-
-suitable_land.plot(
-    ax=ax,
+# Save the reprojected (EPSG:2157, Irish Transverse Mercator) data as
+# GeoParquet (and optionally the old shapefile)
+output_path = "1-Land-Cover/suitable_land.parquet"
+with instrument.step("write"):
+    write_layer(suitable_land, output_path, shapefile="1-Land-Cover/Shp_File/suitable_land.shp")
+instrument.wrote(output_path, features=len(suitable_land))
+
+# Plot using the wrapped column (after saving, so the simplified preview is
+# cached against the new file)
+plots.vector(
+    suitable_land,
+    "Suitable Land Types for Solar Farms",
+    figsize=(10, 10),
+    source=output_path,
     column='Wrapped_Class_Desc',
     legend=True,
     legend_kwds={
         'loc': 'upper left',
         'bbox_to_anchor': (1.05, 1),
         'frameon': False
-    }
+    },
+    axis_off=True,
+    tight=True,
 )
-
-ax.set_title("Suitable Land Types for Solar Farms")
-ax.set_axis_off()
-plt.tight_layout()
-plt.show()
-
-
-# Reproject suitable land to EPSG:2157 (Irish Transverse Mercator)
-suitable_land_2157 = suitable_land.to_crs(epsg=2157)
-
-# Save the reprojected data as a new shapefile
-suitable_land_2157.to_file("1-Land-Cover//Shp_File/suitable_land.shp")
\ No newline at end of file
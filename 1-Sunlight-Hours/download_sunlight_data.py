@@ -0,0 +1,39 @@
+import sys
+sys.path.insert(0, ".")  # run from the repo root so the shared `pipeline` helpers import
+
+from pipeline import instrument
+from pipeline.downloads import cds_retrieve, extract
+
+instrument.enable()
+
+# Download dataset
+# Kept separate from prep_sunlight_hours_data.py so that changing the processing
+# never re-queues this request with the CDS. Each year is requested and cached
+# on its own (see pipeline.downloads), so extending `years` only queues the
+# new years, and re-runs start straight away.
+years = range(1991, 2021)  # the 1991-2020 climate normal
+months = range(1, 13)
+
+dataset = "sis-energy-pecd"
+request = {
+    "pecd_version": "pecd4_1",
+    "temporal_period": ["historical"],
+    "origin": ["era5_reanalysis"],
+    "variable": ["solar_generation_capacity_factor"],
+    "spatial_resolution": ["0_25_degree"],
+    "year": [str(year) for year in years],
+    "month": [f"{month:02d}" for month in months],
+    "area": [55.5, -10.5, 51, -5.5]
+}
+
+with instrument.step("download"):
+    zip_paths = cds_retrieve(dataset, request)
+for path in zip_paths:
+    instrument.read(path)
+
+# Unzip the files (only those not already extracted)
+with instrument.step("extract"):
+    extracted = extract(zip_paths, "1-Sunlight-Hours//ireland_solar")
+    instrument.count(files_out=extracted)
+instrument.wrote("1-Sunlight-Hours//ireland_solar")
+print(f"Extracted {extracted} new files from {len(zip_paths)} yearly downloads")
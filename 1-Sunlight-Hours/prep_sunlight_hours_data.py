@@ -1,36 +1,21 @@
-import cdsapi
+import sys
+sys.path.insert(0, ".")  # run from the repo root so the shared `pipeline` helpers import
+
 import os
-import zipfile
-import xarray as xr
 from glob import glob
-import pandas as pd
 import seaborn as sns
-import matplotlib.pyplot as plt
 import geopandas as gpd
 import numpy as np
 import rasterio
 from rasterio.warp import calculate_default_transform, reproject, Resampling
 import calendar
 
-# Download dataset
-dataset = "sis-energy-pecd"
-request = {
-    "pecd_version": "pecd4_1",
-    "temporal_period": ["historical"],
-    "origin": ["era5_reanalysis"],
-    "variable": ["solar_generation_capacity_factor"],
-    "spatial_resolution": ["0_25_degree"],
-    "year": ["2020", "2021"],
-    "month": ["01", "04", "07", "10"],
-    "area": [55.5, -10.5, 51, -5.5]
-}
-
-client = cdsapi.Client()
-client.retrieve(dataset, request, '1-Sunlight-Hours//ireland_solar.zip')
-
-# Unzip the file
-with zipfile.ZipFile("1-Sunlight-Hours//ireland_solar.zip", 'r') as zip_ref:
-    zip_ref.extractall("1-Sunlight-Hours//ireland_solar")
+from pipeline import instrument, plots
+from pipeline.climatology import Climatology
+from pipeline.raster import block_profile
+from pipeline.downloads import cached_url
+
+instrument.enable()
 
 folder = "1-Sunlight-Hours//ireland_solar"
 
@@ -39,68 +24,57 @@ nc_files = sorted(glob(os.path.join(folder, "*.nc")))
 
 print(f"Found {len(nc_files)} NetCDF files.")
 
-# Loop through each .nc file
-datasets = []
-for f in nc_files:
-    ds = xr.open_dataset(f)
-    
-    # Extract variables assuming 'spv_cf' is solar capacity factor
-    df = ds[['spv_cf', 'latitude', 'longitude', 'time']].to_dataframe().reset_index()
-    datasets.append(df)
-
-# Concatenate all DataFrames together
-final_df = pd.concat(datasets, ignore_index=True)
-
-# Ensure 'time' is datetime
-final_df['time'] = pd.to_datetime(final_df['time'])
-
-# Extract Year and Month
-final_df['year'] = final_df['time'].dt.year
-final_df['month'] = final_df['time'].dt.month
-
-# Round coordinates for consistency
-final_df['latitude'] = final_df['latitude'].round(4)
-final_df['longitude'] = final_df['longitude'].round(4)
-
-# Group by Month, Lat, Lon and compute mean solar capacity factor
-monthly_avg_df = final_df.groupby(['month', 'latitude', 'longitude'], as_index=False)['spv_cf'].mean()
-
-print(monthly_avg_df.head())
-print(monthly_avg_df.shape)
-
-# Load countries from Natural Earth
-world = gpd.read_file("https://raw.githubusercontent.com/nvkelso/natural-earth-vector/master/geojson/ne_50m_admin_0_countries.geojson")
-ireland = world[world['ADMIN'] == 'Ireland']
-
+# Running per-month sums of every file read so far ('spv_cf' is the solar
+# capacity factor). Files are streamed one block of hours at a time, and files
+# already in the state are skipped, so appending a year only reads that year.
+state_path = "1-Sunlight-Hours/climatology_state.npz"
+climatology = Climatology(state_path, variable='spv_cf')
+with instrument.step("accumulate"):
+    added = climatology.update(nc_files)
+    climatology.save()
+    instrument.count(files_in=added)
+instrument.read(folder, files=added)
+print(f"Read {added} new NetCDF files ({len(climatology.files)} accumulated)")
+
+# Mean solar capacity factor per calendar month over all years: a north-up
+# (month, latitude, longitude) cube
+monthly_avg = climatology.layer_mean().astype('float32')
+monthly_std = climatology.layer_std()
+hours = climatology.layer_count().max(['latitude', 'longitude'])
+
+print(f"Monthly means on a {dict(monthly_avg.sizes)} grid")
+for i, month in enumerate(monthly_avg['month'].values):
+    print(f"  {calendar.month_abbr[month]}: up to {int(hours[i])} hourly values per cell, "
+          f"mean CF {float(monthly_avg[i].mean()):.3f}, hourly std {float(monthly_std[i].mean()):.3f}")
+latitudes, longitudes = monthly_avg['latitude'].values, monthly_avg['longitude'].values
+
+# Also write a band per year and month (solar_cf_by_year.tif), e.g. to compare years
+per_year_layers = False
+if per_year_layers:
+    by_year = Climatology("1-Sunlight-Hours/climatology_by_year_state.npz", variable='spv_cf', by_year=True)
+    with instrument.step("accumulate"):
+        by_year.update(nc_files)
+        by_year.save()
 
 # Plotting heatmaps per month (optional visualization)
-for month in monthly_avg_df['month'].unique():
-    month_data = monthly_avg_df[monthly_avg_df['month'] == month]
-
-    lats = sorted(month_data['latitude'].unique())
-    lons = sorted(month_data['longitude'].unique())
-
-    grid = month_data.pivot(index='latitude', columns='longitude', values='spv_cf').sort_index(ascending=False)
-    X, Y = np.meshgrid(grid.columns, grid.index)
-
-    fig, ax = plt.subplots(figsize=(10, 8))
-    pcm = ax.pcolormesh(X, Y, grid.values, cmap='viridis', shading='auto')
-    ireland.boundary.plot(ax=ax, edgecolor='black', linewidth=1)
-    plt.colorbar(pcm, ax=ax, label='Solar Capacity Factor')
-
-    # Convert month number to name for the title
-    month_name = calendar.month_name[month]
-    ax.set_title(f'Solar Capacity Factor – {month_name}', fontsize=20, fontweight='bold', color='navy',fontfamily='Georgia')
-
-    # Remove axis borders, ticks, and labels
-    ax.axis('off')
-
-    # Optional: Keep map bounds
-    ax.set_xlim([-10.5, -5.5])
-    ax.set_ylim([51, 55.5])
-
-    #plt.tight_layout()
-    plt.show()
+if plots.enabled():
+    # Load countries from Natural Earth (downloaded once, then read from .cache)
+    world = gpd.read_file(cached_url("https://raw.githubusercontent.com/nvkelso/natural-earth-vector/master/geojson/ne_50m_admin_0_countries.geojson"))
+    ireland = world[world['ADMIN'] == 'Ireland']
+
+    X, Y = np.meshgrid(longitudes, latitudes)
+    for i, month in enumerate(monthly_avg['month'].values):
+        # Convert month number to name for the title
+        month_name = calendar.month_name[month]
+        plots.mesh(
+            X, Y, monthly_avg[i].values, f'Solar Capacity Factor – {month_name}',
+            boundary=ireland,
+            colorbar='Solar Capacity Factor',
+            title_kwargs=dict(fontsize=20, fontweight='bold', color='navy', fontfamily='Georgia'),
+            # Optional: Keep map bounds
+            xlim=[-10.5, -5.5],
+            ylim=[51, 55.5],
+        )
 
 # Define target CRS
 target_crs = "EPSG:2157"
@@ -108,75 +82,110 @@ target_crs = "EPSG:2157"
 # Prepare output folder
 output_folder = "1-Sunlight-Hours/rasters_by_month"
 os.makedirs(output_folder, exist_ok=True)
+output_path = os.path.join(output_folder, "solar_cf_monthly.tif")
 
 # Set desired output pixel size in meters (adjust for finer/coarser resolution)
 desired_resolution = 1000  # 1000 meters = 1 km pixels; try smaller like 500 or 250 for finer pixels
 
-
-for month in monthly_avg_df['month'].unique():
-    month_data = monthly_avg_df[monthly_avg_df['month'] == month]
-
-    grid = month_data.pivot(index='latitude', columns='longitude', values='spv_cf').sort_index(ascending=False)
-    data_array = grid.values.astype('float32')
-
-    lat_resolution = abs(grid.index[1] - grid.index[0])
-    lon_resolution = abs(grid.columns[1] - grid.columns[0])
-
-    west = grid.columns.min()
-    east = grid.columns.max() + lon_resolution
-    south = grid.index.min()
-    north = grid.index.max() + lat_resolution
-
-    src_transform = rasterio.transform.from_origin(
-        west=west,
-        north=north,
-        xsize=lon_resolution,
-        ysize=lat_resolution
-    )
-
-    # Source CRS check
-    if (grid.index.min() >= -90 and grid.index.max() <= 90) and (grid.columns.min() >= -180 and grid.columns.max() <= 180):
-        src_crs = 'EPSG:4326'
-    else:
-        raise ValueError("Source coordinates out of latitude/longitude bounds; unknown CRS.")
-
-    src_height, src_width = data_array.shape
-
-    dst_transform, dst_width, dst_height = calculate_default_transform(
-        src_crs, target_crs,
-        src_width, src_height,
-        west, south, east, north,
-        resolution=desired_resolution
-    )
-
-    reprojected = np.empty((dst_height, dst_width), dtype='float32')
-
+# Snap the output grid's pixel edges to the DEM's, so CF pixels line up with
+# whole blocks of DEM / terrain mask pixels (when the resolution is a multiple
+# of the DEM's pixel size)
+snap_to_dem = True
+dem_path = "1-DEM/dem_irl_itm-1.tif"
+
+# The source grid and the destination grid are the same for every month, so
+# they are worked out once and all bands reprojected in one call
+lat_resolution = abs(latitudes[1] - latitudes[0])
+lon_resolution = abs(longitudes[1] - longitudes[0])
+
+west = longitudes.min()
+east = longitudes.max() + lon_resolution
+south = latitudes.min()
+north = latitudes.max() + lat_resolution
+
+src_transform = rasterio.transform.from_origin(
+    west=west,
+    north=north,
+    xsize=lon_resolution,
+    ysize=lat_resolution
+)
+
+# Source CRS check
+if (latitudes.min() >= -90 and latitudes.max() <= 90) and (longitudes.min() >= -180 and longitudes.max() <= 180):
+    src_crs = 'EPSG:4326'
+else:
+    raise ValueError("Source coordinates out of latitude/longitude bounds; unknown CRS.")
+
+src_height, src_width = len(latitudes), len(longitudes)
+
+dst_transform, dst_width, dst_height = calculate_default_transform(
+    src_crs, target_crs,
+    src_width, src_height,
+    west, south, east, north,
+    resolution=desired_resolution
+)
+
+if snap_to_dem:
+    with rasterio.open(dem_path) as dem:
+        origin_x, origin_y = dem.transform.c, dem.transform.f
+    # Move the grid's corner onto the DEM's lattice, adding a pixel so the
+    # shifted grid still covers the whole area
+    left = origin_x + np.floor((dst_transform.c - origin_x) / desired_resolution) * desired_resolution
+    top = origin_y + np.ceil((dst_transform.f - origin_y) / desired_resolution) * desired_resolution
+    dst_transform = rasterio.transform.from_origin(left, top, desired_resolution, desired_resolution)
+    dst_width, dst_height = dst_width + 1, dst_height + 1
+
+
+def reproject_stack(cube):
+    # (layers, lat, lon) on the CF grid -> (layers, rows, cols) on the ITM grid
+    reprojected = np.empty((cube.shape[0], dst_height, dst_width), dtype='float32')
     reproject(
-        source=data_array,
+        source=cube.values.astype('float32'),
         destination=reprojected,
         src_transform=src_transform,
         src_crs=src_crs,
         dst_transform=dst_transform,
         dst_crs=target_crs,
-        resampling=Resampling.bilinear
+        resampling=Resampling.bilinear,
+        src_nodata=np.nan,
+        dst_nodata=np.nan,
     )
-
-    filename = os.path.join(output_folder, f"solar_cf_month_{month}.tif")
-    with rasterio.open(
-        filename,
-        'w',
-        driver='GTiff',
-        height=dst_height,
-        width=dst_width,
-        count=1,
-        dtype='float32',
-        crs=target_crs,
-        transform=dst_transform,
-        nodata=np.nan
-    ) as dst:
-        dst.write(reprojected, 1)
-        dst.set_band_description(1, f"Solar Capacity Factor - Month {month}")
-
-    print(f"✅ Saved reprojected raster: {filename}")
+    return reprojected
 
 
+def write_stack(path, bands, descriptions, tags):
+    # One tiled, compressed GeoTIFF with a band per layer
+    profile = block_profile(
+        {'driver': 'GTiff', 'height': dst_height, 'width': dst_width, 'count': len(bands),
+         'dtype': 'float32', 'crs': target_crs, 'transform': dst_transform, 'nodata': np.nan},
+        256,
+        compress='deflate',
+        predictor=3,
+    )
+    with rasterio.open(path, 'w', **profile) as dst:
+        dst.write(bands)
+        for band, (description, band_tags) in enumerate(zip(descriptions, tags), start=1):
+            dst.set_band_description(band, description)
+            dst.update_tags(band, **band_tags)
+    print(f"✅ Saved {len(bands)} reprojected bands to {path}")
+
+
+months = monthly_avg['month'].values
+with instrument.step("reproject"):
+    bands = reproject_stack(monthly_avg)
+with instrument.step("write"):
+    write_stack(output_path, bands,
+                [f"Solar Capacity Factor - Month {month}" for month in months],
+                [{'month': month} for month in months])
+instrument.wrote(output_path, pixels=bands.size)
+
+if per_year_layers:
+    yearly = by_year.layer_mean()
+    labels = list(zip(yearly['year'].values, yearly['month'].values))
+    with instrument.step("reproject"):
+        bands = reproject_stack(yearly)
+    with instrument.step("write"):
+        write_stack(os.path.join(output_folder, "solar_cf_by_year.tif"), bands,
+                    [f"Solar Capacity Factor - {year}-{month:02d}" for year, month in labels],
+                    [{'year': year, 'month': month} for year, month in labels])
+    instrument.wrote(os.path.join(output_folder, "solar_cf_by_year.tif"), pixels=bands.size)
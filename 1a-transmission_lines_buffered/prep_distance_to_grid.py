@@ -0,0 +1,78 @@
+import sys
+sys.path.insert(0, ".")  # run from the repo root so the shared `pipeline` helpers import
+
+import math
+
+import cv2
+import numpy as np
+import rasterio
+from rasterio import features
+from rasterio.transform import from_origin
+from rasterio.warp import transform_bounds
+
+from pipeline import instrument, plots
+from pipeline.raster import block_profile
+from pipeline.vectors import read_layer
+
+instrument.enable()
+
+# Load the transmission lines
+lines_path = '1-EirGrid-Map/transmission_map_lines.parquet'
+with instrument.step("read"):
+    lines = read_layer(lines_path)
+    if lines.crs.to_epsg() != 2157:
+        lines = lines.to_crs(epsg=2157)
+instrument.read(lines_path, features=len(lines))
+
+# The DEM only sets the extent, so the distance raster covers the whole island
+dem_path = "1-DEM/dem_irl_itm-1.tif"
+output_path = '1a-transmission_lines_buffered/distance_to_grid.tif'
+
+# Pixel size in metres. Distances are measured between pixel centres, so they
+# are accurate to about one pixel.
+resolution = 50
+
+with rasterio.open(dem_path) as src:
+    minx, miny, maxx, maxy = transform_bounds(src.crs, "EPSG:2157", *src.bounds)
+
+# Snap the extent outwards onto a whole-resolution ITM grid
+minx, miny = math.floor(minx / resolution) * resolution, math.floor(miny / resolution) * resolution
+maxx, maxy = math.ceil(maxx / resolution) * resolution, math.ceil(maxy / resolution) * resolution
+width, height = (maxx - minx) // resolution, (maxy - miny) // resolution
+transform = from_origin(minx, maxy, resolution, resolution)
+
+# Burn the lines in as 0 on a background of 1: cv2's distance transform gives
+# every non-zero pixel its exact Euclidean distance to the nearest zero pixel
+with instrument.step("rasterize"):
+    background = features.rasterize(
+        ((geom, 0) for geom in lines.geometry),
+        out_shape=(height, width),
+        transform=transform,
+        fill=1,
+        all_touched=True,
+        dtype="uint8",
+    )
+    instrument.count(pixels=background.size, line_pixels=background.size - np.count_nonzero(background))
+with instrument.step("distance transform"):
+    distance = cv2.distanceTransform(background, cv2.DIST_L2, cv2.DIST_MASK_PRECISE)
+    distance *= resolution
+
+profile = block_profile(
+    {"driver": "GTiff", "height": height, "width": width, "count": 1, "crs": "EPSG:2157"},
+    512,
+    transform=transform,
+    dtype="float32",
+    # Off-raster pixels read as nodata, so zonal statistics ignore them
+    nodata=-1,
+    compress="deflate",
+    predictor=3,
+)
+with instrument.step("write"), rasterio.open(output_path, "w", **profile) as dst:
+    dst.write(distance, 1)
+instrument.wrote(output_path, pixels=distance.size)
+
+print(f"Distance to grid saved to: {output_path} ({width} x {height} px at {resolution} m)")
+print(f"Furthest point from a line: {distance.max() / 1000:.1f} km")
+
+plots.image(distance / 1000, "Distance to Nearest Transmission Line (km)", figsize=(10, 10),
+            cmap="viridis", colorbar="Distance (km)")
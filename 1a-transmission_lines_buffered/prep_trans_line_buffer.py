@@ -1,35 +1,46 @@
+import sys
+sys.path.insert(0, ".")  # run from the repo root so the shared `pipeline` helpers import
 
 import geopandas as gpd
-import matplotlib.pyplot as plt
 
-# Load the original polyline shapefile
-shapefile_path = '1-EirGrid-Map/Shp_File/transmission_map_lines.shp'
-gdf = gpd.read_file(shapefile_path)
+from pipeline import instrument, plots
+from pipeline.vectors import write_layer, read_layer, layer_info
+
+instrument.enable()
+
+# Load the original polylines
+lines_path = '1-EirGrid-Map/transmission_map_lines.parquet'
+with instrument.step("read"):
+    gdf = read_layer(lines_path)
+instrument.read(lines_path, features=len(gdf))
 
 # Ensure it's in EPSG:2157 (meters)
 if gdf.crs.to_epsg() != 2157:
     gdf = gdf.to_crs(epsg=2157)
 
 # Create a 3km (3000 meter) buffer
-buffered_geom = gdf.geometry.buffer(3000)
+with instrument.step("buffer"):
+    buffered_geom = gdf.geometry.buffer(3000)
+    instrument.count(features=len(buffered_geom), vertices_out=buffered_geom.count_coordinates().sum())
 
 # Create a new GeoDataFrame with the buffered polygons
 buffered_gdf = gpd.GeoDataFrame(gdf.copy(), geometry=buffered_geom)
 buffered_gdf.set_crs(epsg=2157, inplace=True)
 
 # Save the buffered layer
-output_path = '1a-transmission_lines_buffered/Shp_File/buffered_3km_epsg2157.shp'
-buffered_gdf.to_file(output_path)
+output_path = '1a-transmission_lines_buffered/buffered_3km_epsg2157.parquet'
+with instrument.step("write"):
+    write_layer(buffered_gdf, output_path,
+                shapefile='1a-transmission_lines_buffered/Shp_File/buffered_3km_epsg2157.shp')
+instrument.wrote(output_path, features=len(buffered_gdf))
 
-print(f"Buffered shapefile saved to: {output_path}")
+print(f"Buffered layer saved to: {output_path}")
 
-# Re-import and check
-reimported_gdf = gpd.read_file(output_path)
-print(f"Reimported CRS: {reimported_gdf.crs}")
-print(f"Number of features: {len(reimported_gdf)}")
+# Check what was written from the file footer, without re-reading the geometries
+info = layer_info(output_path)
+print(f"Saved CRS: {info['crs']}")
+print(f"Number of features: {info['rows']}")
 
 # Plot to verify
-fig, ax = plt.subplots(figsize=(10, 10))
-reimported_gdf.plot(ax=ax, color='lightgreen', edgecolor='black')
-plt.title('Reimported Buffered Polygons (3km Buffer, EPSG:2157)')
-plt.show()
\ No newline at end of file
+plots.vector(buffered_gdf, 'Buffered Polygons (3km Buffer, EPSG:2157)',
+             figsize=(10, 10), source=output_path, color='lightgreen', edgecolor='black')
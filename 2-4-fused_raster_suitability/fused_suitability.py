@@ -0,0 +1,187 @@
+import sys
+sys.path.insert(0, ".")  # run from the repo root so the shared `pipeline` helpers import
+
+import calendar
+import os
+
+import geopandas as gpd
+import numpy as np
+import rasterio
+import shapely
+from rasterio.enums import Resampling
+
+from pipeline import instrument, plots
+from pipeline.fused import CRS, Grid, burn, cell_index, check_crs, merge_seams, polygonize, read_on_grid
+from pipeline.raster import block_profile, iter_windows, read_overview, read_with_halo
+from pipeline.terrain import terrain_mask
+from pipeline.vectors import read_layer, write_layer
+
+instrument.enable()
+
+# The whole suitability test of stages 2-4 in one streamed pass over a single
+# EPSG:2157 grid: a pixel is suitable when its centre is in a suitable
+# land-cover polygon, its terrain passes the slope/aspect test, it is within
+# `max_distance` of a transmission line and (optionally) its annual mean
+# capacity factor reaches `min_mean_cf`. Criteria are evaluated block by
+# block, cheapest first, and a block stops as soon as nothing in it is left,
+# so memory is bounded by the block size and the sea costs almost nothing.
+#
+# Unlike stage 2, which keeps or drops whole land-cover polygons by their
+# share of suitable terrain, this works per pixel.
+
+land_path = "1-Land-Cover/suitable_land.parquet"
+dem_path = "1-DEM/dem_irl_itm-1.tif"
+distance_path = "1a-transmission_lines_buffered/distance_to_grid.tif"
+cf_path = "1-Sunlight-Hours/rasters_by_month/solar_cf_monthly.tif"
+
+output_dir = "2-4-fused_raster_suitability"
+mask_path = os.path.join(output_dir, "suitable_mask.tif")
+cf_output_path = os.path.join(output_dir, "suitable_cf_monthly.tif")
+polygons_path = os.path.join(output_dir, "suitable_areas.parquet")
+
+# Pixel size of the common grid in metres, snapped to the DEM's lattice;
+# None uses the DEM's own pixels (and its exact slope/aspect mask)
+resolution = None
+# Rows/cols per block; peak memory scales with this, not with the island
+block_size = 2048
+
+# Same terrain rule as 1-DEM/dem_prep.py
+max_slope = 5
+aspect_range = (135, 225)
+# Same reach as the 3 km buffer of stage 1a
+max_distance = 3000
+# Annual mean solar capacity factor a pixel needs; None skips the criterion
+min_mean_cf = None
+
+# Also trace the suitable pixels as polygons (GeoParquet), e.g. for GIS
+polygonize_result = False
+
+os.makedirs(output_dir, exist_ok=True)
+
+# Only geometries are needed, and only the ones under each block are burned in
+with instrument.step("read land cover"):
+    land = read_layer(land_path, columns=[]).geometry.values
+    tree = shapely.STRtree(land)
+instrument.read(land_path, features=len(land))
+
+with rasterio.open(dem_path) as dem, rasterio.open(distance_path) as distance_src, \
+        rasterio.open(cf_path) as cf_src:
+    for src in (dem, distance_src, cf_src):
+        check_crs(src)
+    grid = Grid.of(dem, resolution)
+    native = resolution is None or resolution == dem.transform.a
+    print(f"Grid: {grid.width} x {grid.height} px at {grid.resolution:g} m, {block_size} px blocks")
+
+    # The CF cube is a few hundred 1 km cells across, so it is read once and
+    # looked up by cell rather than resampled onto every block
+    cf = cf_src.read()
+    months = [int(cf_src.tags(band)['month']) for band in range(1, cf_src.count + 1)]
+    mean_cf = cf.mean(axis=0).ravel()
+    cf_cells = np.zeros(cf_src.width * cf_src.height, dtype=np.int64)  # suitable pixels per cell
+
+    profile = block_profile(
+        {"driver": "GTiff", "height": grid.height, "width": grid.width, "count": 1, "crs": CRS,
+         "transform": grid.transform},
+        block_size,
+        dtype="uint8",
+        nodata=None,
+        compress="deflate",
+    )
+    pieces, seam_pieces = [], []
+    suitable_pixels = 0
+    with rasterio.open(mask_path, "w", **profile) as dst:
+        for window in iter_windows(grid.width, grid.height, block_size):
+            with instrument.step("land cover"):
+                hits = tree.query(shapely.box(*grid.bounds(window)))
+                suitable = burn(land[hits], grid, window).view(bool)
+
+            if suitable.any():
+                with instrument.step("distance"):
+                    distance = read_on_grid(distance_src, grid, window)
+                    suitable &= (distance >= 0) & (distance <= max_distance)
+
+            if suitable.any():
+                with instrument.step("terrain"):
+                    if native:
+                        # One-pixel halo keeps the gradients right at block seams
+                        block, inner = read_with_halo(dem, window, halo=1)
+                    else:
+                        block = read_on_grid(dem, grid, window, halo=1, resampling=Resampling.average)
+                        inner = (slice(1, -1), slice(1, -1))
+                    suitable &= terrain_mask(block, grid.resolution, -grid.resolution, max_slope,
+                                             aspect_range)[inner]
+
+            if suitable.any():
+                with instrument.step("capacity factor"):
+                    cells = cell_index(grid, window, cf_src.transform, cf_src.width, cf_src.height)
+                    if min_mean_cf is not None:
+                        with np.errstate(invalid="ignore"):
+                            suitable &= (cells >= 0) & (mean_cf[cells] >= min_mean_cf)
+                    cf_cells += np.bincount(cells[suitable & (cells >= 0)], minlength=len(cf_cells))
+
+            with instrument.step("write"):
+                mask = suitable.view(np.uint8)
+                dst.write(mask, 1, window=window)
+            suitable_pixels += np.count_nonzero(suitable)
+            instrument.count(blocks=1, pixels=suitable.size)
+
+            if polygonize_result and suitable.any():
+                with instrument.step("polygonize"):
+                    polygons, seams = polygonize(mask, grid, window)
+                    pieces.append(polygons[~seams])
+                    seam_pieces.append(polygons[seams])
+instrument.count(suitable_pixels=suitable_pixels)
+instrument.read(dem_path, pixels=dem.width * dem.height)
+instrument.read(distance_path)
+instrument.read(cf_path)
+instrument.wrote(mask_path, pixels=grid.width * grid.height)
+
+suitable_km2 = suitable_pixels * grid.resolution ** 2 / 1e6
+print(f"✅ Saved the suitability mask to {mask_path}: {suitable_km2:.1f} km² suitable")
+
+# Monthly CF of every 1 km cell holding suitable land (NaN elsewhere), on the
+# CF grid as in stage 4, and the suitable area in each cell as a last band
+area = (cf_cells * grid.resolution ** 2 / 1e6).reshape(cf_src.height, cf_src.width).astype("float32")
+masked_cf = np.where(area > 0, cf, np.nan).astype("float32")
+cf_profile = block_profile(
+    {"driver": "GTiff", "height": cf_src.height, "width": cf_src.width, "count": len(months) + 1,
+     "dtype": "float32", "crs": CRS, "transform": cf_src.transform, "nodata": np.nan},
+    256,
+    compress="deflate",
+    predictor=3,
+)
+with instrument.step("write"), rasterio.open(cf_output_path, "w", **cf_profile) as dest:
+    dest.write(masked_cf, indexes=list(range(1, len(months) + 1)))
+    dest.write(area, len(months) + 1)
+    for band, month in enumerate(months, start=1):
+        dest.set_band_description(band, f"Solar Capacity Factor - Month {month}")
+        dest.update_tags(band, month=month)
+    dest.set_band_description(len(months) + 1, "Suitable area (km²)")
+instrument.wrote(cf_output_path, pixels=area.size * (len(months) + 1))
+print(f"✅ Saved {len(months)} months of CF on suitable land to {cf_output_path}")
+
+# Mean CF over the suitable land, each cell weighted by its suitable area
+if area.sum() > 0:
+    for i, month in enumerate(months):
+        valid = (area > 0) & ~np.isnan(cf[i])
+        weighted = np.average(cf[i][valid], weights=area[valid]) if valid.any() else np.nan
+        print(f"  {calendar.month_abbr[month]}: mean CF {weighted:.3f} on suitable land")
+
+if polygonize_result:
+    with instrument.step("polygonize"):
+        polygons = np.concatenate(pieces + [merge_seams(np.concatenate(seam_pieces or [[]]))])
+        areas = gpd.GeoDataFrame(geometry=polygons, crs=CRS)
+        areas["area_ha"] = areas.area / 1e4
+    with instrument.step("write"):
+        write_layer(areas, polygons_path, shapefile=os.path.join(output_dir, "Shp_File", "suitable_areas.shp"))
+    instrument.wrote(polygons_path, features=len(areas))
+    print(f"✅ Saved {len(areas)} suitable areas to {polygons_path}")
+
+if plots.enabled():
+    with rasterio.open(mask_path) as src:
+        overview = read_overview(src)
+    plots.image(overview, "Suitable Land (Fused Raster Engine)", figsize=(10, 10), cmap="Greens",
+                vmin=0, vmax=1, colorbar="1 = Suitable")
+    plots.image(np.where(area > 0, mean_cf.reshape(area.shape), np.nan),
+                "Annual Mean Capacity Factor on Suitable Land", figsize=(10, 10), cmap="viridis",
+                colorbar="Capacity factor")
@@ -0,0 +1,107 @@
+import sys
+sys.path.insert(0, ".")  # run from the repo root so the shared `pipeline` helpers import
+
+import itertools
+import os
+
+import numpy as np
+import pandas as pd
+import rasterio
+
+from pipeline import instrument, plots
+from pipeline.shards import make_shards, run_sharded
+from pipeline.sweep import Bins, evaluate, merge_statistics, sweep_key, sweep_task
+from pipeline.vectors import layer_bounds, layer_info
+
+instrument.enable()
+
+# How much land, and how sunny, would stages 2-4 keep under other thresholds?
+# One pass over the DEM counts every suitable land-cover polygon's pixels by
+# slope/aspect class and by distance to the nearest line; each scenario is
+# then scored from those counts alone, so hundreds of them cost about as much
+# as one run of stages 2-4. The colour (HSV) ranges of the EirGrid map change
+# the traced lines themselves, so they are swept by rerunning 1-EirGrid-Map
+# and grid_distance, not here.
+
+land_path = "1-Land-Cover/suitable_land.parquet"
+dem_path = "1-DEM/dem_irl_itm-1.tif"
+distance_path = "1a-transmission_lines_buffered/distance_to_grid.tif"
+cf_path = "1-Sunlight-Hours/rasters_by_month/solar_cf_monthly.tif"
+
+output_dir = "2-4-threshold_sweep"
+output_path = os.path.join(output_dir, "scenarios.csv")
+
+# Side length of the square shards processed in parallel (metres, EPSG:2157);
+# None processes the whole island in one piece
+shard_size = 25000
+workers = None  # default: one per core
+tile_size = 2048
+
+# Thresholds to combine; every combination is one scenario. An aspect range
+# of None tests the slope alone. The defaults of stages 2-4 are slope < 5°,
+# aspect 135-225°, terrain score >= 0.95 and a 3 km buffer.
+max_slopes = [2, 3, 4, 5, 6, 8, 10]
+aspect_ranges = [(135, 225), (120, 240), (90, 270), None]
+min_terrain_scores = [0.5, 0.75, 0.9, 0.95, 1.0]
+buffer_distances = [500, 1000, 2000, 3000, 5000, 10000]
+
+# Class and band edges of the statistics. Every threshold above must be one
+# of them; finer edges allow more thresholds for a little more memory, and
+# cached shard statistics are reused as long as the edges stay the same.
+bins = Bins(
+    slope=(1, 2, 3, 4, 5, 6, 7, 8, 10, 12, 15),
+    aspect=tuple(range(15, 360, 15)),
+    distance=(250, 500, 1000, 1500, 2000, 3000, 4000, 5000, 7500, 10000, 15000, 20000),
+)
+
+os.makedirs(output_dir, exist_ok=True)
+
+shards = make_shards(layer_bounds(land_path), shard_size)
+print(f"Collecting sweep statistics in {len(shards)} shards")
+with instrument.step("statistics"):
+    stats = merge_statistics(run_sharded(sweep_task, shards, land_path, dem_path, distance_path, cf_path, bins,
+                                         tile_size, workers=workers, key=sweep_key))
+    instrument.count(shards=len(shards), features_in=len(stats["band_pixels"]))
+instrument.read(land_path, features=layer_info(land_path)["rows"])
+instrument.read(dem_path)
+instrument.read(distance_path)
+instrument.read(cf_path)
+
+with rasterio.open(dem_path) as src:
+    pixel_area = abs(src.transform.a * src.transform.e)
+
+with instrument.step("evaluate"):
+    scenarios = pd.DataFrame(
+        [(slope, *(aspect or (np.nan, np.nan)), score, buffer) for slope, aspect, score, buffer in
+         itertools.product(max_slopes, aspect_ranges, min_terrain_scores, buffer_distances)],
+        columns=["max_slope", "aspect_min", "aspect_max", "min_terrain_score", "buffer_m"],
+    )
+    scenarios = evaluate(stats, bins, scenarios, pixel_area)
+    instrument.count(scenarios=len(scenarios))
+
+with instrument.step("write"):
+    scenarios.to_csv(output_path, index=False, float_format="%.6g")
+instrument.wrote(output_path, rows=len(scenarios))
+print(f"✅ Saved {len(scenarios)} scenarios to {output_path}")
+
+# The thresholds stages 2-4 use today, for comparison
+current_rule = scenarios[(scenarios["max_slope"] == 5) & (scenarios["aspect_min"] == 135)
+                         & (scenarios["aspect_max"] == 225)]
+current = current_rule[(current_rule["min_terrain_score"] == 0.95) & (current_rule["buffer_m"] == 3000)]
+for row in current.itertuples():
+    print(f"Current thresholds: {row.polygons} polygons, {row.suitable_km2:.1f} km², mean CF {row.mean_cf:.3f}")
+print(scenarios.sort_values("suitable_km2", ascending=False).head(10).to_string(index=False))
+
+
+def draw_areas(fig, ax, table, title):
+    table.plot(ax=ax, marker="o")
+    ax.set_title(title)
+    ax.set_xlabel("Buffer distance (m)")
+    ax.set_ylabel("Suitable area (km²)")
+    ax.legend(title="Min terrain score")
+
+
+# Suitable area against buffer distance under the current slope/aspect rule
+if plots.enabled() and len(current_rule):
+    plots.figure(draw_areas, current_rule.pivot(index="buffer_m", columns="min_terrain_score", values="suitable_km2"),
+                 title="Suitable Area by Buffer Distance (slope < 5°, aspect 135-225°)", figsize=(8, 5))
@@ -1,62 +1,75 @@
-import geopandas as gpd
-from rasterstats import zonal_stats
-import matplotlib.pyplot as plt
+import sys
+sys.path.insert(0, ".")  # run from the repo root so the shared `pipeline` helpers import
+
 import rasterio
 import pandas as pd
-import rasterio.plot
 import numpy as np
 
-# Load your filtered suitable land polygons
-suitable_land = gpd.read_file("1-Land-Cover/Shp_File/suitable_land.shp")
-print("Vector CRS:", suitable_land.crs)
+from pipeline import instrument, plots
+from pipeline.shards import make_shards, merge_frames, run_sharded, terrain_key, terrain_task
+from pipeline.vectors import write_layer, layer_bounds, layer_info
+
+instrument.enable()
+
+land_path = "1-Land-Cover/suitable_land.parquet"
+print("Vector CRS:", layer_info(land_path)["crs"])
 
 # Path to your binary raster
 terrain_mask_path = "1-DEM/binary_filtered_dem.tif"
-# Load raster file
-with rasterio.open("1-DEM/binary_filtered_dem.tif") as src:
-    data = src.read(1)
-    print("Unique raster values:", np.unique(data))
+with rasterio.open(terrain_mask_path) as src:
     print("Raster CRS:", src.crs)
 
-# Compute mean (i.e., % of polygon area with value = 1)
-terrain_stats = zonal_stats(
-    suitable_land,
-    terrain_mask_path,
-    stats=["mean"],
-    nodata=None,  # ← Do not ignore 0s!
-    geojson_out=False
-)
+# Side length of the square shards processed in parallel (metres, EPSG:2157);
+# None processes the whole island in one piece
+shard_size = 25000
+workers = None  # default: one per core
+
+# Compute mean (i.e., % of polygon area with value = 1) for every polygon with
+# one tiled rasterization pass per shard. 0s count towards the mean; NaN = no
+# pixels inside. A polygon crossing a shard edge is scored whole by one shard.
+shards = make_shards(layer_bounds(land_path), shard_size)
+print(f"Scoring terrain in {len(shards)} shards")
+with instrument.step("score shards"):
+    suitable_land = merge_frames(
+        run_sharded(terrain_task, shards, land_path, terrain_mask_path, workers=workers, key=terrain_key)
+    )
+    instrument.count(shards=len(shards), features_in=len(suitable_land))
+instrument.read(land_path, features=len(suitable_land))
+instrument.read(terrain_mask_path)
+terrain_means = suitable_land["terrain_score"].to_numpy()
 
 #Analyse the summary statistics
-print(terrain_stats[:3])  # See first 3 entries
+print(terrain_means[:3])  # See first 3 entries
 
-# Check for None values
-terrain_df = pd.DataFrame(terrain_stats)
-print(terrain_df.describe())
+# Check for missing values
+print(pd.Series(terrain_means, name="mean").describe())
 
-# Check for polygons that meet the criteria, i.e., mean >= 0.90
-high_score_count = sum(1 for stat in terrain_stats if stat["mean"] is not None and stat["mean"] >= 0.95)
+# Check for polygons that meet the criteria, i.e., mean >= 0.95
+high_score_count = np.count_nonzero(terrain_means >= 0.95)
 print(f"Polygons with ≥95% suitable terrain: {high_score_count}")
 
 # Check for polygons with mean that is neither 0 or 1
-non_extreme_count = sum(1 for stat in terrain_stats if stat["mean"] is not None and 0 < stat["mean"] < 1)
+non_extreme_count = np.count_nonzero((terrain_means > 0) & (terrain_means < 1))
 print(f"Polygons with mean neither 0 nor 1: {non_extreme_count}")
 
 #
-missing_or_zero = [i for i, stat in enumerate(terrain_stats) if stat["mean"] is None or stat["mean"] == 0]
-print(f"Polygons with no suitable terrain or missing data: {len(missing_or_zero)}")
+missing_or_zero = np.isnan(terrain_means) | (terrain_means == 0)
+print(f"Polygons with no suitable terrain or missing data: {np.count_nonzero(missing_or_zero)}")
 
 
 # Add terrain_score to the GeoDataFrame
-suitable_land["terrain_score"] = [s["mean"] if s["mean"] is not None else 0 for s in terrain_stats]
+suitable_land["terrain_score"] = np.nan_to_num(terrain_means, nan=0)
 
 # Filter polygons with ≥95% suitable terrain
 solar_ready = suitable_land[suitable_land["terrain_score"] >= 0.95]
 
 # Save result
-solar_ready.to_file("2-combine_land_cover_dem/Shp_File/solar_ready_land.shp")
+output_path = "2-combine_land_cover_dem/solar_ready_land.parquet"
+with instrument.step("write"):
+    write_layer(solar_ready, output_path, shapefile="2-combine_land_cover_dem/Shp_File/solar_ready_land.shp")
+instrument.wrote(output_path, features=len(solar_ready))
+instrument.count(features_out=len(solar_ready))
 
 # Optional: Plot the result
-solar_ready.plot(column="terrain_score", legend=True, figsize=(10, 10))
-plt.title("Solar-Ready Land (≥95% Suitable Terrain)")
-plt.show()
+plots.vector(solar_ready, "Solar-Ready Land (≥95% Suitable Terrain)",
+             figsize=(10, 10), source=output_path, column="terrain_score", legend=True)
@@ -1,28 +1,61 @@
-import geopandas as gpd
-import matplotlib.pyplot as plt
-
-# Load your shapefiles
-buffered_transmission = gpd.read_file('1a-transmission_lines_buffered/Shp_File/buffered_3km_epsg2157.shp')
-suitability_land = gpd.read_file('2-combine_land_cover_dem/Shp_File/solar_ready_land.shp')
-
-# Ensure both GeoDataFrames use the same CRS
-suitability_land = suitability_land.to_crs(buffered_transmission.crs)
-
-# Clip suitability land using buffered transmission polygons (intersection)
-clipped_suitability = gpd.overlay(suitability_land, buffered_transmission, how='intersection')
+import sys
+sys.path.insert(0, ".")  # run from the repo root so the shared `pipeline` helpers import
+
+import pandas as pd
+
+from pipeline import instrument, plots
+from pipeline.shards import clip_key, clip_task, make_shards, merge_frames, run_sharded
+from pipeline.vectors import write_layer, layer_bounds, layer_info
+
+instrument.enable()
+
+buffer_path = '1a-transmission_lines_buffered/buffered_3km_epsg2157.parquet'
+distance_path = '1a-transmission_lines_buffered/distance_to_grid.tif'
+land_path = '2-combine_land_cover_dem/solar_ready_land.parquet'
+
+# Side length of the square shards processed in parallel (metres, EPSG:2157);
+# None processes the whole island in one piece
+shard_size = 25000
+workers = None  # default: one per core
+
+# Clip suitability land to the buffered transmission lines. Each shard clips
+# the land polygons it owns to the dissolved union of the buffers around them:
+# polygons inside it pass through, disjoint ones are dropped and only those
+# crossing its edge are intersected. Overlapping buffers no longer produce
+# duplicate pieces, so there is one output row per surviving land polygon.
+# Every polygon also gets `grid_distance`, its distance (m) to the nearest line.
+shards = make_shards(layer_bounds(land_path), shard_size)
+print(f"Clipping in {len(shards)} shards")
+with instrument.step("clip shards"):
+    results = run_sharded(clip_task, shards, land_path, buffer_path, distance_path, workers=workers,
+                          key=clip_key)
+    clipped_suitability = merge_frames([clipped for clipped, _ in results], crs=layer_info(buffer_path)["crs"])
+    distances = pd.concat([d for _, d in results], ignore_index=True)
+    instrument.count(shards=len(shards), features_in=len(distances), features_out=len(clipped_suitability))
+instrument.read(land_path, features=len(distances))
+instrument.read(buffer_path, features=layer_info(buffer_path)["rows"])
+instrument.read(distance_path)
+
+# Other buffer radii are just thresholds on the distance raster: how much
+# solar-ready land would a 1/3/5/10 km rule keep (whole polygons within reach)?
+scenario_distances = [1000, 3000, 5000, 10000]
+for radius in scenario_distances:
+    within = distances["grid_distance"] <= radius
+    print(f"Within {radius / 1000:g} km of a line: {within.sum()} polygons, "
+          f"{distances.loc[within, 'area'].sum() / 1e6:.1f} km²")
 
 # Save clipped result
-output_path =  '3-keep_suitable_land_near_transmission/Shp_File/clipped_suitability.shp'
+output_path = '3-keep_suitable_land_near_transmission/clipped_suitability.parquet'
 
-clipped_suitability.to_file(output_path)
+# This is the final vector output, so it is the one most worth exporting with SOLAR_EXPORT_SHP=1
+with instrument.step("write"):
+    write_layer(clipped_suitability, output_path,
+                shapefile='3-keep_suitable_land_near_transmission/Shp_File/clipped_suitability.shp')
+instrument.wrote(output_path, features=len(clipped_suitability))
 
 print("Clipping complete and saved to:", output_path)
-
-# Re-import the clipped shapefile
-clipped = gpd.read_file(output_path)
+print(f"Features written: {layer_info(output_path)['rows']}")
 
 # Plot the clipped suitability polygons
-fig, ax = plt.subplots(figsize=(10, 10))
-clipped.plot(ax=ax, color='green', edgecolor='black', alpha=0.6)
-ax.set_title('Clipped Suitability Land')
-plt.show()
\ No newline at end of file
+plots.vector(clipped_suitability, 'Clipped Suitability Land',
+             figsize=(10, 10), source=output_path, color='green', edgecolor='black', alpha=0.6)
@@ -1,82 +1,99 @@
-import geopandas as gpd
+import sys
+sys.path.insert(0, ".")  # run from the repo root so the shared `pipeline` helpers import
+
+import calendar
+
 import rasterio
-from rasterio.plot import show
-from rasterio.mask import mask
-import matplotlib.pyplot as plt
+from rasterio.features import geometry_window
+from rasterio.plot import plotting_extent
+import numpy as np
 import os
+from shapely.geometry import box
 from matplotlib.colors import LinearSegmentedColormap
+from pyproj import CRS
+
+from pipeline import instrument, plots
+from pipeline.shards import make_shards, mask_key, mask_task, run_sharded
+from pipeline.vectors import layer_bounds, layer_info
+
+instrument.enable()
+
+# Clipped suitability polygons
+input_path = "3-keep_suitable_land_near_transmission/clipped_suitability.parquet"
+polygon_crs = layer_info(input_path)['crs']
+print(f"Polygon CRS: {polygon_crs}")  # Should be EPSG:2157, as the rasters are
+
+# Side length of the square shards processed in parallel (metres, EPSG:2157);
+# None processes the whole island in one piece
+shard_size = 25000
+workers = None  # default: one per core
 
-# Load clipped suitability polygons
-input_path = "3-keep_suitable_land_near_transmission/Shp_File/clipped_suitability.shp"
-polygon_gdf = gpd.read_file(input_path)
-print(f"Polygon CRS: {polygon_gdf.crs}")  # Should be EPSG:2157
+# All months in one multi-band raster (band tag `month`), so adding months or
+# years adds bands, not mask passes
+raster_path = '1-Sunlight-Hours/rasters_by_month/solar_cf_monthly.tif'
+with rasterio.open(raster_path) as src:
+    months = [int(src.tags(band)['month']) for band in range(1, src.count + 1)]
+    raster_crs = src.crs
 
-# List of raster files to process
-raster_files = [
-    '1-Sunlight-Hours/rasters_by_month/solar_cf_month_1.tif',
-    '1-Sunlight-Hours/rasters_by_month/solar_cf_month_4.tif',
-    '1-Sunlight-Hours/rasters_by_month/solar_cf_month_7.tif',
-    '1-Sunlight-Hours/rasters_by_month/solar_cf_month_10.tif',
-]
+# The shards, crop window and masks all take the polygons' coordinates as the
+# raster's, so a layer in another CRS would mask the wrong pixels
+if polygon_crs is None or CRS.from_user_input(raster_crs) != polygon_crs:
+    raise ValueError(f"{input_path} is in {polygon_crs}, not the raster's {raster_crs}; reproject it first")
 
-month_names = {
-    1: "January",
-    4: "April",
-    7: "July",
-    10: "October"
-}
+# Months to plot
+plot_months = [1, 4, 7, 10]
 
 reds = ['#a50026', '#f46d43', '#fdae61', '#fee08b', '#ffffbf']
 cmap_red_orange_yellow = LinearSegmentedColormap.from_list('red_orange_yellow', reds)
 
 output_dir = "4-sunshine_levels_on_suitable_land/masked_rasters"
 os.makedirs(output_dir, exist_ok=True)
+output_path = os.path.join(output_dir, "clipped_solar_cf_monthly.tif")
 
-# Step 1: Clip and save all rasters
-for raster_path in raster_files:
-    print(f"📦 Processing raster: {raster_path}")
-    
-    basename = os.path.basename(raster_path)
-    month_num = int(basename.split('_')[3].split('.')[0])
-    month_name = month_names.get(month_num, f"Month {month_num}")
-    
-    with rasterio.open(raster_path) as src:
-        if polygon_gdf.crs != src.crs:
-            polygon_proj = polygon_gdf.to_crs(src.crs)
-        else:
-            polygon_proj = polygon_gdf
-        
-        geoms = [feature["geometry"] for feature in polygon_proj.__geo_interface__["features"]]
-        out_image, out_transform = mask(src, geoms, crop=True)
-        
-        out_meta = src.meta.copy()
-        out_meta.update({
-            "driver": "GTiff",
-            "height": out_image.shape[1],
-            "width": out_image.shape[2],
-            "transform": out_transform
-        })
-        
-        out_raster_path = os.path.join(output_dir, f"clipped_{basename}")
-        with rasterio.open(out_raster_path, "w", **out_meta) as dest:
-            dest.write(out_image)
-        print(f"✅ Saved clipped raster to {out_raster_path}")
+# Step 1: Mask all months and save them as one multi-band raster (band = month).
+# The polygons are rasterized once per shard and that mask applied to every
+# month, and the pieces are pasted into the crop window (the polygons' bounding
+# box, as mask(crop=True)).
+polygon_bounds = layer_bounds(input_path)
+with rasterio.open(raster_path) as src:
+    crop = geometry_window(src, [box(*polygon_bounds)])
+    fill = src.nodata if src.nodata is not None else 0
+    out_meta = src.meta.copy()
+    out_meta.update({
+        "driver": "GTiff",
+        "count": src.count,
+        "height": int(crop.height),
+        "width": int(crop.width),
+        "transform": src.window_transform(crop)
+    })
+    out_image = np.full((src.count, int(crop.height), int(crop.width)), fill, dtype=src.dtypes[0])
 
-# Step 2: Re-import and plot the clipped rasters
-clipped_raster_files = [os.path.join(output_dir, f) for f in os.listdir(output_dir) if f.endswith('.tif')]
+shards = make_shards(polygon_bounds, shard_size)
+print(f"📦 Masking {len(months)} months in {len(shards)} shards")
+with instrument.step("mask shards"):
+    for piece in run_sharded(mask_task, shards, input_path, raster_path, crop, workers=workers, key=mask_key):
+        if piece is not None:
+            window, bands = piece
+            rows, cols = window.toslices()
+            out_image[:, rows, cols] = bands
+    instrument.count(shards=len(shards), pixels_out=out_image.size)
+instrument.read(input_path, features=layer_info(input_path)["rows"])
+instrument.read(raster_path)
 
-for clipped_raster_path in clipped_raster_files:
-    basename = os.path.basename(clipped_raster_path)
-    month_num = int(basename.split('_')[4].split('.')[0])
-    month_name = month_names.get(month_num, f"Month {month_num}")
-    
-    with rasterio.open(clipped_raster_path) as clipped_src:
-        fig, ax = plt.subplots(figsize=(10, 10))
-        show(clipped_src.read(1), transform=clipped_src.transform, ax=ax, cmap=cmap_red_orange_yellow,
-             title=f'Clipped Solar Capacity Factor – {month_name}')
-        ax.set_xlabel("Easting (m)")
-        ax.set_ylabel("Northing (m)")
-        ax.grid(True)
-        plt.tight_layout()
-        plt.show()
+with instrument.step("write"), rasterio.open(output_path, "w", **out_meta) as dest:
+    dest.write(out_image)
+    for band, month in enumerate(months, start=1):
+        dest.set_band_description(band, f"Solar Capacity Factor - Month {month}")
+        dest.update_tags(band, month=month)
+instrument.wrote(output_path, pixels=out_image.size)
+print(f"✅ Saved {len(months)} masked months to {output_path}")
 
+# Step 2: Re-import and plot the masked months
+with rasterio.open(output_path) as clipped_src:
+    for band in range(1, clipped_src.count + 1):
+        month_num = int(clipped_src.tags(band)["month"])
+        if month_num not in plot_months:
+            continue
+        plots.image(clipped_src.read(band), f'Clipped Solar Capacity Factor – {calendar.month_name[month_num]}',
+                    figsize=(10, 10), extent=plotting_extent(clipped_src), cmap=cmap_red_orange_yellow,
+                    axis_off=False, xlabel="Easting (m)", ylabel="Northing (m)", grid=True)
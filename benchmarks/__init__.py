@@ -0,0 +1 @@
+"""Benchmarks of the pipeline stages on seeded synthetic inputs (see ``benchmarks.run``)."""
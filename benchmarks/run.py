@@ -0,0 +1,180 @@
+"""Time every pipeline stage on synthetic inputs at several scales.
+
+    python -m benchmarks.run                       # scales 1, 4 and 16, every stage
+    python -m benchmarks.run --scales 1 4 --stages dem terrain_score
+    python -m benchmarks.run --report              # compare the stored results
+
+Each scale gets a workspace under ``.bench/<scale>x`` laid out like the repo,
+with the stage scripts and ``pipeline`` symlinked from this checkout (so the
+code under test is always the working tree) and inputs generated by
+``benchmarks.synthetic``. The inputs are only regenerated when the seed or
+the generator settings change. Stages run one at a time in their own process,
+in pipeline order; wall time, CPU time and peak RSS come from the process's
+rusage, and the wall time of each instrumented step from the stage's
+``pipeline.instrument`` report. Every run appends one JSON line per stage to
+``.bench/results.jsonl`` (untracked, like the workspaces) with the commit,
+host and input sizes, and ``--report`` prints, per stage, the latest time at
+each scale, the change against the previous run on this host and how the
+time grows with area.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from benchmarks import synthetic
+from pipeline.stages import STAGES
+
+WORK_DIR = ".bench"
+RESULTS_PATH = os.path.join(WORK_DIR, "results.jsonl")
+SCALES = (1, 4, 16)
+# Slowdown against the previous run (fraction) reported as a regression
+REGRESSION = 0.2
+
+# The download stage talks to the CDS; its output is generated instead
+SKIP = {"sunlight_download"}
+# State a stage keeps between runs to skip work, removed first so every run
+# is timed from scratch
+STATE_FILES = {"sunlight": ["1-Sunlight-Hours/climatology_state.npz"]}
+
+
+def generate(workspace, scale, seed, dem_resolution):
+    """Make sure ``workspace`` holds the synthetic inputs for these settings; returns their sizes.
+
+    Generating runs in its own process, so the arrays it builds don't count
+    towards the peak RSS of the stage processes started from this one.
+    """
+    settings = {"scale": scale, "seed": seed, "dem_resolution": dem_resolution}
+    marker = os.path.join(workspace, synthetic.MARKER)
+    if not os.path.exists(marker) or synthetic.read_marker(marker)["settings"] != settings:
+        subprocess.run([sys.executable, "-m", "benchmarks.synthetic", workspace, "--scale", str(scale),
+                        "--seed", str(seed), "--dem-resolution", str(dem_resolution)], check=True)
+    return synthetic.read_marker(marker)["sizes"]
+
+
+def link_code(workspace):
+    # Point the workspace at this checkout's scripts and pipeline package
+    root = os.getcwd()
+    for path in ["pipeline"] + [stage.script for stage in STAGES]:
+        link = os.path.join(workspace, path)
+        os.makedirs(os.path.dirname(link) or workspace, exist_ok=True)
+        if not os.path.lexists(link):
+            os.symlink(os.path.join(root, path), link)
+
+
+def run_stage(workspace, stage):
+    """Run one stage script in ``workspace``; returns its measurements."""
+    log_path = os.path.join(workspace, "logs", f"{stage.name}.log")
+    report_path = os.path.join(workspace, "logs", f"{stage.name}.json")
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    for path in stage.outputs:
+        if os.path.splitext(path)[1]:
+            os.makedirs(os.path.join(workspace, os.path.dirname(path)), exist_ok=True)
+    for path in STATE_FILES.get(stage.name, []):
+        if os.path.exists(os.path.join(workspace, path)):
+            os.remove(os.path.join(workspace, path))
+    env = dict(os.environ, MPLBACKEND="Agg", SOLAR_PLOTS="off", SOLAR_EXPORT_SHP="0",
+               SOLAR_REPORT=os.path.abspath(report_path))
+    start = time.perf_counter()
+    with open(log_path, "w") as log:
+        proc = subprocess.Popen([sys.executable, stage.script], cwd=workspace, stdout=log,
+                                stderr=subprocess.STDOUT, env=env)
+        _, status, usage = os.wait4(proc.pid, 0)
+    wall = time.perf_counter() - start
+    steps = {}
+    if os.path.exists(report_path):
+        with open(report_path) as f:
+            steps = {step["path"]: step["wall_s"] for step in json.load(f)["steps"]}
+    return {
+        "status": "ok" if os.waitstatus_to_exitcode(status) == 0 else "failed",
+        "wall_s": round(wall, 3),
+        "cpu_s": round(usage.ru_utime + usage.ru_stime, 3),
+        "max_rss_mb": round(usage.ru_maxrss / 1024, 1),  # KiB on Linux
+        "steps": steps,
+        "log": log_path,
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark(scales, stages, seed, dem_resolution, results_path):
+    run = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": _commit(), "host": platform.node(),
+           "cpus": os.cpu_count(), "python": platform.python_version(), "seed": seed}
+    for scale in scales:
+        workspace = os.path.join(WORK_DIR, f"{scale}x")
+        print(f"Scale {scale}x ({workspace})")
+        os.makedirs(workspace, exist_ok=True)
+        sizes = generate(workspace, scale, seed, dem_resolution)
+        link_code(workspace)
+        for stage in STAGES:
+            if stage.name in SKIP or (stages and stage.name not in stages):
+                continue
+            result = run_stage(workspace, stage)
+            print(f"  {stage.name:20s} {result['status']:6s} {result['wall_s']:8.1f}s wall "
+                  f"{result['cpu_s']:8.1f}s cpu {result['max_rss_mb']:8.0f} MB")
+            record = dict(run, scale=scale, stage=stage.name, inputs=sizes, **result)
+            with open(results_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+
+def report(results_path, host=None):
+    """Latest wall time per stage and scale, its change against the previous
+    run on the same host, and the growth exponent of time with area."""
+    with open(results_path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    host = host or platform.node()
+    records = [r for r in records if r["host"] == host and r["status"] == "ok"]
+    if not records:
+        print(f"No successful runs from {host} in {results_path}")
+        return
+    scales = sorted({r["scale"] for r in records})
+    print(f"Wall time (s) on {host}; change vs the previous run; time ~ area^k")
+    print(f"{'stage':20s}" + "".join(f"{str(s) + 'x':>18s}" for s in scales) + f"{'k':>7s}")
+    for stage in [s.name for s in STAGES]:
+        runs = {s: [r for r in records if r["stage"] == stage and r["scale"] == s] for s in scales}
+        if not any(runs.values()):
+            continue
+        cells, points = [], []
+        for s in scales:
+            if not runs[s]:
+                cells.append(f"{'-':>18s}")
+                continue
+            latest = runs[s][-1]
+            change = ""
+            if len(runs[s]) > 1:
+                ratio = latest["wall_s"] / max(runs[s][-2]["wall_s"], 1e-9) - 1
+                change = f" {ratio:+.0%}" + ("!" if ratio > REGRESSION else " ")
+            cells.append(f"{latest['wall_s']:>10.1f}{change:>8s}")
+            points.append((latest["inputs"]["area_km2"], latest["wall_s"]))
+        k = np.polyfit(*np.log(np.array(points)).T, 1)[0] if len(points) > 1 else np.nan
+        print(f"{stage:20s}" + "".join(cells) + f"{k:>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic inputs.")
+    parser.add_argument("--scales", type=int, nargs="+", default=list(SCALES),
+                        help="study areas as multiples of 1/16 of the island")
+    parser.add_argument("--stages", nargs="+", help="only these stages (their inputs must exist)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dem-resolution", type=float, default=30, help="synthetic DEM pixel size (m)")
+    parser.add_argument("--results", default=RESULTS_PATH, help="JSON lines file the results are appended to")
+    parser.add_argument("--report", action="store_true", help="only print the comparison of stored results")
+    args = parser.parse_args()
+    if not args.report:
+        benchmark(args.scales, args.stages, args.seed, args.dem_resolution, args.results)
+    report(args.results)
+
+
+if __name__ == "__main__":
+    main()
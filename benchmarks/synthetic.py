@@ -0,0 +1,296 @@
+"""Seeded synthetic stand-ins for the pipeline's private inputs.
+
+Everything is generated from one seed over a study area in EPSG:2157. The
+terrain is a fixed function of position (octaves of cubic-interpolated noise
+on lattices laid over the whole island), so the study area of a smaller scale
+is an exact crop of a larger one and the scales only differ in area.
+
+* ``fractal_dem`` - elevation in metres (0 = sea), fBm-like relief on an
+  island-shaped base, written tile by tile
+* ``land_cover`` - Voronoi polygons on land with CORINE 2018 codes and class
+  names drawn with roughly Ireland's class frequencies, as a shapefile in
+  ETRS89-LAEA like the CLC download
+* ``line_map`` - a rendered transmission map: coloured lines between
+  substations, with town labels, in the EirGrid map's colours and scale; the
+  drawn network is also written as the traced-lines layer, so the later
+  stages have their input even where OCR isn't installed
+* ``cf_netcdfs`` - hourly solar capacity factors on the 0.25 degree CDS grid,
+  one NetCDF per month
+
+``python -m benchmarks.synthetic <workspace> --scale N`` writes all of them at
+the repo's paths under ``<workspace>``.
+"""
+import argparse
+import json
+import os
+import time
+
+import cv2
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import rasterio
+import shapely
+import xarray as xr
+from rasterio.transform import from_origin
+from rasterio.warp import transform_bounds
+
+from pipeline.raster import block_profile, iter_windows
+from pipeline.shards import CRS
+from pipeline.vectors import write_layer
+
+# Settings and sizes of the inputs in a workspace
+MARKER = "inputs.json"
+
+# The island in EPSG:2157 (360 x 460 km); scale 16 is all of it and smaller
+# scales are centred in it
+ISLAND = (410000, 510000, 770000, 970000)
+FULL_SCALE = 16
+
+# (spacing in metres, amplitude in metres) of the terrain octaves
+OCTAVES = [(64000, 260), (32000, 150), (16000, 90), (8000, 55), (4000, 32), (2000, 18),
+           (1000, 10), (500, 6), (250, 3)]
+
+# CORINE 2018 classes with roughly their share of Ireland's polygons
+CLC_CLASSES = [
+    ("231", "Pastures", 0.50),
+    ("412", "Peat bogs", 0.12),
+    ("243", "Land principally occupied by agriculture, with significant areas of natural vegetation", 0.07),
+    ("211", "Non-irrigated arable land", 0.04),
+    ("312", "Coniferous forest", 0.05),
+    ("324", "Transitional woodland-shrub", 0.04),
+    ("321", "Natural grasslands", 0.03),
+    ("322", "Moors and heathland", 0.03),
+    ("112", "Discontinuous urban fabric", 0.03),
+    ("512", "Water bodies", 0.02),
+    ("311", "Broad-leaved forest", 0.015),
+    ("313", "Mixed forest", 0.01),
+    ("333", "Sparsely vegetated areas", 0.01),
+    ("332", "Bare rocks", 0.005),
+    ("411", "Inland marshes", 0.005),
+    ("142", "Sport and leisure facilities", 0.005),
+    ("131", "Mineral extraction sites", 0.003),
+    ("132", "Dump sites", 0.002),
+]
+
+# BGR line colours inside the EirGrid script's HSV ranges (red, orange, blue,
+# green, black), most common first
+LINE_COLOURS = [(30, 30, 220), (220, 80, 0), (40, 170, 60), (0, 140, 255), (30, 30, 30)]
+
+
+def study_area(scale):
+    # (minx, miny, maxx, maxy) covering scale/16 of the island, on whole km
+    minx, miny, maxx, maxy = ISLAND
+    half = np.sqrt(scale / FULL_SCALE) / 2
+    cx, cy = (minx + maxx) / 2, (miny + maxy) / 2
+    return (round(cx - half * (maxx - minx), -3), round(cy - half * (maxy - miny), -3),
+            round(cx + half * (maxx - minx), -3), round(cy + half * (maxy - miny), -3))
+
+
+class Terrain:
+    """Elevation as a function of EPSG:2157 position, the same for every scale."""
+
+    def __init__(self, seed):
+        rng = np.random.default_rng([seed, 1])
+        minx, miny, maxx, maxy = ISLAND
+        self.lattices = []
+        for spacing, amplitude in OCTAVES:
+            shape = (int((maxy - miny) / spacing) + 4, int((maxx - minx) / spacing) + 4)
+            self.lattices.append((spacing, (rng.standard_normal(shape) * amplitude).astype(np.float32)))
+
+    def elevation(self, x, y):
+        # Metres above sea level (0 at sea) at map coordinates x, y (arrays of
+        # any shape)
+        minx, miny, maxx, maxy = ISLAND
+        shape = np.shape(x)
+        # cv2.remap takes maps under 32767 a side, so look up rows of 1024
+        pad = -np.size(x) % 1024
+        x = np.pad(np.ravel(x), (0, pad)).reshape(-1, 1024)
+        y = np.pad(np.ravel(y), (0, pad)).reshape(-1, 1024)
+        z = np.zeros(x.shape, dtype=np.float32)
+        for spacing, lattice in self.lattices:
+            map_x = ((x - minx) / spacing + 1).astype(np.float32)
+            map_y = ((maxy - y) / spacing + 1).astype(np.float32)
+            z += cv2.remap(lattice, map_x, map_y, cv2.INTER_CUBIC, borderMode=cv2.BORDER_REFLECT)
+        # An elliptical island: high inland, sinking below the sea at the edges
+        u = (x - (minx + maxx) / 2) / ((maxx - minx) / 2)
+        v = (y - (miny + maxy) / 2) / ((maxy - miny) / 2)
+        z += (1 - (u * u + v * v)) * 400 - 120
+        return np.maximum(z, 0).ravel()[:z.size - pad].reshape(shape)
+
+
+def _grid(bounds, resolution):
+    minx, miny, maxx, maxy = bounds
+    width, height = int(round((maxx - minx) / resolution)), int(round((maxy - miny) / resolution))
+    return from_origin(minx, maxy, resolution, resolution), width, height
+
+
+def fractal_dem(path, bounds, terrain, resolution=30, tile_size=2048):
+    """Float32 GeoTIFF of ``terrain`` over ``bounds``; returns its pixel count."""
+    transform, width, height = _grid(bounds, resolution)
+    profile = block_profile({"driver": "GTiff", "height": height, "width": width, "count": 1,
+                             "dtype": "float32", "crs": CRS, "transform": transform},
+                            tile_size, compress="deflate", predictor=3)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with rasterio.open(path, "w", **profile) as dst:
+        for window in iter_windows(width, height, tile_size):
+            cols = np.arange(window.col_off, window.col_off + window.width) + 0.5
+            rows = np.arange(window.row_off, window.row_off + window.height) + 0.5
+            x, y = np.meshgrid(transform.c + cols * resolution, transform.f - rows * resolution)
+            dst.write(terrain.elevation(x, y), 1, window=window)
+    return width * height
+
+
+def land_cover(path, bounds, terrain, seed, per_km2=0.8, vertex_spacing=100):
+    """CORINE-like shapefile over the land in ``bounds``; returns its polygon count."""
+    rng = np.random.default_rng([seed, 2])
+    minx, miny, maxx, maxy = bounds
+    n = int((maxx - minx) * (maxy - miny) / 1e6 * per_km2)
+    points = shapely.points(rng.uniform((minx, miny), (maxx, maxy), (n, 2)))
+    area = shapely.box(*bounds)
+    cells = shapely.get_parts(shapely.voronoi_polygons(shapely.multipoints(points), extend_to=area))
+    cells = shapely.intersection(cells, area)
+    centre = shapely.get_coordinates(shapely.point_on_surface(cells))
+    cells = cells[terrain.elevation(centre[:, 0], centre[:, 1]) > 0]
+    # Digitised boundaries have a vertex every ~100 m, not just the corners
+    cells = shapely.segmentize(cells, vertex_spacing)
+
+    codes, names, weights = zip(*CLC_CLASSES)
+    pick = rng.choice(len(codes), size=len(cells), p=np.array(weights) / sum(weights))
+    gdf = gpd.GeoDataFrame({
+        "ID": np.arange(1, len(cells) + 1),
+        "Code_18": np.array(codes)[pick],
+        "Area_Ha": shapely.area(cells) / 1e4,
+        "Class_Desc": np.array(names)[pick],
+    }, geometry=cells, crs=CRS).to_crs("EPSG:3035")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    gdf.to_file(path)
+    return len(gdf)
+
+
+def _town_name(rng):
+    syllables = ["bally", "kil", "drum", "carrick", "dun", "clon", "ross", "more", "beg", "lough",
+                 "glen", "knock", "tully", "ard", "rath", "an", "owen", "castle", "bridge", "field"]
+    name = "".join(rng.choice(syllables, size=rng.integers(2, 4)))
+    return name.capitalize()
+
+
+def line_map(path, lines_path, bounds, terrain, seed, resolution=57, per_1000_km2=1.6):
+    """EirGrid-style RGB map of a random network over ``bounds``; returns (pixels, lines).
+
+    Substations are scattered over the land and joined to their Delaunay
+    neighbours (the short edges), each line wobbling between its ends and
+    drawn 3-5 px wide and anti-aliased, with a town name next to most
+    substations.
+    """
+    rng = np.random.default_rng([seed, 3])
+    transform, width, height = _grid(bounds, resolution)
+    minx, miny, maxx, maxy = bounds
+    n = max(4, int((maxx - minx) * (maxy - miny) / 1e9 * per_1000_km2))
+    xy = rng.uniform((minx, miny), (maxx, maxy), (n * 2, 2))
+    xy = xy[terrain.elevation(xy[:, 0], xy[:, 1]) > 0][:n]
+
+    edges = shapely.get_parts(shapely.delaunay_triangles(shapely.multipoints(xy), only_edges=True))
+    edges = edges[shapely.length(edges) < np.percentile(shapely.length(edges), 60)]
+    lines = []
+    for edge in edges:
+        (x0, y0), (x1, y1) = shapely.get_coordinates(edge)
+        t = np.linspace(0, 1, 24)[:, None]
+        wobble = np.cumsum(rng.normal(0, 300, (24, 2)), axis=0)
+        wobble -= t * wobble[-1]
+        lines.append(shapely.linestrings((1 - t) * [x0, y0] + t * [x1, y1] + wobble))
+
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+    pick = rng.choice(len(LINE_COLOURS), size=len(lines), p=[0.35, 0.3, 0.2, 0.1, 0.05])
+    for line, colour in zip(lines, pick):
+        coords = shapely.get_coordinates(line)
+        cols = (coords[:, 0] - transform.c) / resolution
+        rows = (transform.f - coords[:, 1]) / resolution
+        points = np.column_stack([cols, rows]).round().astype(np.int32)
+        cv2.polylines(image, [points], False, LINE_COLOURS[colour], int(rng.integers(3, 6)), cv2.LINE_AA)
+    for x, y in xy:
+        col, row = int((x - transform.c) / resolution), int((transform.f - y) / resolution)
+        cv2.rectangle(image, (col - 6, row - 6), (col + 6, row + 6), (30, 30, 30), -1)
+        if rng.random() < 0.8:
+            cv2.putText(image, _town_name(rng), (col + 12, row - 8), cv2.FONT_HERSHEY_SIMPLEX,
+                        0.7, (20, 20, 20), 2, cv2.LINE_AA)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with rasterio.open(path, "w", driver="GTiff", height=height, width=width, count=3, dtype="uint8",
+                       crs=CRS, transform=transform, compress="deflate") as dst:
+        dst.write(np.moveaxis(image, -1, 0))
+    write_layer(gpd.GeoDataFrame(geometry=lines, crs=CRS), lines_path)
+    return width * height, len(lines)
+
+
+def cf_netcdfs(folder, bounds, seed, years=(2019, 2020), step=0.25):
+    """Hourly ``spv_cf`` NetCDFs, one per month, on the CDS grid over ``bounds``.
+
+    The capacity factor follows the sun (day length and height by month)
+    times a cloudiness that varies smoothly in space and hour to hour.
+    Returns the number of files.
+    """
+    west, south, east, north = transform_bounds(CRS, "EPSG:4326", *bounds)
+    latitude = np.arange(np.ceil(north / step) * step, np.floor(south / step) * step - step / 2, -step)
+    longitude = np.arange(np.floor(west / step) * step, np.ceil(east / step) * step + step / 2, step)
+    os.makedirs(folder, exist_ok=True)
+    count = 0
+    for year in years:
+        for month in range(1, 13):
+            rng = np.random.default_rng([seed, 4, year, month])
+            time = pd.date_range(f"{year}-{month:02d}-01", periods=pd.Period(f"{year}-{month:02d}").days_in_month * 24,
+                                 freq="h")
+            hour = time.hour.values[:, None, None]
+            day_length = 12 - 4.5 * np.cos(2 * np.pi * (month - 0.5) / 12)
+            sun = np.clip(np.sin(np.pi * (hour - (12 - day_length / 2)) / day_length), 0, None)
+            peak = 0.55 - 0.25 * np.cos(2 * np.pi * (month - 0.5) / 12)
+            coarse = rng.random((len(time) // 6 + 2, 3, 3)).astype(np.float32)
+            cloud = np.stack([cv2.resize(c, (len(longitude), len(latitude)), interpolation=cv2.INTER_LINEAR)
+                              for c in coarse])
+            cloud = np.repeat(cloud, 6, axis=0)[:len(time)]
+            values = (sun * peak * (1 - 0.8 * cloud)).astype(np.float32)
+            ds = xr.Dataset({"spv_cf": (("time", "latitude", "longitude"), values)},
+                            coords={"time": time, "latitude": latitude, "longitude": longitude})
+            ds.to_netcdf(os.path.join(folder, f"cf_{year}_{month:02d}.nc"))
+            count += 1
+    return count
+
+
+def read_marker(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def generate(workspace, scale, seed=0, dem_resolution=30):
+    """Write every synthetic input for ``scale`` into ``workspace``; returns their sizes."""
+    bounds = study_area(scale)
+    terrain = Terrain(seed)
+    start = time.perf_counter()
+    sizes = {"area_km2": float((bounds[2] - bounds[0]) * (bounds[3] - bounds[1]) / 1e6)}
+    sizes["dem_pixels"] = fractal_dem(
+        os.path.join(workspace, "1-DEM/dem_irl_itm-1.tif"), bounds, terrain, dem_resolution)
+    sizes["land_cover_polygons"] = land_cover(
+        os.path.join(workspace, "1-Land-Cover/CLC18_IE/CLC18_IE.shp"), bounds, terrain, seed)
+    sizes["map_pixels"], sizes["network_lines"] = line_map(
+        os.path.join(workspace, "1-EirGrid-Map/EirGridMap-raster/EirGridMap.tif"),
+        os.path.join(workspace, "1-EirGrid-Map/transmission_map_lines.parquet"), bounds, terrain, seed)
+    sizes["cf_files"] = cf_netcdfs(os.path.join(workspace, "1-Sunlight-Hours/ireland_solar"), bounds, seed)
+    print(f"  generated {scale}x inputs in {time.perf_counter() - start:.1f}s: {sizes}")
+    settings = {"scale": scale, "seed": seed, "dem_resolution": dem_resolution}
+    with open(os.path.join(workspace, MARKER), "w") as f:
+        json.dump({"settings": settings, "sizes": sizes}, f, indent=1)
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic pipeline inputs into a workspace.")
+    parser.add_argument("workspace")
+    parser.add_argument("--scale", type=int, default=1, help="study area as a multiple of 1/16 of the island")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dem-resolution", type=float, default=30, help="DEM pixel size (m)")
+    args = parser.parse_args()
+    generate(args.workspace, args.scale, args.seed, args.dem_resolution)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+"""Shared helpers for the solar farm suitability scripts.
+
+The numbered stage scripts are run from the repository root, so they add "."
+to ``sys.path`` before importing from this package.
+"""
@@ -0,0 +1,220 @@
+"""Trace the centrelines of drawn lines as one polyline network.
+
+Contour tracing follows both edges of every drawn line, so each line comes
+out as a closed loop. Here the ink mask is thinned to a one-pixel skeleton
+(Zhang-Suen), the skeleton is cut at its junction pixels into simple paths,
+each path is ordered by walking its 8-connected outline (OpenCV returns it
+end to end and back), and the paths are joined to the centres of the
+junctions they touch. Short spurs, which thinning grows from the corners and
+bumps of thick lines, are dropped, and segments are merged through the
+junctions that are left with only two of them.
+"""
+import cv2
+import numpy as np
+import shapely
+
+from pipeline.vectorize import pixel_to_map
+
+# 8-neighbour offsets P2..P9, clockwise from north, as in Zhang & Suen (1984)
+_NEIGHBOURS = [(-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1)]
+_RING = np.ones((3, 3), dtype=np.float32)
+_RING[1, 1] = 0
+
+
+def fill_holes(mask, max_area):
+    """Copy of ``mask`` with holes of up to ``max_area`` pixels (bounding box) filled.
+
+    Specks of background inside a thick line would otherwise thin into
+    little loops around them.
+    """
+    mask = (np.asarray(mask) > 0).astype(np.uint8)
+    contours, hierarchy = cv2.findContours(mask, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)
+    holes = [c for c, (_, _, _, parent) in zip(contours, hierarchy[0] if contours else [])
+             if parent != -1 and np.prod(cv2.boundingRect(c)[2:]) <= max_area]
+    cv2.drawContours(mask, holes, -1, 1, thickness=cv2.FILLED)
+    return mask
+
+
+def _neighbourhood(flat, pixels, offsets):
+    # (pixels, 8) values of P2..P9 around each pixel
+    return flat[pixels[:, None] + offsets]
+
+
+def thin(mask):
+    """uint8 one-pixel-wide skeleton (1 = skeleton) of non-zero ``mask``.
+
+    Zhang-Suen thinning, evaluated only at the pixels still set rather than
+    over the whole image, so each pass costs in proportion to the ink. It
+    leaves staircases two pixels thick on diagonals, whose corner pixels
+    would read as junctions, so those are then removed too: any pixel with
+    two or more neighbours whose removal keeps them connected, a quarter of
+    the image (one pixel of every 2x2 block) at a time so that no two
+    neighbours go in the same step.
+    """
+    height, width = mask.shape
+    stride = width + 2
+    image = np.zeros((height + 2, width + 2), dtype=np.uint8)
+    image[1:-1, 1:-1] = np.asarray(mask) > 0
+    flat = image.ravel()
+    offsets = np.array([dr * stride + dc for dr, dc in _NEIGHBOURS])
+    pixels = np.flatnonzero(flat)
+
+    # A pixel kept by a sub-iteration can only change status once one of its
+    # neighbours goes, so after the first two sub-iterations only the
+    # neighbours of the last two sub-iterations' deletions are looked at
+    candidates, deleted, step, first = pixels, [pixels[:0]], 0, True
+    while len(candidates):
+        p = _neighbourhood(flat, candidates, offsets)
+        neighbours = p.sum(axis=1)
+        transitions = ((p == 0) & (np.roll(p, -1, axis=1) == 1)).sum(axis=1)
+        if step == 0:
+            cut = (p[:, 0] * p[:, 2] * p[:, 4] == 0) & (p[:, 2] * p[:, 4] * p[:, 6] == 0)
+        else:
+            cut = (p[:, 0] * p[:, 2] * p[:, 6] == 0) & (p[:, 0] * p[:, 4] * p[:, 6] == 0)
+        delete = candidates[(neighbours >= 2) & (neighbours <= 6) & (transitions == 1) & cut]
+        flat[delete] = 0
+        deleted = [deleted[-1], delete]
+        step = 1 - step
+        if first:
+            # The second sub-iteration sees every pixel too
+            candidates, first = candidates[flat[candidates] == 1], False
+            continue
+        near = np.zeros_like(flat, dtype=bool)
+        for delete in deleted:
+            near[delete[:, None] + offsets] = True
+        pixels = pixels[flat[pixels] == 1]
+        candidates = pixels[near[pixels]]
+    pixels = np.flatnonzero(flat)
+
+    # Yokoi's 8-connectivity number: 1 when the neighbours stay connected
+    rows, cols = np.divmod(pixels, stride)
+    subfield = (rows % 2) * 2 + cols % 2
+    changed = True
+    while changed:
+        changed = False
+        for field in range(4):
+            candidates = np.flatnonzero(subfield == field)
+            q = 1 - _neighbourhood(flat, pixels[candidates], offsets)
+            yokoi = sum(q[:, k] - q[:, k] * q[:, k + 1] * q[:, (k + 2) % 8] for k in (0, 2, 4, 6))
+            delete = (yokoi == 1) & ((1 - q).sum(axis=1) >= 2)
+            if delete.any():
+                flat[pixels[candidates[delete]]] = 0
+                keep = np.ones(len(pixels), dtype=bool)
+                keep[candidates[delete]] = False
+                pixels, subfield = pixels[keep], subfield[keep]
+                changed = True
+    return image[1:-1, 1:-1].copy()
+
+
+def _degree(image):
+    # Number of set 8-neighbours of every pixel
+    return cv2.filter2D(image, cv2.CV_8U, _RING, borderType=cv2.BORDER_CONSTANT)
+
+
+def trace_skeleton(skeleton):
+    """Pixel paths of ``skeleton``: a list of (n, 2) float (col, row) arrays.
+
+    Paths run between end pixels and junctions; a path touching a junction
+    (a cluster of pixels with three or more skeleton neighbours) ends at the
+    cluster's centre, so paths meeting there share that point exactly.
+    """
+    skeleton = (np.asarray(skeleton) > 0).astype(np.uint8)
+    junction = skeleton & (_degree(skeleton) >= 3)
+    _, clusters, _, centres = cv2.connectedComponentsWithStats(junction, connectivity=8)
+    segments = skeleton & (junction == 0)
+    ends = _degree(segments) <= 1
+
+    def touching(col, row):
+        # Junction clusters in the 8-neighbourhood of a pixel
+        window = clusters[max(row - 1, 0):row + 2, max(col - 1, 0):col + 2]
+        return list(np.unique(window[window > 0]))
+
+    contours, hierarchy = cv2.findContours(segments, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_NONE)
+    paths = []
+    for contour, (_, _, _, parent) in zip(contours, hierarchy[0] if contours else []):
+        if parent != -1:
+            continue  # the inside of a closed path
+        points = contour.reshape(-1, 2)
+        at_end = np.flatnonzero(ends[points[:, 1], points[:, 0]])
+        if len(points) == 1:
+            path = points
+        elif len(at_end) == 0:
+            path = np.vstack([points, points[:1]])  # a closed loop
+        else:
+            # The outline of an open path goes from one end to the other and
+            # back: start at an end and stop at the next one
+            points = np.roll(points, -at_end[0], axis=0)
+            path = points[:(at_end[1] - at_end[0] if len(at_end) > 1 else len(points) - 1) + 1]
+        path = path.astype(np.float64)
+
+        first, last = touching(*path[0].astype(int)), touching(*path[-1].astype(int))
+        if len(path) == 1:
+            first, last = first[:1], first[1:2]
+        elif path[0].tolist() == path[-1].tolist():
+            first = last = []
+        head = [centres[first[0]]] if first else []
+        tail = [centres[last[0]]] if last else []
+        path = np.vstack(head + [path] + tail)
+        if len(path) >= 2:
+            paths.append(path)
+    return paths
+
+
+def _end_degree(lines):
+    # How many line ends meet at each line's first and last point
+    starts = shapely.get_coordinates(shapely.get_point(lines, 0))
+    stops = shapely.get_coordinates(shapely.get_point(lines, -1))
+    ends = np.vstack([starts, stops])
+    _, inverse, counts = np.unique(ends, axis=0, return_inverse=True, return_counts=True)
+    degree = counts[inverse.ravel()]
+    return degree[:len(lines)], degree[len(lines):]
+
+
+def _merge(lines):
+    # Join lines end to end through points where exactly two of them meet
+    if not len(lines):
+        return lines
+    merged = shapely.line_merge(shapely.multilinestrings(lines))
+    return shapely.get_parts(merged)
+
+
+def prune_spurs(lines, min_length):
+    """Drop lines shorter than ``min_length`` that have a free end.
+
+    A spur (free end to junction) or an isolated fragment (free at both ends)
+    is removed, the remaining lines are merged through the junctions left
+    with two lines, and this repeats until no short free-ended line is left.
+    Lines between two junctions are always kept.
+    """
+    lines = _merge(np.asarray(lines, dtype=object))
+    while len(lines):
+        first, last = _end_degree(lines)
+        closed = shapely.is_closed(lines)
+        free = ((first == 1) | (last == 1)) & ~closed
+        short = free & (shapely.length(lines) < min_length)
+        if not short.any():
+            break
+        lines = _merge(lines[~short])
+    return lines
+
+
+def mask_to_centrelines(mask, transform, min_spur_length=0, tolerance=None, max_hole=25):
+    """LineStrings in map units along the centres of the non-zero ``mask`` lines.
+
+    ``min_spur_length`` and ``tolerance`` (Douglas-Peucker, preserving
+    topology) are in map units; holes in the ink of up to ``max_hole``
+    pixels are filled first.
+    """
+    if max_hole:
+        mask = fill_holes(mask, max_hole)
+    paths = trace_skeleton(thin(mask))
+    if not paths:
+        return np.array([], dtype=object)
+    points = np.concatenate(paths)
+    x, y = pixel_to_map(transform, points[:, 0], points[:, 1])
+    index = np.repeat(np.arange(len(paths)), [len(p) for p in paths])
+    lines = shapely.linestrings(np.column_stack([x, y]), indices=index)
+    lines = prune_spurs(lines, min_spur_length) if min_spur_length else _merge(lines)
+    if tolerance:
+        lines = shapely.simplify(lines, tolerance, preserve_topology=True)
+    return lines[shapely.is_valid(lines) & ~shapely.is_empty(lines)]
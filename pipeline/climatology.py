@@ -0,0 +1,174 @@
+"""Streaming per-month climatology of gridded hourly NetCDF archives.
+
+``Climatology`` reads the NetCDFs one file (and one block of hours) at a time
+and keeps, per calendar month (or per year and month, with ``by_year``) and
+grid cell, the count, mean and sum of squared deviations of the values
+(Welford / Chan et al.'s parallel update). That state is a few arrays the size
+of the grid, saved to a small ``.npz``, so adding a year of data only reads
+the new files.
+"""
+import io
+import json
+import os
+
+import numpy as np
+import xarray as xr
+
+
+def _round_coords(ds):
+    # Round coordinates for consistency, so every file lands on the same grid
+    return ds.assign_coords(latitude=ds["latitude"].round(4), longitude=ds["longitude"].round(4))
+
+
+def _signature(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+class Climatology:
+    """Running per-month mean and variance of ``variable``, kept in ``path``.
+
+    The accumulators are (layer, latitude, longitude) arrays; ``layers`` holds
+    each layer's month, or (year, month) with ``by_year``.
+    """
+
+    def __init__(self, path, variable="spv_cf", chunk_hours=24 * 31, by_year=False):
+        self.path = path
+        self.variable = variable
+        self.chunk_hours = chunk_hours
+        self.by_year = by_year
+        self.reset()
+        if os.path.exists(path):
+            with np.load(path) as state:
+                same = "layers" in state and str(state["variable"]) == variable
+                if same and bool(state["by_year"]) == by_year:
+                    self.latitude, self.longitude = state["latitude"], state["longitude"]
+                    self.count, self.mean, self.m2 = state["count"], state["mean"], state["m2"]
+                    self.layers = [tuple(layer) if by_year else layer for layer in json.loads(str(state["layers"]))]
+                    self.files = json.loads(str(state["files"]))
+
+    def reset(self):
+        self.latitude = self.longitude = None
+        self.count = self.mean = self.m2 = None
+        self.layers = []
+        self.files = {}
+
+    def save(self):
+        if self.latitude is None:
+            # The arrays would be saved as pickled None objects that np.load refuses
+            raise ValueError(f"No {self.variable} values have been added, so there is no climatology to save")
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            variable=self.variable,
+            by_year=self.by_year,
+            layers=json.dumps(self.layers),
+            latitude=self.latitude,
+            longitude=self.longitude,
+            count=self.count,
+            mean=self.mean,
+            m2=self.m2,
+            files=json.dumps(self.files, sort_keys=True),
+        )
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp, self.path)
+
+    def update(self, paths):
+        """Fold in any of ``paths`` not seen before; returns how many were read.
+
+        If a file already folded in has changed or is no longer listed, the
+        state is rebuilt from all ``paths``, since it can't be taken back out.
+        """
+        names = {os.path.basename(p): p for p in paths}
+        stale = [n for n, sig in self.files.items() if n not in names or _signature(names[n]) != sig]
+        if stale:
+            print(f"{len(stale)} processed files changed or went missing; rebuilding the climatology")
+            self.reset()
+        new = [p for n, p in sorted(names.items()) if n not in self.files]
+        for path in new:
+            self._add_file(path)
+            self.files[os.path.basename(path)] = _signature(path)
+        return len(new)
+
+    def _add_file(self, path):
+        with xr.open_dataset(path) as ds:
+            ds = _round_coords(ds).sortby("latitude", ascending=False).sortby("longitude")
+            self._check_grid(ds["latitude"].values, ds["longitude"].values)
+            values = ds[self.variable]
+            keys = ds["time"].dt.month.values
+            if self.by_year:
+                keys = ds["time"].dt.year.values * 100 + keys
+            for start in range(0, len(keys), self.chunk_hours):
+                block = values.isel(time=slice(start, start + self.chunk_hours)).values.astype(np.float64)
+                block_keys = keys[start:start + self.chunk_hours]
+                for key in np.unique(block_keys):
+                    layer = divmod(int(key), 100) if self.by_year else int(key)
+                    self._add_batch(self._layer_index(layer), block[block_keys == key])
+
+    def _check_grid(self, latitude, longitude):
+        if self.latitude is None:
+            self.latitude, self.longitude = latitude, longitude
+            shape = (0, len(latitude), len(longitude))
+            self.count = np.zeros(shape, dtype=np.int64)
+            self.mean = np.zeros(shape)
+            self.m2 = np.zeros(shape)
+        elif not (np.array_equal(latitude, self.latitude) and np.array_equal(longitude, self.longitude)):
+            raise ValueError("NetCDF grid differs from the grid of the files already accumulated")
+
+    def _layer_index(self, layer):
+        # Index of a month / (year, month), adding an empty layer the first time
+        if layer not in self.layers:
+            self.layers.append(layer)
+            empty = np.zeros((1,) + self.count.shape[1:])
+            self.count = np.concatenate([self.count, empty.astype(np.int64)])
+            self.mean = np.concatenate([self.mean, empty])
+            self.m2 = np.concatenate([self.m2, empty])
+        return self.layers.index(layer)
+
+    def _add_batch(self, i, block):
+        # Merge a (hours, lat, lon) block's own count/mean/M2 into the running
+        # ones of layer i; NaN hours are skipped per cell
+        valid = ~np.isnan(block)
+        n_b = valid.sum(axis=0)
+        if not n_b.any():
+            return
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_b = np.where(valid, block, 0).sum(axis=0) / n_b
+            m2_b = np.where(valid, block - mean_b, 0) ** 2
+        m2_b = m2_b.sum(axis=0)
+        mean_b = np.nan_to_num(mean_b)
+
+        n_a = self.count[i]
+        n = n_a + n_b
+        with np.errstate(invalid="ignore", divide="ignore"):
+            delta = mean_b - self.mean[i]
+            self.mean[i] = np.where(n > 0, self.mean[i] + delta * (n_b / n), 0)
+            self.m2[i] = np.where(n > 0, self.m2[i] + m2_b + delta ** 2 * (n_a * n_b / n), 0)
+        self.count[i] = n
+
+    def _cube(self, values, name):
+        # (layer, latitude, longitude) DataArray in time order, NaN in cells
+        # without any data; layers carry `month` (and `year`) coordinates
+        order = sorted(range(len(self.layers)), key=lambda i: self.layers[i])
+        layers = [self.layers[i] for i in order]
+        coords = {"latitude": self.latitude, "longitude": self.longitude}
+        if self.by_year:
+            coords["year"] = ("layer", [year for year, _ in layers])
+            coords["month"] = ("layer", [month for _, month in layers])
+        else:
+            coords["month"] = ("layer", layers)
+        return xr.DataArray(values[order], dims=("layer", "latitude", "longitude"), coords=coords, name=name)
+
+    def layer_mean(self):
+        return self._cube(np.where(self.count > 0, self.mean, np.nan), self.variable)
+
+    def layer_std(self):
+        # Sample standard deviation of the hourly values
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self._cube(np.sqrt(np.where(self.count > 1, self.m2 / (self.count - 1), np.nan)),
+                              f"{self.variable}_std")
+
+    def layer_count(self):
+        return self._cube(self.count, f"{self.variable}_count")
@@ -0,0 +1,49 @@
+"""Clip polygons to the union of a set of mask polygons.
+
+``gpd.overlay(how='intersection')`` intersects every polygon with every mask
+polygon it touches, so overlapping masks (e.g. the 3 km line buffers) produce
+one output piece per overlapping mask and the candidate pairs grow with both
+layers. Here the masks are dissolved once and an STRtree sorts the polygons
+into those fully inside the union (kept as they are), disjoint from it
+(dropped) and crossing its boundary (the only ones actually intersected).
+"""
+import geopandas as gpd
+import numpy as np
+import shapely
+
+
+def _polygonal(geometries):
+    # Polygon parts only, as overlay's keep_geom_type=True: an intersection can
+    # leave slivers of boundary lines or points. Empty where nothing is left.
+    out = np.array(geometries, dtype=object)
+    mixed = ~np.isin(shapely.get_type_id(out), (3, 6))  # Polygon, MultiPolygon
+    for i in np.flatnonzero(mixed):
+        parts = shapely.get_parts(out[i])
+        parts = parts[np.isin(shapely.get_type_id(parts), (3, 6))]
+        out[i] = shapely.union_all(parts) if len(parts) else shapely.Polygon()
+    return out
+
+
+def clip_to_union(gdf, masks):
+    """Rows of ``gdf`` clipped to the union of the ``masks`` geometries.
+
+    Rows that end up empty are dropped; attributes and index are kept. Both
+    inputs must be in the same CRS.
+    """
+    if gdf.empty or len(masks) == 0:
+        return gdf.iloc[:0]
+    area = shapely.union_all(np.asarray(masks))
+    parts = shapely.get_parts(area)
+    geometry = np.array(gdf.geometry.values, dtype=object)
+    tree = shapely.STRtree(geometry)
+
+    touching = np.unique(tree.query(parts, predicate="intersects")[1])
+    inside = np.unique(tree.query(parts, predicate="contains")[1])
+    boundary = np.setdiff1d(touching, inside)
+
+    shapely.prepare(area)
+    geometry[boundary] = _polygonal(shapely.intersection(geometry[boundary], area))
+    keep = np.sort(np.concatenate([inside, boundary[~shapely.is_empty(geometry[boundary])]]))
+    out = gdf.iloc[keep].copy()
+    out[gdf.geometry.name] = gpd.GeoSeries(geometry[keep], index=out.index, crs=gdf.crs)
+    return out
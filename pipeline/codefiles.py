@@ -0,0 +1,32 @@
+"""Source files a script's results depend on, for the cache keys.
+
+Shared by the stage DAG (``pipeline.runner``) and the per-shard cache
+(``pipeline.incremental``) without either importing the other.
+"""
+import ast
+import os
+
+
+def code_files(script):
+    # The script plus every pipeline module it imports, transitively
+    seen, todo = set(), [script]
+    while todo:
+        path = todo.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        with open(path) as f:
+            tree = ast.parse(f.read(), path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+                names = [node.module] + [f"{node.module}.{a.name}" for a in node.names]
+            elif isinstance(node, ast.Import):
+                names = [a.name for a in node.names]
+            else:
+                continue
+            for name in names:
+                if name.split(".")[0] == "pipeline":
+                    module = os.path.join(*name.split(".")) + ".py"
+                    if os.path.exists(module):
+                        todo.append(module)
+    return sorted(seen)
@@ -0,0 +1,63 @@
+"""Classify map pixels as line ink through a colour lookup table.
+
+Whether a pixel is ink depends only on its colour, so the HSV range tests and
+the near-white test are evaluated once for all 2**24 BGR colours into a 16 MB
+table, a block of colours at a time. Classifying the image is then one table
+lookup per pixel, done a strip of rows at a time so no full-image temporaries
+are created.
+"""
+import cv2
+import numpy as np
+
+
+def ink_lut(hsv_ranges, white_threshold=240, chunk_blues=16):
+    """uint8 table indexed by ``b << 16 | g << 8 | r``: 255 for ink, else 0.
+
+    Ink is a colour inside any of the (lower, upper) OpenCV HSV ranges, unless
+    all of its BGR channels are at least ``white_threshold``. Filled
+    ``chunk_blues`` blue levels (65536 colours each) at a time, so the only
+    temporaries besides the table are a few chunk-sized images.
+    """
+    lut = np.empty(1 << 24, dtype=np.uint8)
+    bgr = np.empty((chunk_blues, 256, 256, 3), dtype=np.uint8)
+    bgr[..., 1] = np.arange(256, dtype=np.uint8)[:, None]
+    bgr[..., 2] = np.arange(256, dtype=np.uint8)[None, :]
+    # Green and red are at least white_threshold in the same cells of every chunk
+    light = (bgr[0, ..., 1] >= white_threshold) & (bgr[0, ..., 2] >= white_threshold)
+    for b0 in range(0, 256, chunk_blues):
+        n = min(chunk_blues, 256 - b0)
+        chunk = bgr[:n]
+        chunk[..., 0] = np.arange(b0, b0 + n, dtype=np.uint8)[:, None, None]
+        hsv = cv2.cvtColor(chunk.reshape(n * 256, 256, 3), cv2.COLOR_BGR2HSV)
+        out = lut[b0 << 16:(b0 + n) << 16].reshape(n * 256, 256)
+        out.fill(0)
+        for lower, upper in hsv_ranges:
+            out |= cv2.inRange(hsv, lower, upper)
+        for i in range(n):
+            if b0 + i >= white_threshold:
+                out[i * 256:(i + 1) * 256][light] = 0
+    return lut
+
+
+def blank_boxes(mask, boxes):
+    # Zero each inclusive ((x1, y1), (x2, y2)) rectangle of `mask` in place
+    for (x1, y1), (x2, y2) in boxes:
+        mask[max(y1, 0):y2 + 1, max(x1, 0):x2 + 1] = 0
+    return mask
+
+
+def classify(image, lut, excludes=(), strip_rows=512):
+    """uint8 mask of ``image`` (H, W, 3 BGR): 255 = ink, 0 = background.
+
+    ``excludes`` rectangles are blanked in the mask rather than painted white
+    in a copy of the image.
+    """
+    height = image.shape[0]
+    mask = np.empty(image.shape[:2], dtype=np.uint8)
+    for top in range(0, height, strip_rows):
+        strip = image[top:top + strip_rows]
+        index = strip[..., 0].astype(np.uint32) << 16
+        index |= strip[..., 1].astype(np.uint32) << 8
+        index |= strip[..., 2]
+        np.take(lut, index, out=mask[top:top + strip_rows])
+    return blank_boxes(mask, excludes)
@@ -0,0 +1,118 @@
+"""Cached downloads: CDS requests and plain HTTP files.
+
+Every CDS request is split into one request per year, and each year's zip is
+stored under ``.cache/cds`` by a hash of its (normalised) request, so a rerun,
+or a larger request that overlaps an earlier one, only queues the years that
+aren't cached yet. A download is written to a ``.part`` file and renamed when
+complete, so an interrupted run never leaves a truncated zip in the cache.
+Downloads do not resume: the CDS builds each request's zip afresh, so the
+unit of reuse is the year, and a year interrupted part way is requested again
+from the start (its ``.part`` file is overwritten).
+
+Set ``SOLAR_CDS_OFFLINE=<dir>`` to serve requests from ``LocalClient``, a
+file-based stand-in for the CDS, instead (for testing without credentials or
+network access).
+"""
+import hashlib
+import json
+import os
+import shutil
+import urllib.request
+import zipfile
+
+CACHE_DIR = os.environ.get("SOLAR_CACHE_DIR", ".cache")
+OFFLINE_DIR = os.environ.get("SOLAR_CDS_OFFLINE")
+
+
+def _normalise(request):
+    # Same key however the lists are ordered or whether scalars are wrapped
+    out = {}
+    for name, value in request.items():
+        if isinstance(value, (list, tuple)):
+            value = [str(v) for v in value]
+            if name != "area":  # area is an ordered N/W/S/E box
+                value = sorted(value)
+        out[name] = value
+    return out
+
+
+def request_key(dataset, request):
+    blob = json.dumps({"dataset": dataset, "request": _normalise(request)}, sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest()[:32]
+
+
+class LocalClient:
+    """Stand-in for ``cdsapi.Client`` that answers from files on disk.
+
+    ``retrieve(dataset, request, target)`` zips ``<root>/<dataset>/<year>/*``
+    for the request's single year, the way the per-year requests below ask.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def retrieve(self, dataset, request, target):
+        (year,) = request["year"]
+        folder = os.path.join(self.root, dataset, str(year))
+        if not os.path.isdir(folder):
+            raise FileNotFoundError(f"Offline CDS has no {dataset} data for {year} in {folder}")
+        with zipfile.ZipFile(target, "w") as zf:
+            for name in sorted(os.listdir(folder)):
+                zf.write(os.path.join(folder, name), name)
+
+
+def _client():
+    if OFFLINE_DIR:
+        return LocalClient(OFFLINE_DIR)
+    import cdsapi  # only needed when something actually has to be downloaded
+
+    return cdsapi.Client()
+
+
+def cds_retrieve(dataset, request, client=None):
+    """Paths of the cached zips for ``request``, one per year, fetching the missing ones."""
+    folder = os.path.join(CACHE_DIR, "cds")
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for year in sorted(str(y) for y in request["year"]):
+        sub = dict(request, year=[year])
+        path = os.path.join(folder, f"{request_key(dataset, sub)}.zip")
+        if os.path.exists(path):
+            print(f"{dataset} {year}: cached ({path})")
+        else:
+            print(f"{dataset} {year}: requesting from the CDS")
+            client = client or _client()
+            client.retrieve(dataset, sub, path + ".part")
+            os.replace(path + ".part", path)
+        paths.append(path)
+    return paths
+
+
+def extract(zip_paths, target_dir):
+    # Unzip into target_dir, skipping members already there at the same size
+    os.makedirs(target_dir, exist_ok=True)
+    extracted = 0
+    for zip_path in zip_paths:
+        with zipfile.ZipFile(zip_path) as zf:
+            for member in zf.infolist():
+                out = os.path.join(target_dir, member.filename)
+                if os.path.exists(out) and os.path.getsize(out) == member.file_size:
+                    continue
+                zf.extract(member, target_dir)
+                extracted += 1
+    return extracted
+
+
+def cached_url(url):
+    """Local copy of ``url``, downloaded on first use."""
+    folder = os.path.join(CACHE_DIR, "http")
+    os.makedirs(folder, exist_ok=True)
+    name = hashlib.sha256(url.encode()).hexdigest()[:16] + "-" + os.path.basename(url)
+    path = os.path.join(folder, name)
+    if not os.path.exists(path):
+        if OFFLINE_DIR:
+            raise FileNotFoundError(f"{url} is not cached and SOLAR_CDS_OFFLINE is set")
+        with urllib.request.urlopen(url) as response, open(path + ".part", "wb") as f:
+            shutil.copyfileobj(response, f)
+        os.replace(path + ".part", path)
+    return path
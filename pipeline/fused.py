@@ -0,0 +1,131 @@
+"""Block helpers for evaluating suitability on one aligned raster grid.
+
+Every criterion is brought onto the same EPSG:2157 grid a block at a time:
+vector layers are burned in (pixel centre inside a polygon), rasters on
+other north-up ITM grids are read through a resampling window read, and
+coarse rasters such as the 1 km capacity factor cube are looked up by cell
+index instead of being resampled. Only the final mask is polygonized,
+block by block, with the pieces cut by block edges dissolved at the end.
+"""
+import math
+from dataclasses import dataclass
+
+import numpy as np
+import shapely
+from affine import Affine
+from rasterio import features
+from rasterio.enums import Resampling
+from rasterio.windows import Window, from_bounds
+from rasterio.windows import bounds as window_bounds
+
+CRS = "EPSG:2157"
+
+
+@dataclass(frozen=True)
+class Grid:
+    transform: Affine
+    width: int
+    height: int
+
+    @classmethod
+    def of(cls, src, resolution=None):
+        """``src``'s grid, or one of ``resolution`` metres snapped to its pixel lattice."""
+        if resolution is None or resolution == src.transform.a:
+            return cls(src.transform, src.width, src.height)
+        left, bottom, right, top = src.bounds
+        width = math.ceil((right - left) / resolution)
+        height = math.ceil((top - bottom) / resolution)
+        return cls(Affine(resolution, 0, left, 0, -resolution, top), width, height)
+
+    @property
+    def resolution(self):
+        return self.transform.a
+
+    def bounds(self, window):
+        return window_bounds(window, self.transform)
+
+    def window_transform(self, window):
+        return self.transform * Affine.translation(window.col_off, window.row_off)
+
+    def centres(self, window):
+        # Map x of every column's and y of every row's pixel centre in `window`
+        t = self.window_transform(window)
+        x = t.c + t.a * (np.arange(int(window.width)) + 0.5)
+        y = t.f + t.e * (np.arange(int(window.height)) + 0.5)
+        return x, y
+
+
+def check_crs(src, crs=CRS):
+    if src.crs is None or src.crs.to_string() != crs:
+        raise ValueError(f"{src.name} is in {src.crs}, not {crs}; reproject it first")
+
+
+def read_on_grid(src, grid, window, halo=0, band=1, resampling=Resampling.bilinear):
+    """``band`` of ``src`` resampled onto ``window`` of ``grid``, padded by ``halo`` pixels.
+
+    Reads the source pixels under the window straight into the block's shape
+    (a plain window read when the grids coincide). Outside the source the
+    block holds its nodata value, or NaN when it has none.
+    """
+    padded = Window(window.col_off - halo, window.row_off - halo, window.width + 2 * halo,
+                    window.height + 2 * halo)
+    shape = (int(padded.height), int(padded.width))
+    source = from_bounds(*grid.bounds(padded), src.transform)
+    inside = (source.col_off >= 0 and source.row_off >= 0 and source.col_off + source.width <= src.width
+              and source.row_off + source.height <= src.height)
+    fill = src.nodata if src.nodata is not None else np.nan
+    if src.transform.a == grid.resolution and inside:
+        return src.read(band, window=source.round_offsets().round_lengths())
+    return src.read(band, window=source, out_shape=shape, resampling=resampling, boundless=not inside,
+                    fill_value=fill, masked=False)
+
+
+def burn(geometries, grid, window):
+    """uint8 block of ``window``: 1 where a pixel centre falls inside one of ``geometries``."""
+    shape = (int(window.height), int(window.width))
+    if len(geometries) == 0:
+        return np.zeros(shape, dtype=np.uint8)
+    return features.rasterize(((g, 1) for g in geometries), out_shape=shape,
+                              transform=grid.window_transform(window), fill=0, dtype="uint8")
+
+
+def cell_index(grid, window, transform, width, height):
+    """Flat index into a coarse (height, width) raster with ``transform`` of every
+    pixel of ``window``, or -1 where the pixel centre is outside it."""
+    x, y = grid.centres(window)
+    cols = np.floor((x - transform.c) / transform.a).astype(np.int64)
+    rows = np.floor((y - transform.f) / transform.e).astype(np.int64)
+    cols[(cols < 0) | (cols >= width)] = -1
+    rows[(rows < 0) | (rows >= height)] = -1
+    index = rows[:, None] * width + cols[None, :]
+    index[(rows[:, None] < 0) | (cols[None, :] < 0)] = -1
+    return index
+
+
+def polygonize(mask, grid, window):
+    """Polygons of the 1s of ``mask`` (a block at ``window``) and, for each, whether
+    it touches an edge of the block that another block continues across."""
+    transform = grid.window_transform(window)
+    polygons = np.array([shapely.geometry.shape(geom) for geom, _ in
+                         features.shapes(mask, mask=mask.astype(bool), transform=transform)], dtype=object)
+    if not len(polygons):
+        return polygons, np.zeros(0, dtype=bool)
+    minx, miny, maxx, maxy = grid.bounds(window)
+    extent = shapely.bounds(polygons)
+    seams = np.zeros(len(polygons), dtype=bool)
+    if window.col_off > 0:
+        seams |= extent[:, 0] <= minx
+    if window.col_off + window.width < grid.width:
+        seams |= extent[:, 2] >= maxx
+    if window.row_off + window.height < grid.height:
+        seams |= extent[:, 1] <= miny
+    if window.row_off > 0:
+        seams |= extent[:, 3] >= maxy
+    return polygons, seams
+
+
+def merge_seams(pieces):
+    # Dissolve polygons cut by block edges back into whole ones
+    if not len(pieces):
+        return np.array([], dtype=object)
+    return shapely.get_parts(shapely.union_all(np.asarray(pieces, dtype=object)))
@@ -0,0 +1,209 @@
+"""Recompute only the shards whose inputs changed since the last run.
+
+A shard's result depends only on the part of each input under it, so every
+sharded stage keys each shard by a digest of exactly that part:
+
+* a vector layer by the hashes of the rows whose bbox meets the region (each
+  row hashed from its normalised geometry and its attributes, so re-traced
+  lines that come out identical, or the same rows in a new order, leave the
+  digest unchanged)
+* a raster by the hashes of its internal blocks under the region
+
+Given such a key, ``pipeline.shards.run_sharded`` keeps every shard's result
+under ``$SOLAR_CACHE_DIR/shards`` with its key, recomputes only the shards
+whose key changed (e.g. the few around a corrected map rectangle) and returns
+the stored results for the rest, which the stage then merges and writes as
+usual. The stored key also covers the task's code and arguments, so changing
+either recomputes every shard. Row and block hashes are kept per input file
+(by path, size and mtime), so an unchanged input is never re-hashed.
+
+Set ``SOLAR_INCREMENTAL=0`` to always recompute every shard.
+"""
+import glob
+import hashlib
+import json
+import os
+import pickle
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pyogrio
+import rasterio
+import shapely
+from rasterio.warp import transform_bounds
+from rasterio.windows import from_bounds
+
+from pipeline.downloads import CACHE_DIR
+from pipeline.codefiles import code_files
+
+ENABLED = os.environ.get("SOLAR_INCREMENTAL", "1") != "0"
+SHARD_DIR = os.path.join(CACHE_DIR, "shards")
+INDEX_DIR = os.path.join(SHARD_DIR, "index")
+
+_indexes = {}
+_codes = {}
+
+
+def _file_key(path):
+    st = os.stat(path)
+    key = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def _digest(*parts):
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else repr(part).encode())
+    return h.hexdigest()
+
+
+def _cached_index(path, build):
+    # Index arrays of `path`, built once per version of the file. Stages
+    # running in parallel may build the same index at once: each writes its
+    # own temporary file, and only indexes of other versions are removed.
+    key = _file_key(path)
+    if key in _indexes:
+        return _indexes[key]
+    stem = os.path.splitext(os.path.basename(path))[0]
+    cache = os.path.join(INDEX_DIR, f"{stem}-{key}.npz")
+    try:
+        with np.load(cache, allow_pickle=False) as data:
+            index = {name: data[name] for name in data.files}
+    except FileNotFoundError:
+        index = build(path)
+        os.makedirs(INDEX_DIR, exist_ok=True)
+        fd, part = tempfile.mkstemp(dir=INDEX_DIR, prefix=f"{stem}-", suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **index)
+            os.replace(part, cache)
+        except BaseException:
+            os.remove(part)
+            raise
+        # Drop the indexes of earlier versions of the file
+        for old in glob.glob(os.path.join(glob.escape(INDEX_DIR), f"{glob.escape(stem)}-*.npz")):
+            if old != cache:
+                try:
+                    os.remove(old)
+                except FileNotFoundError:
+                    pass
+    _indexes[key] = index
+    return index
+
+
+def _row_hashes(table, geometry):
+    # One uint64 per row from the normalised WKB geometry and the other columns
+    wkb = table.column(geometry).to_numpy(zero_copy_only=False)
+    geometries = shapely.normalize(shapely.from_wkb(wkb))
+    attributes = table.drop_columns([c for c in (geometry, "bbox") if c in table.column_names]).to_pandas()
+    hashes = pd.util.hash_pandas_object(pd.Series(shapely.to_wkb(geometries), dtype=object), index=False).to_numpy()
+    if len(attributes.columns):
+        hashes = hashes * np.uint64(31) + pd.util.hash_pandas_object(attributes, index=False).to_numpy()
+    return hashes, shapely.bounds(geometries)
+
+
+def _build_layer_index(path):
+    if path.endswith(".parquet"):
+        table = pq.read_table(path)
+        geometry = _geometry_column(table)
+    else:
+        meta, table = pyogrio.read_arrow(path)
+        geometry = meta["geometry_name"] or "wkb_geometry"
+    hashes, bounds = _row_hashes(table, geometry)
+    return {"hashes": hashes, "bounds": bounds}
+
+
+def _geometry_column(table):
+    return json.loads(table.schema.metadata[b"geo"])["primary_column"]
+
+
+def _build_raster_index(path):
+    with rasterio.open(path) as src:
+        block_rows, block_cols = src.block_shapes[0]
+        rows = -(-src.height // block_rows)
+        cols = -(-src.width // block_cols)
+        hashes = np.zeros((rows, cols), dtype=np.uint64)
+        for (row, col), window in src.block_windows(1):
+            block = src.read(window=window)
+            hashes[row, col] = int.from_bytes(hashlib.blake2b(block.tobytes(), digest_size=8).digest(), "little")
+        meta = _digest(src.crs.to_string() if src.crs else None, tuple(src.transform), src.dtypes, src.nodata,
+                       src.count, [src.tags(band) for band in range(1, src.count + 1)])
+    return {"hashes": hashes, "block": np.array([block_rows, block_cols]), "meta": np.array(meta)}
+
+
+def layer_region(path, bounds, crs=None):
+    """(digest, extent) of the rows of vector layer ``path`` whose bbox meets ``bounds``.
+
+    ``bounds`` is in ``crs`` (default: the layer's own CRS), and transformed
+    to the layer's CRS the same way ``read_source`` does. ``extent`` is the
+    total bounds of those rows, in the layer's CRS, or None if there are none.
+    """
+    index = _cached_index(path, _build_layer_index)
+    if crs is not None:
+        bounds = transform_bounds(crs, pyogrio.read_info(path)["crs"], *bounds, densify_pts=21)
+    minx, miny, maxx, maxy = bounds
+    b = index["bounds"]
+    hit = (b[:, 0] <= maxx) & (b[:, 2] >= minx) & (b[:, 1] <= maxy) & (b[:, 3] >= miny)
+    if not hit.any():
+        return _digest(b"empty"), None
+    rows = b[hit]
+    extent = (rows[:, 0].min(), rows[:, 1].min(), rows[:, 2].max(), rows[:, 3].max())
+    return _digest(np.sort(index["hashes"][hit]).tobytes()), extent
+
+
+def raster_region(path, bounds):
+    """Digest of the blocks of raster ``path`` under ``bounds`` (in its CRS)."""
+    index = _cached_index(path, _build_raster_index)
+    with rasterio.open(path) as src:
+        window = from_bounds(*bounds, src.transform)
+    block_rows, block_cols = index["block"]
+    rows, cols = index["hashes"].shape
+    row0 = min(max(int(window.row_off // block_rows), 0), rows)
+    row1 = min(max(int(-(-(window.row_off + window.height) // block_rows)), 0), rows)
+    col0 = min(max(int(window.col_off // block_cols), 0), cols)
+    col1 = min(max(int(-(-(window.col_off + window.width) // block_cols)), 0), cols)
+    blocks = index["hashes"][row0:row1, col0:col1]
+    return _digest(str(index["meta"]), (row0, col0), blocks.shape, blocks.tobytes())
+
+
+def _code_digest(task):
+    # The task's module and every pipeline module it imports, transitively
+    module = os.path.relpath(sys.modules[task.__module__].__file__)
+    h = hashlib.sha256()
+    for path in code_files(module):
+        with open(path, "rb") as f:
+            h.update(path.encode() + f.read())
+    return h.hexdigest()
+
+
+def shard_key(task, shard, args, inputs):
+    """Key of ``task(shard, *args)`` whose inputs digest to ``inputs``."""
+    if task not in _codes:
+        _codes[task] = _code_digest(task)
+    return _digest(_codes[task], args, shard.bounds, inputs)
+
+
+def _result_path(task, shard):
+    return os.path.join(SHARD_DIR, task.__name__, f"{shard.name}.pkl")
+
+
+def load_result(task, shard, key):
+    """(True, result) stored for ``shard`` under ``key``, else (False, None)."""
+    path = _result_path(task, shard)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            stored = pickle.load(f)
+        if stored["key"] == key:
+            return True, stored["result"]
+    return False, None
+
+
+def store_result(task, shard, key, result):
+    path = _result_path(task, shard)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".part", "wb") as f:
+        pickle.dump({"key": key, "result": result}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".part", path)
@@ -0,0 +1,312 @@
+"""Record where a stage script spends its time, memory and I/O.
+
+Scripts wrap their sub-steps in ``step`` and note what they read and write::
+
+    with instrument.step("filter shards"):
+        ...
+        instrument.count(features_out=len(suitable_land))
+    instrument.wrote(output_path, features=len(suitable_land))
+
+Every step records its wall and CPU time, the peak resident memory of this
+process inside it, the bytes read and written (``/proc/self/io``, through
+any file, pipe or socket) and the counts given to ``count``. CPU time and
+I/O include the worker processes the step has waited for, e.g. a shard
+pool. Steps nest, and a step entered again (say in a loop) adds to its
+totals.
+
+A stage script opts in with ``instrument.enable()`` right after its imports.
+When it exits, a JSON report with the whole-run totals, the steps, the
+datasets (with their size on disk) and the counts is written to
+``$SOLAR_REPORT`` (default ``.pipeline/reports/<script>.json``). Modules that
+only import this one (e.g. ``pipeline.shards``) record nothing and write no
+report, so neither do the benchmarks or a ``python -c``.
+
+``SOLAR_PROFILE`` and ``SOLAR_TRACEMALLOC`` name steps to run under cProfile
+or tracemalloc (comma separated; a step's name, or its path such as
+``outer/inner`` for a nested one). The profile is saved next to the report as
+``<report>.<step>.prof`` and its top functions by cumulative time go in the
+report; tracemalloc adds the step's traced peak and the source lines still
+holding the most memory when it ends. Only this process is profiled, so for
+a step that hands its work to a shard pool set the script's ``workers = 1``.
+
+Per-step memory peaks come from resetting the kernel's high-water mark
+(``/proc/self/clear_refs``, Linux). Elsewhere a step's peak is the process's
+peak so far.
+"""
+import atexit
+import cProfile
+import glob
+import json
+import os
+import pstats
+import re
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+REPORT_DIR = os.path.join(".pipeline", "reports")
+# Functions / allocation sites listed per profiled step
+TOP = 15
+
+
+def _names(variable):
+    return {name.strip() for name in os.environ.get(variable, "").split(",") if name.strip()}
+
+
+PROFILE = _names("SOLAR_PROFILE")
+TRACEMALLOC = _names("SOLAR_TRACEMALLOC")
+
+
+def _report_path():
+    script = os.path.splitext(os.path.basename(sys.argv[0] or "interactive"))[0] or "interactive"
+    return os.environ.get("SOLAR_REPORT") or os.path.join(REPORT_DIR, f"{script}.json")
+
+
+def _status_kib(field):
+    # A "VmRSS:   1234 kB" style line of /proc/self/status, or None
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak():
+    # True when the kernel's high-water mark was reset to the current RSS
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_kib():
+    peak = _status_kib("VmHWM")
+    return peak if peak is not None else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _io():
+    # (bytes read, bytes written) by this process so far, through any file or socket
+    try:
+        with open("/proc/self/io") as f:
+            values = dict(line.split(":") for line in f)
+        return int(values["rchar"]), int(values["wchar"])
+    except (OSError, KeyError, ValueError):
+        return 0, 0
+
+
+def _cpu():
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def _mb(kib):
+    return round(kib / 1024, 1)
+
+
+class _Frame:
+    # An open step: where its counters started and the highest peak seen in it
+    def __init__(self, record):
+        self.record = record
+        self.wall = time.perf_counter()
+        self.cpu = _cpu()
+        self.io = _io()
+        self.peak = 0
+        self.profiler = None
+        self.tracing = False
+
+
+class _Run:
+    def __init__(self, peaks=False):
+        self.started = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.steps = {}
+        self.datasets = []
+        self.counts = {}
+        self.status = "ok"
+        self.resettable = peaks and _reset_peak()
+        self.root = _Frame({"counts": self.counts})
+        self.stack = [self.root]
+
+    def path(self, name):
+        parent = self.stack[-1].record.get("path")
+        return f"{parent}/{name}" if parent else name
+
+
+_run = _Run()
+
+
+@contextmanager
+def step(name):
+    """Measure the enclosed block as step ``name`` (nested inside any open step)."""
+    path = _run.path(name)
+    record = _run.steps.get(path)
+    if record is None:
+        record = _run.steps[path] = {
+            "name": name, "path": path, "calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "peak_rss_mb": 0.0,
+            "read_bytes": 0, "written_bytes": 0, "counts": {},
+        }
+    parent = _run.stack[-1]
+    parent.peak = max(parent.peak, _peak_kib())
+    if _run.resettable:
+        _reset_peak()
+    frame = _Frame(record)
+    _run.stack.append(frame)
+    if {name, path} & PROFILE and not any(f.profiler for f in _run.stack):
+        frame.profiler = cProfile.Profile()
+        frame.profiler.enable()
+    if {name, path} & TRACEMALLOC and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        frame.tracing = True
+    try:
+        yield
+    except BaseException as error:
+        record["error"] = f"{type(error).__name__}: {error}"
+        raise
+    finally:
+        if frame.profiler is not None:
+            frame.profiler.disable()
+        _finish(frame)
+
+
+def _finish(frame):
+    record = frame.record
+    read, written = _io()
+    record["calls"] += 1
+    record["wall_s"] += time.perf_counter() - frame.wall
+    record["cpu_s"] += _cpu() - frame.cpu
+    record["read_bytes"] += read - frame.io[0]
+    record["written_bytes"] += written - frame.io[1]
+    frame.peak = max(frame.peak, _peak_kib())
+    record["peak_rss_mb"] = max(record["peak_rss_mb"], _mb(frame.peak))
+    record["rss_mb"] = _mb(_status_kib("VmRSS") or 0)
+    if frame.profiler is not None:
+        record["profile"] = _save_profile(frame.profiler, record["path"])
+    if frame.tracing:
+        record["tracemalloc"] = _trace_summary()
+        tracemalloc.stop()
+    _run.stack.pop()
+    parent = _run.stack[-1]
+    parent.peak = max(parent.peak, frame.peak)
+
+
+def _save_profile(profiler, path):
+    stem = os.path.splitext(_report_path())[0]
+    prof_path = f"{stem}.{re.sub(r'[^A-Za-z0-9]+', '_', path).strip('_')}.prof"
+    os.makedirs(os.path.dirname(prof_path) or ".", exist_ok=True)
+    profiler.dump_stats(prof_path)
+    stats = pstats.Stats(profiler).stats
+    top = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP]
+    return {
+        "path": prof_path,
+        "top": [
+            {"function": f"{os.path.basename(file)}:{line}({func})", "calls": calls,
+             "tottime_s": round(tottime, 4), "cumtime_s": round(cumtime, 4)}
+            for (file, line, func), (_, calls, tottime, cumtime, _) in top
+        ],
+    }
+
+
+def _trace_summary():
+    _, peak = tracemalloc.get_traced_memory()
+    top = tracemalloc.take_snapshot().statistics("lineno")[:TOP]
+    return {
+        "peak_mb": round(peak / 2**20, 1),
+        "top": [
+            {"where": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+             "size_mb": round(stat.size / 2**20, 2), "blocks": stat.count}
+            for stat in top
+        ],
+    }
+
+
+def count(**values):
+    """Add ``values`` (feature, pixel, ... counts) to the innermost open step's counts."""
+    counts = _run.stack[-1].record["counts"]
+    for key, value in values.items():
+        counts[key] = counts.get(key, 0) + int(value)
+
+
+def dataset_bytes(path):
+    # Size on disk of a file, a shapefile with its sidecars or a directory
+    path = os.path.normpath(path)
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+    if path.endswith(".shp"):
+        return sum(os.path.getsize(f) for f in glob.glob(glob.escape(path[:-4]) + ".*"))
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def _dataset(path, mode, counts):
+    _run.datasets.append({"path": path, "mode": mode, "bytes": dataset_bytes(path),
+                          "step": _run.stack[-1].record.get("path"), **counts})
+
+
+def read(path, **counts):
+    """Note that ``path`` was read, with optional counts (``features=``, ``pixels=``)."""
+    _dataset(path, "read", counts)
+
+
+def wrote(path, **counts):
+    """Note that ``path`` was written, with optional counts (``features=``, ``pixels=``)."""
+    _dataset(path, "write", counts)
+
+
+def report():
+    """The run so far as a JSON-ready dict."""
+    root = _run.root
+    read, written = _io()
+    return {
+        "script": sys.argv[0],
+        "started": _run.started,
+        "status": _run.status,
+        "wall_s": round(time.perf_counter() - root.wall, 3),
+        "cpu_s": round(_cpu() - root.cpu, 3),
+        "max_rss_mb": _mb(max(root.peak, _peak_kib())),
+        "workers_max_rss_mb": _mb(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss),
+        "read_bytes": read - root.io[0],
+        "written_bytes": written - root.io[1],
+        "per_step_peaks": _run.resettable,
+        "counts": _run.counts,
+        "steps": [
+            dict(record, wall_s=round(record["wall_s"], 3), cpu_s=round(record["cpu_s"], 3))
+            for record in _run.steps.values()
+        ],
+        "datasets": _run.datasets,
+    }
+
+
+def save(path=None):
+    path = path or _report_path()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(report(), f, indent=1)
+    os.replace(tmp, path)
+    return path
+
+
+_excepthook = sys.excepthook
+_enabled = False
+
+
+def _failed(*args):
+    _run.status = "failed"
+    _excepthook(*args)
+
+
+def enable():
+    """Start this process's run and write its report when the process exits."""
+    global _run, _enabled, _excepthook
+    if _enabled:
+        return
+    _enabled = True
+    _run = _Run(peaks=True)
+    _excepthook = sys.excepthook
+    sys.excepthook = _failed
+    atexit.register(save)
@@ -0,0 +1,103 @@
+"""Find map labels by OCR-ing only the places that look like text.
+
+Running tesseract over the whole ~5840x8250 map is the slowest step of the
+EirGrid stage. Labels are made of small, compact ink blobs (the letters),
+unlike the long thin transmission lines, so connected components of the ink
+mask that are letter-sized are grouped into words and only those padded crops
+are OCR-ed, in parallel. Tesseract runs as a separate process per call, so a
+thread pool is enough to keep every core busy.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import pandas as pd
+import pytesseract
+from pytesseract import Output
+
+COLUMNS = ["left", "top", "width", "height", "conf", "text"]
+
+
+def text_candidates(ink, min_height=8, max_height=60, max_width=80, min_fill=0.15,
+                    join=(15, 5), pad=6):
+    """Padded (left, top, width, height) boxes around groups of letter-like blobs.
+
+    ``ink`` is a 2D array, non-zero where there is ink. A blob is letter-like
+    when its bounding box is ``min_height``-``max_height`` px tall, at most
+    ``max_width`` wide and at least ``min_fill`` inked (a stretch of line is
+    either long or, when diagonal, mostly empty box). Letter blobs closer than
+    ``join`` (x, y) px are merged into one word or label.
+    """
+    ink = (np.asarray(ink) > 0).astype(np.uint8)
+    n, labels, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    x, y, w, h, area = stats[1:].T
+    letters = ((h >= min_height) & (h <= max_height) & (w <= max_width)
+               & (area >= min_fill * w * h))
+    keep = np.zeros(n, dtype=np.uint8)
+    keep[1:][letters] = 1
+    letter_mask = keep[labels]
+
+    # Bridge the gaps between letters (and words of one label)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, join)
+    words = cv2.dilate(letter_mask, kernel)
+    _, _, word_stats, _ = cv2.connectedComponentsWithStats(words, connectivity=8)
+
+    height, width = ink.shape
+    boxes = []
+    for left, top, w, h, _ in word_stats[1:]:
+        right, bottom = min(left + w + pad, width), min(top + h + pad, height)
+        left, top = max(left - pad, 0), max(top - pad, 0)
+        boxes.append((int(left), int(top), int(right - left), int(bottom - top)))
+    return boxes
+
+
+def _ocr_crop(image, box, config):
+    left, top, w, h = box
+    data = pytesseract.image_to_data(image[top:top + h, left:left + w], output_type=Output.DICT, config=config)
+    df = pd.DataFrame(data)[COLUMNS]
+    df["left"] += left
+    df["top"] += top
+    return df
+
+
+def _ink(image):
+    return np.any(image < 128, axis=-1) if image.ndim == 3 else image < 128
+
+
+def find_text(image, config="--psm 6", max_passes=2, workers=None, min_conf=1, min_length=3,
+              **candidate_kwargs):
+    """OCR text boxes (``COLUMNS``, in full-image pixels) in dark-on-white ``image``.
+
+    Each pass OCRs the candidate crops of the current image in parallel, then
+    blanks what it found (in a private copy) before the next pass, as the
+    full-image passes did. Crops identical to ones already read are not read
+    again, and the passes stop early once one finds no new text.
+    """
+    found, seen = [], set()
+    image = image.copy()
+    for _ in range(max_passes):
+        boxes = [b for b in text_candidates(_ink(image), **candidate_kwargs) if b not in seen]
+        seen.update(boxes)
+        if not boxes:
+            break
+        with ThreadPoolExecutor(workers or os.cpu_count()) as pool:
+            frames = list(pool.map(lambda b: _ocr_crop(image, b, config), boxes))
+        df = pd.concat(frames, ignore_index=True)
+        df["text"] = df["text"].astype(str).str.strip()
+        df["conf"] = pd.to_numeric(df["conf"])
+        df = df[(df["text"] != "") & (df["conf"] > min_conf) & (df["text"].str.len() >= min_length)]
+        if df.empty:
+            break
+        found.append(df)
+        for left, top, w, h in df[["left", "top", "width", "height"]].itertuples(index=False):
+            image[top:top + h + 1, left:left + w + 1] = 255
+    if not found:
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.concat(found, ignore_index=True)
+
+
+def text_boxes(df):
+    # Inclusive ((x1, y1), (x2, y2)) rectangles of found text, like cv2.rectangle's
+    return [((left, top), (left + w, top + h))
+            for left, top, w, h in df[["left", "top", "width", "height"]].itertuples(index=False)]
@@ -0,0 +1,200 @@
+"""Diagnostic figures that never hold up the numeric work.
+
+The ``SOLAR_PLOTS`` environment variable picks the mode:
+
+* ``show`` (default) - draw and ``plt.show()`` inline, as the scripts always have
+* ``png`` - queue the figure to a background process pool that writes
+  ``$SOLAR_PLOT_DIR/<script>/<nn>_<title>.png`` (default dir ``plots``)
+* ``off`` - skip figures entirely, for production runs
+
+Scripts describe a figure as a module-level ``draw_*`` function plus its data,
+so it can be shipped to a worker process. Use ``enabled()`` to skip building
+data that is only needed for plotting. Vector layers are drawn from a
+simplified tier matched to the figure (see ``pipeline.preview``).
+"""
+import atexit
+import multiprocessing
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+MODE = os.environ.get("SOLAR_PLOTS", "show")
+PLOT_DIR = os.environ.get("SOLAR_PLOT_DIR", "plots")
+WORKERS = int(os.environ.get("SOLAR_PLOT_WORKERS", "2"))
+DPI = 100
+# Figures are 10 inches wide at 100 dpi, so larger images are thinned before
+# they are shipped to a worker
+MAX_PIXELS = 2000
+
+if MODE not in ("show", "png", "off"):
+    raise ValueError(f"SOLAR_PLOTS must be show, png or off, not {MODE!r}")
+
+_pool = None
+_count = 0
+_failures = []
+
+
+def enabled():
+    return MODE != "off"
+
+
+def _use_agg():
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def _executor():
+    global _pool
+    if _pool is None:
+        # Forked workers inherit the already-imported modules. Other start methods
+        # would re-run the stage script in every worker, so fall back to a single
+        # render thread, which is safe because the main thread never draws in png mode.
+        if "fork" in multiprocessing.get_all_start_methods():
+            _pool = ProcessPoolExecutor(
+                WORKERS, mp_context=multiprocessing.get_context("fork"), initializer=_use_agg
+            )
+        else:
+            _use_agg()
+            _pool = ThreadPoolExecutor(1)
+        atexit.register(finish)
+    return _pool
+
+
+def finish():
+    """Wait for queued figures and report any that failed to render."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True)
+        _pool = None
+    for path, error in _failures:
+        print(f"Plot {path} failed: {error}", file=sys.stderr)
+    _failures.clear()
+
+
+def _render(draw, args, kwargs, figsize, path):
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=figsize, dpi=DPI)
+    draw(fig, ax, *args, **kwargs)
+    if path is None:
+        plt.show()
+    else:
+        fig.savefig(path, dpi=DPI, bbox_inches="tight")
+        plt.close(fig)
+
+
+def _output_path(title):
+    global _count
+    _count += 1
+    script = os.path.splitext(os.path.basename(sys.argv[0] or "interactive"))[0] or "interactive"
+    folder = os.path.join(PLOT_DIR, script)
+    os.makedirs(folder, exist_ok=True)
+    slug = re.sub(r"[^a-z0-9]+", "_", title.lower()).strip("_")
+    return os.path.join(folder, f"{_count:02d}_{slug}.png")
+
+
+def figure(draw, *args, title, figsize=(10, 8), **kwargs):
+    """Draw ``draw(fig, ax, *args, title=title, **kwargs)`` according to MODE."""
+    if MODE == "off":
+        return
+    kwargs["title"] = title
+    if MODE == "show":
+        _render(draw, args, kwargs, figsize, None)
+        return
+    path = _output_path(title)
+    future = _executor().submit(_render, draw, args, kwargs, figsize, path)
+
+    def record_failure(done):
+        if done.exception() is not None:
+            _failures.append((path, done.exception()))
+
+    future.add_done_callback(record_failure)
+
+
+def thin(array, max_pixels=MAX_PIXELS):
+    # Strided copy so neither side exceeds max_pixels. Copying also means the
+    # script can keep editing its array in place while the figure is queued.
+    step = max(1, int(np.ceil(max(array.shape[:2]) / max_pixels)))
+    return array[::step, ::step].copy()
+
+
+# --- Drawing functions (run in the worker) ---
+
+def draw_image(fig, ax, image, title, cmap=None, norm=None, vmin=None, vmax=None,
+               colorbar=None, bgr=False, extent=None, axis_off=True,
+               xlabel=None, ylabel=None, grid=False):
+    if bgr and image.ndim == 3:
+        image = image[..., ::-1]  # OpenCV channel order -> matplotlib
+    im = ax.imshow(image, cmap=cmap, norm=norm, vmin=vmin, vmax=vmax, extent=extent)
+    if colorbar is not None:
+        fig.colorbar(im, ax=ax, label=colorbar)
+    ax.set_title(title)
+    if axis_off:
+        ax.axis("off")
+    if xlabel:
+        ax.set_xlabel(xlabel)
+    if ylabel:
+        ax.set_ylabel(ylabel)
+    if grid:
+        ax.grid(True)
+    fig.tight_layout()
+
+
+def draw_vector(fig, ax, gdf, title, axis_off=False, equal=False, tight=False, fast=False, **plot_kwargs):
+    if fast:
+        from pipeline import preview
+
+        preview.draw(fig, ax, gdf, **plot_kwargs)
+    else:
+        gdf.plot(ax=ax, **plot_kwargs)
+    ax.set_title(title)
+    if equal:
+        ax.axis("equal")
+    if axis_off:
+        ax.set_axis_off()
+    if tight:
+        fig.tight_layout()
+
+
+def draw_mesh(fig, ax, x, y, values, title, boundary=None, cmap="viridis", colorbar=None,
+              xlim=None, ylim=None, title_kwargs=None):
+    pcm = ax.pcolormesh(x, y, values, cmap=cmap, shading="auto")
+    if boundary is not None:
+        boundary.boundary.plot(ax=ax, edgecolor="black", linewidth=1)
+    if colorbar is not None:
+        fig.colorbar(pcm, ax=ax, label=colorbar)
+    ax.set_title(title, **(title_kwargs or {}))
+    ax.axis("off")
+    if xlim is not None:
+        ax.set_xlim(xlim)
+    if ylim is not None:
+        ax.set_ylim(ylim)
+
+
+# --- Shorthands used by the stage scripts ---
+
+def image(array, title, figsize=(10, 8), **kwargs):
+    if MODE == "png":
+        array = thin(array)
+    figure(draw_image, array, title=title, figsize=figsize, **kwargs)
+
+
+def vector(gdf, title, figsize=(10, 8), source=None, full_detail=False, **kwargs):
+    # Drawn from the level-of-detail tier the figure can show (cached for the
+    # layer's `source` file when given) with the fast preview renderer, unless
+    # `full_detail` or a plot option only GeoDataFrame.plot supports is given
+    if MODE == "off":
+        return
+    if not full_detail:
+        from pipeline import preview
+
+        gdf = preview.for_figure(gdf, figsize, DPI, source=source)
+        kwargs["fast"] = set(kwargs) <= preview.DRAW_OPTIONS | {"axis_off", "equal", "tight"}
+    figure(draw_vector, gdf, title=title, figsize=figsize, **kwargs)
+
+
+def mesh(x, y, values, title, figsize=(10, 8), **kwargs):
+    figure(draw_mesh, x, y, values, title=title, figsize=figsize, **kwargs)
@@ -0,0 +1,177 @@
+"""Simplified stand-ins for large vector layers in figures.
+
+A 10 inch figure at 100 dpi is 1000 pixels across, so drawing every vertex
+of the national CORINE layer mostly draws sub-pixel detail. A layer is drawn
+from a level-of-detail tier instead: the number of pixels the layer spans in
+the figure (from its size and DPI, rounded up to ``TIER_STEP``), with every
+geometry simplified to half a pixel at that width (topology preserving) and
+features smaller than that dropped. Only figures use it; the analysis always
+works on the full geometry.
+
+``GeoDataFrame.plot`` builds one matplotlib patch per polygon, which costs
+more than the drawing itself once a layer has tens of thousands of polygons,
+so ``draw`` renders a preview as one compound path per colour instead (for
+the styling options the stage scripts use).
+
+Tiers of a layer that was read from or written to a file are cached under
+``$SOLAR_CACHE_DIR/preview``, keyed by the file's path, size and mtime, so a
+rerun that doesn't change the layer reuses them.
+"""
+import hashlib
+import math
+import os
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from pipeline.downloads import CACHE_DIR
+
+# Tiers are pixel widths rounded up to a multiple of this, so figures of
+# about the same size share one cached tier
+TIER_STEP = 250
+PREVIEW_DIR = os.path.join(CACHE_DIR, "preview")
+
+
+def pick_tier(bounds, figsize, dpi):
+    """Pixels across the layer as drawn, rounded up to a tier, or None for full detail.
+
+    The layer is scaled to fit the figure, so its longer side (relative to
+    the figure's shape) sets how many pixels it spans.
+    """
+    minx, miny, maxx, maxy = bounds
+    width, height = maxx - minx, maxy - miny
+    if width <= 0 and height <= 0:
+        return None
+    fit = min(figsize[0] / width if width > 0 else np.inf, figsize[1] / height if height > 0 else np.inf)
+    pixels = max(width, height) * fit * dpi
+    return max(math.ceil(pixels / TIER_STEP), 1) * TIER_STEP
+
+
+def simplify(geometries, bounds, tier):
+    """(kept row positions, simplified geometries) of ``geometries`` for ``tier``."""
+    minx, miny, maxx, maxy = bounds
+    tolerance = max(maxx - minx, maxy - miny) / tier / 2
+    extent = shapely.bounds(geometries)
+    visible = (extent[:, 2] - extent[:, 0] >= tolerance) | (extent[:, 3] - extent[:, 1] >= tolerance)
+    rows = np.flatnonzero(visible)
+    return rows, shapely.simplify(geometries[rows], tolerance, preserve_topology=True)
+
+
+def _cache_path(source, rows, tier):
+    st = os.stat(source)
+    key = f"{os.path.abspath(source)}|{st.st_size}|{st.st_mtime_ns}|{rows}"
+    name = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(PREVIEW_DIR, f"{name}-{hashlib.sha256(key.encode()).hexdigest()[:16]}-{tier}.parquet")
+
+
+def for_figure(gdf, figsize, dpi, source=None):
+    """``gdf`` at the level of detail a ``figsize`` (inches) figure at ``dpi`` can show.
+
+    ``source`` is the file ``gdf`` was read from or written to, row for row;
+    when given, the tier is cached for it.
+    """
+    if len(gdf) == 0:
+        return gdf
+    bounds = gdf.total_bounds
+    tier = pick_tier(bounds, figsize, dpi)
+    if tier is None:
+        return gdf
+    path = _cache_path(source, len(gdf), tier) if source is not None and os.path.exists(source) else None
+    if path is not None and os.path.exists(path):
+        cached = gpd.read_parquet(path)
+        rows, geometries = cached["row"].to_numpy(), cached.geometry.values
+    else:
+        rows, geometries = simplify(gdf.geometry.values, bounds, tier)
+        if path is not None:
+            os.makedirs(PREVIEW_DIR, exist_ok=True)
+            tmp = path + ".part"
+            gpd.GeoDataFrame({"row": rows}, geometry=geometries, crs=gdf.crs).to_parquet(tmp, index=False)
+            os.replace(tmp, path)
+    preview = gdf.iloc[rows].copy()
+    preview[gdf.geometry.name] = gpd.GeoSeries(geometries, index=preview.index, crs=gdf.crs)
+    return preview
+
+
+# GeoDataFrame.plot options that ``draw`` reproduces
+DRAW_OPTIONS = {"column", "cmap", "color", "edgecolor", "linewidth", "alpha", "legend", "legend_kwds",
+                "vmin", "vmax"}
+
+
+def _polygon_path(polygons):
+    # One compound Path of all the rings of `polygons`, holes wound opposite
+    # to shells so the default non-zero fill leaves them empty
+    from matplotlib.path import Path
+
+    parts = shapely.orient_polygons(shapely.get_parts(polygons))
+    rings = shapely.get_rings(parts)
+    coords, index = shapely.get_coordinates(rings, return_index=True)
+    codes = np.full(len(coords), Path.LINETO, dtype=Path.code_type)
+    starts = np.flatnonzero(np.diff(index, prepend=-1))
+    codes[starts] = Path.MOVETO
+    codes[np.append(starts[1:], len(coords)) - 1] = Path.CLOSEPOLY
+    return Path(coords, codes)
+
+
+def _line_segments(lines):
+    coords, index = shapely.get_coordinates(shapely.get_parts(lines), return_index=True)
+    return np.split(coords, np.flatnonzero(np.diff(index)) + 1)
+
+
+def _groups(gdf, column, cmap, color, vmin, vmax):
+    """(label, colour, geometries) per colour, plus the colorbar mappable if numeric.
+
+    Colours follow GeoDataFrame.plot: categories in sorted order from tab10
+    (tab20 past ten), numbers through ``cmap`` (binned to 256 levels).
+    """
+    from matplotlib import colormaps, colors
+    from matplotlib.cm import ScalarMappable
+
+    geometries = gdf.geometry.values
+    if column is None:
+        return [(None, color if color is not None else "C0", geometries)], None
+    values = gdf[column]
+    if not pd.api.types.is_numeric_dtype(values):
+        names = sorted(values.dropna().unique())
+        if cmap is None:
+            cmap = colormaps["tab20"] if len(names) > 10 else colormaps["tab10"]
+        elif isinstance(cmap, str):
+            cmap = colormaps[cmap]
+        pick = (lambda i: cmap(i)) if cmap.N < 32 else (lambda i: cmap(i / max(len(names) - 1, 1)))
+        return [(name, pick(i), geometries[(values == name).to_numpy()]) for i, name in enumerate(names)], None
+    values = values.to_numpy(dtype=float)
+    norm = colors.Normalize(np.nanmin(values) if vmin is None else vmin, np.nanmax(values) if vmax is None else vmax)
+    cmap = colormaps[cmap or "viridis"] if not isinstance(cmap, colors.Colormap) else cmap
+    levels = np.clip((norm(values).filled(np.nan) * 255).round(), 0, 255)
+    groups = [(None, cmap(level / 255), geometries[levels == level]) for level in np.unique(levels[~np.isnan(levels)])]
+    return groups, ScalarMappable(norm=norm, cmap=cmap)
+
+
+def draw(fig, ax, gdf, column=None, cmap=None, color=None, edgecolor=None, linewidth=None, alpha=None,
+         legend=False, legend_kwds=None, vmin=None, vmax=None):
+    """Draw ``gdf`` on ``ax`` like ``gdf.plot(ax=ax, ...)``, one collection entry per colour."""
+    from matplotlib.collections import LineCollection, PathCollection
+    from matplotlib.patches import Patch
+
+    groups, mappable = _groups(gdf, column, cmap, color, vmin, vmax)
+    handles = []
+    for label, colour, geometries in groups:
+        polygons = np.isin(shapely.get_type_id(geometries), (3, 6))
+        if polygons.any():
+            ax.add_collection(PathCollection(
+                [_polygon_path(geometries[polygons])], facecolors=[colour],
+                edgecolors="none" if edgecolor is None else edgecolor,
+                linewidths=linewidth if linewidth is not None else 1, alpha=alpha))
+        if (~polygons).any():
+            ax.add_collection(LineCollection(
+                _line_segments(geometries[~polygons]), colors=edgecolor if edgecolor is not None else colour,
+                linewidths=linewidth if linewidth is not None else 1, alpha=alpha))
+        if label is not None:
+            handles.append(Patch(facecolor=colour, edgecolor=edgecolor, alpha=alpha, label=str(label)))
+    ax.autoscale_view()
+    ax.set_aspect("equal")
+    if legend and handles:
+        ax.legend(handles=handles, **(legend_kwds or {}))
+    elif legend and mappable is not None:
+        fig.colorbar(mappable, ax=ax, **(legend_kwds or {}))
@@ -0,0 +1,49 @@
+"""Block-wise raster reading and writing helpers."""
+import numpy as np
+from rasterio.enums import Resampling
+from rasterio.windows import Window
+
+
+def iter_windows(width, height, tile_size):
+    # Row-major tiles covering the raster; edge tiles are clipped to the raster
+    for row_off in range(0, height, tile_size):
+        for col_off in range(0, width, tile_size):
+            yield Window(
+                col_off,
+                row_off,
+                min(tile_size, width - col_off),
+                min(tile_size, height - row_off),
+            )
+
+
+def read_with_halo(src, window, halo=1, band=1):
+    """Read ``window`` padded by ``halo`` pixels on every side.
+
+    The padding is clipped at the raster edge, so a neighbourhood operation
+    (e.g. ``np.gradient``) on the padded block gives the same values as on the
+    full raster. Returns the block and the slices that cut ``window`` back out.
+    """
+    row0 = max(window.row_off - halo, 0)
+    col0 = max(window.col_off - halo, 0)
+    row1 = min(window.row_off + window.height + halo, src.height)
+    col1 = min(window.col_off + window.width + halo, src.width)
+    block = src.read(band, window=Window(col0, row0, col1 - col0, row1 - row0))
+    top = window.row_off - row0
+    left = window.col_off - col0
+    inner = (slice(top, top + window.height), slice(left, left + window.width))
+    return block, inner
+
+
+def read_overview(src, max_size=2000, band=1, resampling=Resampling.nearest):
+    # Decimated read for plotting, so previews never load the full-resolution band
+    step = max(1, int(np.ceil(max(src.width, src.height) / max_size)))
+    out_shape = (max(1, src.height // step), max(1, src.width // step))
+    return src.read(band, out_shape=out_shape, resampling=resampling)
+
+
+def block_profile(profile, tile_size, **updates):
+    # GeoTIFF blocks must be multiples of 16; match them to the processing tiles
+    block = max(16, min(512, tile_size) // 16 * 16)
+    out = profile.copy()
+    out.update(tiled=True, blockxsize=block, blockysize=block, **updates)
+    return out
@@ -0,0 +1,249 @@
+"""Run the stage scripts as a DAG with content-hashed caching.
+
+Each stage's cache key hashes its script (plus any ``pipeline`` modules it
+imports), the contents of its inputs and its ``params``. A stage is skipped
+when the key matches its last successful run and its outputs are unchanged
+since then. Stages whose upstream stages are done run in parallel, each in
+its own Python process.
+
+Every stage that runs writes its ``pipeline.instrument`` report to
+``.pipeline/reports/<stage>.json``, and the run as a whole (status of every
+stage, with the reports of those that ran) goes to ``.pipeline/reports/run.json``.
+"""
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from pipeline.codefiles import code_files
+from pipeline.stages import STAGES
+
+STATE_DIR = ".pipeline"
+STATE_PATH = os.path.join(STATE_DIR, "state.json")
+LOG_DIR = os.path.join(STATE_DIR, "logs")
+# Where the stage scripts' pipeline.instrument reports go
+REPORT_DIR = os.path.join(STATE_DIR, "reports")
+
+
+def expand(path):
+    # Files that make up a declared input/output path
+    path = os.path.normpath(path)
+    if os.path.isdir(path):
+        return sorted(os.path.join(d, f) for d, _, files in os.walk(path) for f in files)
+    if path.endswith(".shp"):
+        return sorted(glob.glob(glob.escape(path[:-4]) + ".*"))
+    return [path] if os.path.exists(path) else []
+
+
+class State:
+    """File digests and the last successful run of each stage, kept on disk."""
+
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        self.files = data.get("files", {})
+        self.stages = data.get("stages", {})
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"files": self.files, "stages": self.stages}, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def digest(self, path):
+        # Re-hash a file only when its size or mtime has changed
+        st = os.stat(path)
+        entry = self.files.get(path)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            return entry["sha256"]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        self.files[path] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": h.hexdigest()}
+        return h.hexdigest()
+
+    def path_digest(self, path):
+        # None when nothing exists at `path`
+        files = expand(path)
+        if not files:
+            return None
+        h = hashlib.sha256()
+        for f in files:
+            h.update(f.encode())
+            h.update(self.digest(f).encode())
+        return h.hexdigest()
+
+
+def stage_key(stage, state):
+    parts = {
+        "code": {p: state.digest(p) for p in code_files(stage.script)},
+        "inputs": {p: state.path_digest(p) for p in stage.inputs},
+        "params": stage.params,
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+def is_fresh(stage, key, state):
+    record = state.stages.get(stage.name)
+    if record is None or record["key"] != key:
+        return False
+    return all(
+        record["outputs"].get(p) is not None and state.path_digest(p) == record["outputs"][p]
+        for p in stage.outputs
+    )
+
+
+def dependencies(stages):
+    producers = {}
+    for stage in stages:
+        for path in stage.outputs:
+            producers[os.path.normpath(path)] = stage.name
+    return {
+        stage.name: {
+            producers[os.path.normpath(p)] for p in stage.inputs if os.path.normpath(p) in producers
+        }
+        for stage in stages
+    }
+
+
+def upstream_closure(targets, deps):
+    selected, todo = set(), list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in deps:
+            raise ValueError(f"Unknown stage: {name}")
+        if name not in selected:
+            selected.add(name)
+            todo.extend(deps[name])
+    return selected
+
+
+def report_path(stage):
+    return os.path.join(REPORT_DIR, f"{stage.name}.json")
+
+
+def run_stage(stage, plots="off", export_shp=False, profile=(), trace=()):
+    for path in stage.outputs:
+        if os.path.splitext(path)[1]:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.makedirs(LOG_DIR, exist_ok=True)
+    # Figures are skipped or written as PNGs by pipeline.plots; the Agg backend
+    # also guarantees a stray plt.show() can't block an unattended run
+    env = dict(os.environ, MPLBACKEND="Agg", SOLAR_PLOTS=plots,
+               SOLAR_EXPORT_SHP="1" if export_shp else "0", SOLAR_REPORT=report_path(stage),
+               SOLAR_PROFILE=",".join(profile), SOLAR_TRACEMALLOC=",".join(trace))
+    if os.path.exists(report_path(stage)):
+        os.remove(report_path(stage))
+    start = time.perf_counter()
+    with open(os.path.join(LOG_DIR, f"{stage.name}.log"), "w") as log:
+        proc = subprocess.run(
+            [sys.executable, stage.script], stdout=log, stderr=subprocess.STDOUT, env=env
+        )
+    return proc.returncode, time.perf_counter() - start
+
+
+def save_run_report(status, seconds, by_name, jobs):
+    stages = {}
+    for name, result in sorted(status.items()):
+        stages[name] = {"status": result}
+        if result in ("ran", "failed") and os.path.exists(report_path(by_name[name])):
+            with open(report_path(by_name[name])) as f:
+                stages[name]["report"] = json.load(f)
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    path = os.path.join(REPORT_DIR, "run.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump({"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "wall_s": round(seconds, 3), "jobs": jobs,
+                   "stages": stages}, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def run(targets=None, jobs=4, force=(), dry_run=False, plots="off", export_shp=False,
+        profile=(), trace=(), stages=STAGES):
+    """Bring ``targets`` (default: every stage) up to date.
+
+    ``plots`` is the ``SOLAR_PLOTS`` mode for the stage scripts: "off" or "png".
+    ``export_shp`` also writes shapefile copies of the GeoParquet layers.
+    ``profile`` and ``trace`` name steps to run under cProfile and tracemalloc
+    (see ``pipeline.instrument``).
+
+    Returns a dict of stage name -> "cached", "ran", "would run", "failed" or
+    "blocked" (an upstream stage failed).
+    """
+    by_name = {s.name: s for s in stages}
+    deps = dependencies(stages)
+    selected = upstream_closure(targets or list(by_name), deps)
+    force = set(force)
+    state = State()
+
+    pending = {name: deps[name] & selected for name in selected}
+    status = {}
+    running = {}
+    start = time.perf_counter()
+
+    def settled(name):
+        return status.get(name) in ("cached", "ran", "would run")
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            ready = [n for n, d in sorted(pending.items()) if all(settled(u) for u in d)]
+            blocked = [n for n, d in sorted(pending.items()) if any(
+                status.get(u) in ("failed", "blocked") for u in d)]
+            for name in blocked:
+                del pending[name]
+                status[name] = "blocked"
+                print(f"[blocked] {name}")
+            for name in ready:
+                del pending[name]
+                stage = by_name[name]
+                missing = [p for p in stage.inputs if state.path_digest(p) is None]
+                stale_upstream = any(status[u] == "would run" for u in deps[name] & selected)
+                if missing and not (dry_run and stale_upstream):
+                    status[name] = "failed"
+                    print(f"[failed] {name}: missing input {', '.join(missing)}")
+                    continue
+                key = None if stale_upstream else stage_key(stage, state)
+                if name not in force and key is not None and is_fresh(stage, key, state):
+                    status[name] = "cached"
+                    print(f"[cached] {name}")
+                elif dry_run:
+                    status[name] = "would run"
+                    print(f"[would run] {name}")
+                else:
+                    print(f"[run] {name}")
+                    running[pool.submit(run_stage, stage, plots, export_shp, profile, trace)] = (name, key)
+            if ready or blocked:
+                continue
+            if not running:
+                raise RuntimeError(f"Dependency cycle among stages: {sorted(pending)}")
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name, key = running.pop(future)
+                stage = by_name[name]
+                returncode, seconds = future.result()
+                log = os.path.join(LOG_DIR, f"{name}.log")
+                if returncode != 0:
+                    status[name] = "failed"
+                    print(f"[failed] {name} after {seconds:.1f}s (exit {returncode}, see {log})")
+                    continue
+                status[name] = "ran"
+                state.stages[name] = {
+                    "key": key,
+                    "outputs": {p: state.path_digest(p) for p in stage.outputs},
+                }
+                state.save()
+                print(f"[done] {name} in {seconds:.1f}s")
+    state.save()
+    if not dry_run:
+        save_run_report(status, time.perf_counter() - start, by_name, jobs)
+    return status
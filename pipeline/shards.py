@@ -0,0 +1,224 @@
+"""Split the island into square shards and process them in parallel.
+
+Shards are ``size``-metre squares on the EPSG:2157 grid. Vector work is split
+by polygon: a shard owns the polygons whose representative point falls inside
+its half-open bounds, so every polygon has exactly one owner and is processed
+whole, and polygons crossing a shard edge are neither cut nor duplicated.
+Raster work is split by pixel, each pixel going to the shard containing its
+centre.
+
+``run_sharded`` takes any executor with a concurrent.futures-style ``submit``
+(e.g. a dask.distributed ``Client``), so shards can be spread over several
+nodes as long as they can all read the input files. Given one of the
+``*_key`` functions, it only recomputes the shards whose inputs changed since
+the last run (see ``pipeline.incremental``).
+"""
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import rasterio
+from rasterio import features
+from rasterio.windows import Window
+
+from pipeline import incremental, instrument
+from pipeline.clip import clip_to_union
+from pipeline.vectors import read_layer, read_source
+from pipeline.zonal import zonal_means, zonal_mins
+
+CRS = "EPSG:2157"
+
+
+@dataclass(frozen=True)
+class Shard:
+    col: int
+    row: int
+    bounds: tuple  # (minx, miny, maxx, maxy) in EPSG:2157
+
+    @property
+    def name(self):
+        return f"{self.col}_{self.row}"
+
+
+def make_shards(bounds, size=25000):
+    """Shards covering ``bounds``; ``size=None`` gives one shard for everything."""
+    minx, miny, maxx, maxy = bounds
+    if size is None:
+        # Pad so nothing sits on the half-open upper edge
+        return [Shard(0, 0, (minx, miny, maxx + 1, maxy + 1))]
+    return [
+        Shard(col, row, (col * size, row * size, (col + 1) * size, (row + 1) * size))
+        for row in range(math.floor(miny / size), math.floor(maxy / size) + 1)
+        for col in range(math.floor(minx / size), math.floor(maxx / size) + 1)
+    ]
+
+
+def owned(gdf, shard):
+    # Boolean mask of the rows this shard is responsible for
+    points = gdf.geometry.representative_point()
+    minx, miny, maxx, maxy = shard.bounds
+    return ((points.x >= minx) & (points.x < maxx) & (points.y >= miny) & (points.y < maxy)).to_numpy()
+
+
+def shard_window(shard, transform, width, height):
+    # Pixels whose centres fall inside the shard (north-up grids only). Adjacent
+    # shards share an edge value, so their windows tile the raster exactly.
+    minx, miny, maxx, maxy = shard.bounds
+    res_x, res_y = transform.a, -transform.e
+
+    def first(offset):
+        return math.ceil(offset - 0.5)
+
+    col0 = min(max(first((minx - transform.c) / res_x), 0), width)
+    col1 = min(max(first((maxx - transform.c) / res_x), 0), width)
+    row0 = min(max(first((transform.f - maxy) / res_y), 0), height)
+    row1 = min(max(first((transform.f - miny) / res_y), 0), height)
+    return Window(col0, row0, col1 - col0, row1 - row0)
+
+
+def default_executor(workers=None):
+    # Forked workers, since the stage scripts aren't import-safe under spawn;
+    # threads where fork isn't available
+    if "fork" in multiprocessing.get_all_start_methods():
+        return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork"))
+    return ThreadPoolExecutor(workers)
+
+
+def run_sharded(task, shards, *args, executor=None, workers=None, key=None):
+    """``[task(shard, *args) for shard in shards]``, computed in parallel.
+
+    With ``key``, a function of ``(shard, *args)`` digesting the shard's
+    inputs, a shard whose key matches its result from the last run reuses
+    that result instead.
+    """
+    if key is not None and incremental.ENABLED:
+        return _run_incremental(task, shards, args, executor, workers, key)
+    if len(shards) == 1 or workers == 1:
+        return [task(shard, *args) for shard in shards]
+    own = executor is None
+    if own:
+        executor = default_executor(workers or os.cpu_count())
+    try:
+        futures = [executor.submit(task, shard, *args) for shard in shards]
+        return [f.result() for f in futures]
+    finally:
+        if own:
+            executor.shutdown()
+
+
+def _run_incremental(task, shards, args, executor, workers, key):
+    keys = [incremental.shard_key(task, shard, args, key(shard, *args)) for shard in shards]
+    results, dirty = {}, []
+    for shard, shard_key in zip(shards, keys):
+        found, result = incremental.load_result(task, shard, shard_key)
+        if found:
+            results[shard] = result
+        else:
+            dirty.append((shard, shard_key))
+    print(f"Recomputing {len(dirty)} of {len(shards)} shards ({len(results)} unchanged)")
+    instrument.count(shards_reused=len(results), shards_recomputed=len(dirty))
+    if dirty:
+        computed = run_sharded(task, [shard for shard, _ in dirty], *args, executor=executor, workers=workers)
+        for (shard, shard_key), result in zip(dirty, computed):
+            incremental.store_result(task, shard, shard_key, result)
+            results[shard] = result
+    return [results[shard] for shard in shards]
+
+
+def merge_frames(frames, crs=None):
+    # Concatenate per-shard GeoDataFrames in shard order
+    frames = [f for f in frames if f is not None]
+    if not frames:
+        return gpd.GeoDataFrame(geometry=[], crs=crs)
+    return gpd.GeoDataFrame(pd.concat(frames, ignore_index=True), crs=frames[0].crs)
+
+
+# --- Per-stage shard tasks ---
+
+def land_cover_task(shard, shapefile_path, where, columns):
+    # CORINE polygons matching `where` owned by the shard, in EPSG:2157; the
+    # filter and the shard bbox are applied by the reader
+    suitable = read_source(shapefile_path, columns=columns, where=where, bbox=shard.bounds, crs=CRS)
+    return suitable[owned(suitable, shard)]
+
+
+def land_cover_key(shard, shapefile_path, where, columns):
+    return incremental.layer_region(shapefile_path, shard.bounds, crs=CRS)[0]
+
+
+def terrain_task(shard, layer_path, raster_path):
+    # Owned polygons with their mean raster value as `terrain_score` (NaN = no pixels)
+    land = read_layer(layer_path, bbox=shard.bounds)
+    land = land[owned(land, shard)].copy()
+    land["terrain_score"] = zonal_means(land.geometry.values, raster_path)
+    return land
+
+
+def terrain_key(shard, layer_path, raster_path):
+    # The polygons read for the shard, and the pixels under all of them
+    rows, extent = incremental.layer_region(layer_path, shard.bounds)
+    return rows, extent and incremental.raster_region(raster_path, extent)
+
+
+def clip_task(shard, land_path, buffer_path, distance_path):
+    """Owned polygons clipped to the union of the buffers around them.
+
+    Every owned polygon first gets its distance to the nearest line as
+    ``grid_distance`` (the minimum of the distance raster inside it), so the
+    result is (clipped polygons, unclipped ``area``/``grid_distance`` table).
+    """
+    land = read_layer(land_path, bbox=shard.bounds)
+    land = land[owned(land, shard)].copy()
+    land["grid_distance"] = zonal_mins(land.geometry.values, distance_path)
+    distances = pd.DataFrame({"area": land.area, "grid_distance": land["grid_distance"]})
+    buffers = read_layer(buffer_path, columns=[], bbox=tuple(land.total_bounds) if len(land) else shard.bounds)
+    clipped = clip_to_union(land.to_crs(buffers.crs), buffers.geometry.values).reset_index(drop=True)
+    return clipped, distances
+
+
+def clip_key(shard, land_path, buffer_path, distance_path):
+    # The land read for the shard, and the buffers and distances under it
+    rows, extent = incremental.layer_region(land_path, shard.bounds)
+    if extent is None:
+        return rows
+    return (rows, incremental.layer_region(buffer_path, extent)[0],
+            incremental.raster_region(distance_path, extent))
+
+
+def mask_task(shard, layer_path, raster_path, crop):
+    """Mask the shard's pixels of every band of the raster by the polygons.
+
+    ``crop`` is the output window; returns that part of it the shard covers
+    (relative to ``crop``) and a (bands, rows, cols) array, or None. Same as
+    ``rasterio.mask.mask``: pixels whose centres are outside every polygon
+    become nodata.
+    """
+    with rasterio.open(raster_path) as src:
+        own = shard_window(shard, src.transform, src.width, src.height)
+        col0, row0 = max(own.col_off, crop.col_off), max(own.row_off, crop.row_off)
+        col1 = min(own.col_off + own.width, crop.col_off + crop.width)
+        row1 = min(own.row_off + own.height, crop.row_off + crop.height)
+        if col1 <= col0 or row1 <= row0:
+            return None
+        window = Window(col0, row0, col1 - col0, row1 - row0)
+        polygons = read_layer(layer_path, columns=[], bbox=shard.bounds)
+        if polygons.empty:
+            return None
+        shape = (int(window.height), int(window.width))
+        outside = features.geometry_mask(polygons.geometry, shape, src.window_transform(window))
+        if outside.all():
+            return None
+        bands = src.read(window=window)
+        bands[:, outside] = src.nodata if src.nodata is not None else 0
+    relative = Window(window.col_off - crop.col_off, window.row_off - crop.row_off, window.width, window.height)
+    return relative, bands
+
+
+def mask_key(shard, layer_path, raster_path, crop):
+    return incremental.layer_region(layer_path, shard.bounds)[0], incremental.raster_region(raster_path, shard.bounds)
+
@@ -0,0 +1,121 @@
+"""Inputs and outputs of every stage script, i.e. the pipeline DAG.
+
+Paths are relative to the repo root. A ``.shp`` path stands for the shapefile
+and its sidecar files; a directory stands for every file below it. A stage
+depends on whichever stage lists one of its inputs as an output.
+"""
+from dataclasses import dataclass, field
+
+
+@dataclass
+class Stage:
+    name: str
+    script: str
+    inputs: list = field(default_factory=list)
+    outputs: list = field(default_factory=list)
+    # Extra values folded into the cache key (thresholds in the scripts are
+    # already covered, since the script source is part of the key)
+    params: dict = field(default_factory=dict)
+
+
+STAGES = [
+    Stage(
+        "sunlight_download",
+        "1-Sunlight-Hours/download_sunlight_data.py",
+        outputs=["1-Sunlight-Hours/ireland_solar"],
+    ),
+    Stage(
+        "sunlight",
+        "1-Sunlight-Hours/prep_sunlight_hours_data.py",
+        inputs=["1-Sunlight-Hours/ireland_solar", "1-DEM/dem_irl_itm-1.tif"],
+        # The climatology state is kept between runs so new years are added
+        # without rereading old ones; declared so the cache tracks it too
+        outputs=["1-Sunlight-Hours/rasters_by_month", "1-Sunlight-Hours/climatology_state.npz"],
+    ),
+    Stage(
+        "dem",
+        "1-DEM/dem_prep.py",
+        inputs=["1-DEM/dem_irl_itm-1.tif"],
+        outputs=["1-DEM/binary_filtered_dem.tif"],
+    ),
+    Stage(
+        "land_cover",
+        "1-Land-Cover/select_suitable_land_cover.py",
+        inputs=["1-Land-Cover/CLC18_IE/CLC18_IE.shp"],
+        outputs=["1-Land-Cover/suitable_land.parquet"],
+    ),
+    Stage(
+        "eirgrid",
+        "1-EirGrid-Map/transmission-map-prep-raster.py",
+        inputs=["1-EirGrid-Map/EirGridMap-raster/EirGridMap.tif"],
+        outputs=["1-EirGrid-Map/transmission_map_lines.parquet"],
+    ),
+    Stage(
+        "transmission_buffer",
+        "1a-transmission_lines_buffered/prep_trans_line_buffer.py",
+        inputs=["1-EirGrid-Map/transmission_map_lines.parquet"],
+        outputs=["1a-transmission_lines_buffered/buffered_3km_epsg2157.parquet"],
+    ),
+    Stage(
+        "grid_distance",
+        "1a-transmission_lines_buffered/prep_distance_to_grid.py",
+        inputs=[
+            "1-EirGrid-Map/transmission_map_lines.parquet",
+            "1-DEM/dem_irl_itm-1.tif",
+        ],
+        outputs=["1a-transmission_lines_buffered/distance_to_grid.tif"],
+    ),
+    Stage(
+        "terrain_score",
+        "2-combine_land_cover_dem/combine_dem_land_cover.py",
+        inputs=[
+            "1-Land-Cover/suitable_land.parquet",
+            "1-DEM/binary_filtered_dem.tif",
+        ],
+        outputs=["2-combine_land_cover_dem/solar_ready_land.parquet"],
+    ),
+    Stage(
+        "transmission_clip",
+        "3-keep_suitable_land_near_transmission/combine_suitable_land_tranmission_map.py",
+        inputs=[
+            "1a-transmission_lines_buffered/buffered_3km_epsg2157.parquet",
+            "1a-transmission_lines_buffered/distance_to_grid.tif",
+            "2-combine_land_cover_dem/solar_ready_land.parquet",
+        ],
+        outputs=["3-keep_suitable_land_near_transmission/clipped_suitability.parquet"],
+    ),
+    Stage(
+        "sunshine",
+        "4-sunshine_levels_on_suitable_land/add_sunshine_data.py",
+        inputs=[
+            "3-keep_suitable_land_near_transmission/clipped_suitability.parquet",
+            "1-Sunlight-Hours/rasters_by_month",
+        ],
+        outputs=["4-sunshine_levels_on_suitable_land/masked_rasters"],
+    ),
+    Stage(
+        "fused_suitability",
+        "2-4-fused_raster_suitability/fused_suitability.py",
+        inputs=[
+            "1-Land-Cover/suitable_land.parquet",
+            "1-DEM/dem_irl_itm-1.tif",
+            "1a-transmission_lines_buffered/distance_to_grid.tif",
+            "1-Sunlight-Hours/rasters_by_month",
+        ],
+        outputs=[
+            "2-4-fused_raster_suitability/suitable_mask.tif",
+            "2-4-fused_raster_suitability/suitable_cf_monthly.tif",
+        ],
+    ),
+    Stage(
+        "threshold_sweep",
+        "2-4-threshold_sweep/sweep_thresholds.py",
+        inputs=[
+            "1-Land-Cover/suitable_land.parquet",
+            "1-DEM/dem_irl_itm-1.tif",
+            "1a-transmission_lines_buffered/distance_to_grid.tif",
+            "1-Sunlight-Hours/rasters_by_month",
+        ],
+        outputs=["2-4-threshold_sweep/scenarios.csv"],
+    ),
+]
@@ -0,0 +1,222 @@
+"""Sufficient statistics for sweeping the suitability thresholds of stages 2-3.
+
+Stage 2 keeps a land-cover polygon when the share of its DEM pixels passing
+the slope/aspect test reaches a minimum terrain score, and stage 3 keeps the
+part of it within the buffer distance of a line. Both only depend on how
+each polygon's pixels fall into slope x aspect classes and into distance
+bands, so one pass over the DEM counts those (with capacity factor sums per
+band), and then every combination of thresholds lying on the class edges is
+scored from the counts without reading a raster again.
+
+Pixels are the DEM's, each counted for the polygon containing its centre, as
+in stage 2 (including those beyond the DEM's edge, which never pass the
+terrain test); the buffer clip of stage 3 is taken pixel by pixel, so areas
+agree with it to within a pixel along the cut.
+"""
+import math
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import rasterio
+import shapely
+from rasterio import features
+from rasterio.windows import Window, from_bounds
+
+from pipeline import incremental
+from pipeline.fused import Grid, cell_index, check_crs, read_on_grid
+from pipeline.raster import iter_windows, read_with_halo
+from pipeline.shards import owned
+from pipeline.terrain import class_count, class_mask, terrain_classes
+from pipeline.vectors import read_layer
+
+
+@dataclass(frozen=True)
+class Bins:
+    slope: tuple  # slope class edges (degrees)
+    aspect: tuple  # aspect class edges (degrees clockwise from north)
+    distance: tuple  # distance band edges (metres)
+
+    @property
+    def classes(self):
+        return class_count(self.slope, self.aspect)
+
+    @property
+    def bands(self):
+        # Up to each edge, beyond the last one, and no distance data
+        return len(self.distance) + 2
+
+
+def _land_window(src, geometries):
+    # Pixel window just covering every polygon, on the raster's grid. Like
+    # zonal.py's, it may reach past the raster edge.
+    window = from_bounds(*shapely.total_bounds(geometries), src.transform)
+    col0, row0 = math.floor(window.col_off), math.floor(window.row_off)
+    col1 = math.ceil(window.col_off + window.width)
+    row1 = math.ceil(window.row_off + window.height)
+    return Window(col0, row0, col1 - col0, row1 - row0)
+
+
+def _classes(dem, window, bins):
+    # terrain_classes of `window`; pixels beyond the DEM are the sea, which
+    # never passes but still counts, as they read 0 from the stage 1 mask in
+    # stage 2's boundless reads
+    classes = np.full((int(window.height), int(window.width)), bins.classes - 1, dtype=np.int32)
+    col0, row0 = max(window.col_off, 0), max(window.row_off, 0)
+    col1 = min(window.col_off + window.width, dem.width)
+    row1 = min(window.row_off + window.height, dem.height)
+    if col1 > col0 and row1 > row0:
+        block, inner = read_with_halo(dem, Window(col0, row0, col1 - col0, row1 - row0), halo=1)
+        classes[row0 - window.row_off:row1 - window.row_off, col0 - window.col_off:col1 - window.col_off] = \
+            terrain_classes(block, dem.transform.a, dem.transform.e, bins.slope, bins.aspect)[inner]
+    return classes
+
+
+def polygon_statistics(geometries, dem_path, distance_path, cf_path, bins, tile_size=2048):
+    """Per-polygon pixel counts by terrain class and by distance band.
+
+    Returns a dict of arrays: the (``polygon``, ``terrain_class``,
+    ``terrain_pixels``) triples of non-zero slope/aspect class counts, and
+    (polygons, bands) ``band_pixels`` plus the sum of annual mean capacity
+    factor (``band_cf``) over the ``band_cf_pixels`` of them inside the CF
+    grid. Band ``j`` holds pixels up to ``bins.distance[j]`` metres from a
+    line (and past the previous edge).
+    """
+    geometries = np.asarray(geometries)
+    n = len(geometries)
+    terrain = np.zeros((n + 1) * bins.classes, dtype=np.int64)
+    band_pixels = np.zeros((n + 1) * bins.bands, dtype=np.int64)
+    band_cf = np.zeros((n + 1) * bins.bands)
+    band_cf_pixels = np.zeros((n + 1) * bins.bands, dtype=np.int64)
+    if n:
+        with rasterio.open(dem_path) as dem, rasterio.open(distance_path) as distance_src, \
+                rasterio.open(cf_path) as cf_src:
+            for src in (dem, distance_src, cf_src):
+                check_crs(src)
+            grid = Grid.of(dem)
+            mean_cf = cf_src.read().mean(axis=0).ravel()
+            tree = shapely.STRtree(geometries)
+            land = _land_window(dem, geometries)
+            for tile in iter_windows(int(land.width), int(land.height), tile_size):
+                window = Window(land.col_off + tile.col_off, land.row_off + tile.row_off, tile.width, tile.height)
+                hits = np.sort(tree.query(shapely.box(*grid.bounds(window))))
+                if len(hits) == 0:
+                    continue
+                ids = features.rasterize(zip(geometries[hits], (hits + 1).tolist()),
+                                         out_shape=(int(window.height), int(window.width)),
+                                         transform=grid.window_transform(window), fill=0, dtype="int32")
+                inside = ids > 0
+                if not inside.any():
+                    continue
+                ids = ids[inside]
+
+                classes = _classes(dem, window, bins)
+                terrain += np.bincount(ids * bins.classes + classes[inside], minlength=len(terrain))
+
+                distance = read_on_grid(distance_src, grid, window)[inside]
+                band = np.searchsorted(bins.distance, distance, side="left")
+                band[~(distance >= 0)] = bins.bands - 1
+                keys = ids * bins.bands + band
+                band_pixels += np.bincount(keys, minlength=len(band_pixels))
+
+                cells = cell_index(grid, window, cf_src.transform, cf_src.width, cf_src.height)[inside]
+                cf = np.where(cells >= 0, mean_cf[cells], np.nan)
+                valid = ~np.isnan(cf)
+                band_cf += np.bincount(keys[valid], weights=cf[valid], minlength=len(band_cf))
+                band_cf_pixels += np.bincount(keys[valid], minlength=len(band_cf_pixels))
+
+    counts = terrain.reshape(n + 1, bins.classes)[1:]
+    polygon, terrain_class = np.nonzero(counts)
+    return {
+        "polygon": polygon,
+        "terrain_class": terrain_class,
+        "terrain_pixels": counts[polygon, terrain_class],
+        "band_pixels": band_pixels.reshape(n + 1, bins.bands)[1:],
+        "band_cf": band_cf.reshape(n + 1, bins.bands)[1:],
+        "band_cf_pixels": band_cf_pixels.reshape(n + 1, bins.bands)[1:],
+    }
+
+
+def sweep_task(shard, land_path, dem_path, distance_path, cf_path, bins, tile_size):
+    # polygon_statistics of the polygons the shard owns
+    land = read_layer(land_path, columns=[], bbox=shard.bounds)
+    land = land[owned(land, shard)]
+    return polygon_statistics(land.geometry.values, dem_path, distance_path, cf_path, bins, tile_size)
+
+
+def sweep_key(shard, land_path, dem_path, distance_path, cf_path, bins, tile_size):
+    # The polygons read for the shard, and the pixels under all of them (the
+    # DEM's with the one-pixel halo of the slope/aspect gradients)
+    rows, extent = incremental.layer_region(land_path, shard.bounds)
+    if extent is None:
+        return rows
+    with rasterio.open(dem_path) as src:
+        halo = abs(src.transform.a)
+    minx, miny, maxx, maxy = extent
+    return (rows, incremental.raster_region(dem_path, (minx - halo, miny - halo, maxx + halo, maxy + halo)),
+            incremental.raster_region(distance_path, extent), incremental.raster_region(cf_path, extent))
+
+
+def merge_statistics(parts):
+    # Concatenate per-shard statistics, renumbering the polygons
+    offsets = np.cumsum([0] + [len(p["band_pixels"]) for p in parts])
+    merged = {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+    merged["polygon"] = np.concatenate([p["polygon"] + offset for p, offset in zip(parts, offsets)])
+    return merged
+
+
+def evaluate(stats, bins, scenarios, pixel_area):
+    """Suitable area and mean capacity factor of every scenario.
+
+    ``scenarios`` has one row per combination of ``max_slope``,
+    ``aspect_min``/``aspect_max`` (NaN: slope test only),
+    ``min_terrain_score`` and ``buffer_m``, each on the edges of ``bins``.
+    Adds ``polygons`` (kept with land within reach), ``suitable_km2`` and
+    ``mean_cf`` (annual mean, area-weighted) and returns the table.
+    """
+    scenarios = scenarios.reset_index(drop=True).copy()
+    n = len(stats["band_pixels"])
+    polygon, pixels = stats["polygon"], stats["terrain_pixels"]
+    totals = np.bincount(polygon, weights=pixels, minlength=n)
+
+    # Terrain score of every polygon under each slope/aspect rule
+    keys = [_rule(*row) for row in scenarios[["max_slope", "aspect_min", "aspect_max"]].itertuples(index=False)]
+    rules = {key: i for i, key in enumerate(dict.fromkeys(keys))}
+    rule = np.array([rules[key] for key in keys])
+    scores = np.zeros((n, len(rules)))
+    for (max_slope, aspect_range), i in rules.items():
+        passed = class_mask(bins.slope, bins.aspect, max_slope, aspect_range)[stats["terrain_class"]]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            scores[:, i] = np.nan_to_num(np.bincount(polygon, weights=pixels * passed, minlength=n) / totals)
+
+    # Pixels, CF sums and CF pixels within each band edge of every polygon
+    reach = {name: np.cumsum(stats[name][:, :-2], axis=1) for name in ("band_pixels", "band_cf", "band_cf_pixels")}
+    band = np.array([_edge(bins.distance, d) for d in scenarios["buffer_m"]])
+
+    # One column of kept polygons per (rule, score) pair, then everything by matrix products
+    pairs, pair = np.unique(np.column_stack([rule, scenarios["min_terrain_score"].to_numpy()]), axis=0,
+                            return_inverse=True)
+    pair = pair.ravel()
+    kept = np.column_stack([scores[:, int(r)] >= s for r, s in pairs]).astype(float)
+    within = kept.T @ reach["band_pixels"]
+    cf = kept.T @ reach["band_cf"]
+    cf_pixels = kept.T @ reach["band_cf_pixels"]
+    polygons = kept.T @ (reach["band_pixels"] > 0)
+
+    scenarios["polygons"] = polygons[pair, band].astype(int)
+    scenarios["suitable_km2"] = within[pair, band] * pixel_area / 1e6
+    with np.errstate(invalid="ignore", divide="ignore"):
+        scenarios["mean_cf"] = cf[pair, band] / cf_pixels[pair, band]
+    return scenarios
+
+
+def _rule(max_slope, aspect_min, aspect_max):
+    # (max_slope, aspect_range) of a scenario row; NaN aspects test the slope alone
+    return max_slope, None if pd.isna(aspect_min) else (aspect_min, aspect_max)
+
+
+def _edge(edges, value):
+    edges = list(edges)
+    if value not in edges:
+        raise ValueError(f"buffer {value} m is not a distance band edge {edges}")
+    return edges.index(value)
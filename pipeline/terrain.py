@@ -0,0 +1,213 @@
+"""Slope/aspect suitability tests on DEM blocks."""
+import numpy as np
+
+
+def reference_mask(dem, xres, yres, max_slope=5.0, aspect_range=(135.0, 225.0)):
+    # The original trigonometric formulation, kept for equivalence checks
+    x, y = np.gradient(dem, xres, yres)
+    slope = np.degrees(np.arctan(np.sqrt(x**2 + y**2)))
+    aspect = np.mod(np.degrees(np.arctan2(-x, y)) + 360, 360)
+    lo, hi = aspect_range
+    if lo <= hi:
+        facing = (aspect >= lo) & (aspect <= hi)
+    else:
+        facing = (aspect >= lo) | (aspect <= hi)
+    return ((slope < max_slope) | facing) & (dem > 0)
+
+
+def _gradients(dem, r0, r1, xres, yres, gx, gy):
+    # np.gradient(dem, xres, yres)[..][r0:r1], computed from rows r0-1..r1 only.
+    # Same float32 operations in the same order, so it matches np.gradient on a
+    # float32 DEM bit for bit.
+    n = dem.shape[0]
+    b0, b1 = max(r0 - 1, 0), min(r1 + 1, n)
+    block = dem[b0:b1].astype(np.float32, copy=False)
+    off = r0 - b0
+
+    lo, hi = max(r0, 1), min(r1, n - 1)
+    if hi > lo:
+        np.subtract(block[lo + 1 - b0:hi + 1 - b0], block[lo - 1 - b0:hi - 1 - b0],
+                    out=gx[lo - r0:hi - r0])
+        gx[lo - r0:hi - r0] /= 2.0 * xres
+    if r0 == 0:
+        np.subtract(block[1], block[0], out=gx[0])
+        gx[0] /= xres
+    if r1 == n:
+        np.subtract(block[-1], block[-2], out=gx[n - 1 - r0])
+        gx[n - 1 - r0] /= xres
+
+    rows = block[off:off + (r1 - r0)]
+    np.subtract(rows[:, 2:], rows[:, :-2], out=gy[:, 1:-1])
+    gy[:, 1:-1] /= 2.0 * yres
+    np.subtract(rows[:, 1], rows[:, 0], out=gy[:, 0])
+    gy[:, 0] /= yres
+    np.subtract(rows[:, -1], rows[:, -2], out=gy[:, -1])
+    gy[:, -1] /= yres
+    return rows
+
+
+def _direction(degrees):
+    # Unit vector for an aspect edge; rounded so that e.g. cos(90°) is exactly 0
+    # and pixels lying on the edge fall inside the wedge, as in reference_mask
+    rad = np.radians(degrees)
+    return np.float32(round(np.cos(rad), 12)), np.float32(round(np.sin(rad), 12))
+
+
+def terrain_mask(dem, xres, yres, max_slope=5.0, aspect_range=(135.0, 225.0), chunk_rows=256):
+    """Boolean ``(slope < max_slope | aspect in aspect_range) & dem > 0``.
+
+    Equivalent to ``reference_mask`` but trig-free: the slope test is
+    ``gx² + gy² < tan²(max_slope)`` and the aspect wedge is two cross-product
+    sign tests against its edge directions. Works in float32, ``chunk_rows``
+    rows at a time, so the only temporaries are a few chunk-sized buffers.
+    """
+    dem = np.asarray(dem)
+    height, width = dem.shape
+    out = np.empty((height, width), dtype=bool)
+
+    tan2 = np.float32(np.tan(np.radians(max_slope)) ** 2)
+    # Aspect is atan2(-gx, gy), i.e. the angle of the vector (gy, -gx)
+    cos_lo, sin_lo = _direction(aspect_range[0])
+    cos_hi, sin_hi = _direction(aspect_range[1])
+    narrow = np.mod(aspect_range[1] - aspect_range[0], 360) <= 180
+    # A range such as (0, 360) spans every direction, though its edges coincide
+    every = aspect_range[0] <= 0 and aspect_range[1] >= 360
+
+    rows = min(chunk_rows, height)
+    gx = np.empty((rows, width), dtype=np.float32)
+    gy = np.empty_like(gx)
+    tmp = np.empty_like(gx)
+    tmp2 = np.empty_like(gx)
+    hit = np.empty((rows, width), dtype=bool)
+
+    for r0 in range(0, height, rows):
+        r1 = min(r0 + rows, height)
+        k = r1 - r0
+        cx, cy, t, t2, h, o = gx[:k], gy[:k], tmp[:k], tmp2[:k], hit[:k], out[r0:r1]
+        dem_rows = _gradients(dem, r0, r1, xres, yres, cx, cy)
+
+        # Left of the lower edge: cross(u_lo, v) = -cos_lo*gx - sin_lo*gy >= 0
+        np.multiply(cx, -cos_lo, out=t)
+        np.multiply(cy, sin_lo, out=t2)
+        np.subtract(t, t2, out=t)
+        np.greater_equal(t, 0, out=o)
+        # Right of the upper edge: cross(v, u_hi) = gy*sin_hi + gx*cos_hi >= 0
+        np.multiply(cy, sin_hi, out=t)
+        np.multiply(cx, cos_hi, out=t2)
+        np.add(t, t2, out=t)
+        np.greater_equal(t, 0, out=h)
+        if every:
+            o.fill(True)
+        elif narrow:
+            o &= h
+        else:
+            o |= h
+
+        # Flat land: gx² + gy² < tan²(max_slope), squaring the gradients in place
+        np.multiply(cx, cx, out=cx)
+        np.multiply(cy, cy, out=cy)
+        cx += cy
+        np.less(cx, tan2, out=h)
+        o |= h
+
+        np.greater(dem_rows, 0, out=h)
+        o &= h
+    return out
+
+
+def _rays(aspect_edges):
+    # Aspect class edges with north (0) first; consecutive edges must be under
+    # 180° apart so that a cross-product sign says on which side of one a pixel is
+    rays = np.concatenate([[0.0], np.asarray(aspect_edges, dtype=float)])
+    gaps = np.diff(np.append(rays, 360.0))
+    if not (gaps > 0).all() or (gaps >= 180).any():
+        raise ValueError(f"aspect edges {list(aspect_edges)} must increase within (0, 360) in steps under 180°")
+    return rays
+
+
+def terrain_classes(dem, xres, yres, slope_edges, aspect_edges, chunk_rows=256):
+    """Slope/aspect class of every pixel, so ``terrain_mask`` can be swept.
+
+    Slope class ``k`` holds slopes in ``[slope_edges[k-1], slope_edges[k])``
+    (tested as ``gx² + gy² < tan²(edge)``, the same float32 test as
+    ``terrain_mask``). With ``rays = [0, *aspect_edges]``, aspect class
+    ``2j`` holds aspects exactly on ``rays[j]`` and ``2j + 1`` those strictly
+    between it and the next edge (or 360), since ``terrain_mask`` includes
+    both edges of its wedge. Which side of an edge a pixel is on comes from
+    the same float32 cross products as ``terrain_mask``. A pixel's class is
+    ``k * 2 * len(rays) + aspect class``, and the sea (``dem <= 0``) is the
+    last class, ``class_count(...) - 1``.
+    """
+    dem = np.asarray(dem)
+    height, width = dem.shape
+    out = np.empty((height, width), dtype=np.int32)
+    tan2 = (np.tan(np.radians(np.asarray(slope_edges, dtype=float))) ** 2).astype(np.float32)
+    rays = _rays(aspect_edges)
+    n = len(rays)
+    directions = np.array([_direction(d) for d in np.append(rays, 360.0)], dtype=np.float32)
+    neg_cos, sin = -directions[:, 0], directions[:, 1]
+    sea = class_count(slope_edges, aspect_edges) - 1
+
+    rows = min(chunk_rows, height)
+    gx = np.empty((rows, width), dtype=np.float32)
+    gy = np.empty_like(gx)
+    for r0 in range(0, height, rows):
+        r1 = min(r0 + rows, height)
+        cx, cy, o = gx[:r1 - r0], gy[:r1 - r0], out[r0:r1]
+        dem_rows = _gradients(dem, r0, r1, xres, yres, cx, cy)
+
+        # Sector from atan2, then moved onto or across its edges where the
+        # cross products cross(u_edge, v) = -cos*gx - sin*gy say so
+        aspect = np.mod(np.degrees(np.arctan2(-cx, cy)) + 360, 360)
+        j = np.minimum(np.searchsorted(rays, aspect, side="right") - 1, n - 1)
+        lower = cx * neg_cos[j] - cy * sin[j]
+        upper = cx * neg_cos[j + 1] - cy * sin[j + 1]
+        k = 2 * j + 1
+        k[upper == 0] += 1
+        k[upper > 0] += 2
+        k[lower == 0] -= 1
+        k[lower < 0] -= 2
+        k %= 2 * n
+
+        np.multiply(cx, cx, out=cx)
+        np.multiply(cy, cy, out=cy)
+        cx += cy
+        o[:] = np.searchsorted(tan2, cx, side="right") * (2 * n)
+        o += k
+        o[~(dem_rows > 0)] = sea
+    return out
+
+
+def class_count(slope_edges, aspect_edges):
+    # Slope x aspect classes (a ray and a sector per aspect edge) plus the sea
+    return (len(slope_edges) + 1) * 2 * (len(aspect_edges) + 1) + 1
+
+
+def class_mask(slope_edges, aspect_edges, max_slope=5.0, aspect_range=(135.0, 225.0)):
+    """Which ``terrain_classes`` classes pass ``terrain_mask(max_slope, aspect_range)``.
+
+    ``max_slope`` must be one of ``slope_edges`` and the ends of
+    ``aspect_range`` among ``aspect_edges`` (or 0/360); ``aspect_range=None``
+    tests the slope alone.
+    """
+    slope_edges, aspect_edges = list(slope_edges), list(aspect_edges)
+    if max_slope not in slope_edges:
+        raise ValueError(f"max_slope {max_slope} is not a slope class edge {slope_edges}")
+    flat = np.arange(len(slope_edges) + 1) <= slope_edges.index(max_slope)
+    rays = _rays(aspect_edges)
+    ends = np.append(rays[1:], 360.0)
+    if aspect_range is None:
+        facing = np.zeros(2 * len(rays), dtype=bool)
+    else:
+        lo, hi = aspect_range
+        if {lo, hi} - set(aspect_edges) - {0, 360}:
+            raise ValueError(f"aspect_range {aspect_range} does not lie on the aspect class edges {aspect_edges}")
+        if lo <= hi:
+            # North is both 0 and 360
+            on = ((rays >= lo) & (rays <= hi)) | ((rays == 0) & (hi >= 360))
+            between = (rays >= lo) & (ends <= hi)
+        else:
+            on = (rays >= lo) | (rays <= hi)
+            between = (rays >= lo) | (ends <= hi)
+        facing = np.column_stack([on, between]).ravel()
+    return np.append(flat[:, None] | facing[None, :], False)
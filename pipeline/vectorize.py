@@ -0,0 +1,32 @@
+"""Turn traced pixel paths into georeferenced line geometries in bulk."""
+import numpy as np
+import shapely
+
+
+def pixel_to_map(transform, cols, rows):
+    # Pixel-centre map coordinates of many pixels in one affine product
+    # (what rasterio.transform.xy gives one pixel at a time)
+    cols = np.asarray(cols, dtype=np.float64) + 0.5
+    rows = np.asarray(rows, dtype=np.float64) + 0.5
+    x = transform.a * cols + transform.b * rows + transform.c
+    y = transform.d * cols + transform.e * rows + transform.f
+    return x, y
+
+
+def contours_to_lines(contours, transform, tolerance=None):
+    """LineStrings in map units from OpenCV contours (arrays of (col, row) points).
+
+    Contours with fewer than two points and lines that come out invalid are
+    dropped. With ``tolerance`` (map units), lines are simplified with
+    Douglas-Peucker, preserving topology.
+    """
+    contours = [c.reshape(-1, 2) for c in contours if len(c) >= 2]
+    if not contours:
+        return np.array([], dtype=object)
+    points = np.concatenate(contours)
+    x, y = pixel_to_map(transform, points[:, 0], points[:, 1])
+    index = np.repeat(np.arange(len(contours)), [len(c) for c in contours])
+    lines = shapely.linestrings(np.column_stack([x, y]), indices=index)
+    if tolerance:
+        lines = shapely.simplify(lines, tolerance, preserve_topology=True)
+    return lines[shapely.is_valid(lines)]
@@ -0,0 +1,91 @@
+"""GeoParquet interchange between the vector stages.
+
+Layers are written as GeoParquet with a covering bbox column, so readers can
+project columns and skip rows outside a bounding box without parsing their
+geometry. Set ``SOLAR_EXPORT_SHP=1`` to also write the old shapefiles for use
+in desktop GIS.
+"""
+import json
+import os
+
+import geopandas as gpd
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pyogrio
+from pyproj import CRS
+from rasterio.warp import transform_bounds
+
+EXPORT_SHAPEFILES = os.environ.get("SOLAR_EXPORT_SHP", "0") == "1"
+
+
+def write_layer(gdf, path, shapefile=None):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    gdf.to_parquet(path, index=False, write_covering_bbox=True)
+    if shapefile is not None and EXPORT_SHAPEFILES:
+        os.makedirs(os.path.dirname(shapefile) or ".", exist_ok=True)
+        gdf.to_file(shapefile)
+
+
+def read_layer(path, columns=None, bbox=None):
+    """Read a layer, optionally only ``columns`` (the geometry is always
+    included) and only rows whose bbox intersects ``bbox`` = (minx, miny, maxx, maxy)."""
+    if columns is not None:
+        geometry = layer_info(path)["geometry"]
+        columns = [c for c in columns if c != geometry] + [geometry]
+    gdf = gpd.read_parquet(path, columns=columns, bbox=bbox)
+    if gdf.crs is not None:
+        gdf = gdf.set_crs(_short_crs(gdf.crs), allow_override=True)
+    return gdf
+
+
+def sql_in(column, values):
+    # OGR SQL `"column" IN (...)` for a `where` filter, quoting string values
+    quoted = [f"'{v.replace(chr(39), chr(39) * 2)}'" if isinstance(v, str) else str(v) for v in values]
+    return f'"{column}" IN ({", ".join(quoted)})'
+
+
+def read_source(path, columns=None, where=None, bbox=None, crs=None):
+    """Read a GDAL vector source (e.g. a shapefile) with the reader doing the filtering.
+
+    The OGR SQL ``where`` and the ``bbox`` (in ``crs``, or the source CRS
+    when ``crs`` is None) are applied by GDAL and only ``columns`` are
+    decoded, through Arrow, so only the rows that pass are ever built; they
+    are then reprojected to ``crs``.
+    """
+    if bbox is not None and crs is not None:
+        bbox = transform_bounds(crs, pyogrio.read_info(path)["crs"], *bbox, densify_pts=21)
+    gdf = pyogrio.read_dataframe(path, columns=columns, where=where, bbox=bbox, use_arrow=True)
+    return gdf.to_crs(crs) if crs is not None else gdf
+
+
+def _short_crs(crs):
+    # GeoParquet stores PROJJSON; prefer the "EPSG:2157" form when there is a code
+    crs = CRS.from_user_input(crs)
+    return CRS.from_epsg(crs.to_epsg()) if crs.to_epsg() else crs
+
+
+def layer_info(path):
+    # Row count, CRS and columns from the Parquet footer, without reading any rows
+    meta = pq.read_metadata(path)
+    geo = json.loads(meta.metadata[b"geo"])
+    geometry = geo["primary_column"]
+    crs = geo["columns"][geometry].get("crs")
+    return {
+        "rows": meta.num_rows,
+        "crs": _short_crs(crs) if crs is not None else None,
+        "geometry": geometry,
+        "columns": [c for c in meta.schema.to_arrow_schema().names if c not in (geometry, "bbox")],
+    }
+
+
+def layer_bounds(path):
+    # Total bounds from the covering bbox column, without parsing any geometry
+    table = pq.read_table(path, columns=["bbox"]).flatten()
+    if table.num_rows == 0:
+        return None
+    return (
+        pc.min(table["bbox.xmin"]).as_py(),
+        pc.min(table["bbox.ymin"]).as_py(),
+        pc.max(table["bbox.xmax"]).as_py(),
+        pc.max(table["bbox.ymax"]).as_py(),
+    )
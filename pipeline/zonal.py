@@ -0,0 +1,98 @@
+"""Per-polygon raster statistics from one rasterization pass.
+
+Instead of a window read and a rasterization per polygon (as rasterstats'
+``zonal_stats`` does), all polygon IDs are burned onto the raster grid a tile
+at a time and the per-polygon sums and pixel counts come from ``np.bincount``.
+"""
+import math
+
+import numpy as np
+import rasterio
+import shapely
+from rasterio import features
+from rasterio.windows import Window, from_bounds
+from rasterio.windows import bounds as window_bounds
+
+from pipeline.raster import iter_windows
+
+
+def _grid_window(src, geometries):
+    # Pixel window just covering every polygon, on the raster's grid. It may
+    # reach past the raster edge; those pixels read as nodata.
+    minx, miny, maxx, maxy = shapely.total_bounds(geometries)
+    poly = from_bounds(minx, miny, maxx, maxy, src.transform)
+    col0, row0 = math.floor(poly.col_off), math.floor(poly.row_off)
+    col1 = math.ceil(poly.col_off + poly.width)
+    row1 = math.ceil(poly.row_off + poly.height)
+    return Window(col0, row0, col1 - col0, row1 - row0)
+
+
+def _zone_pixels(geometries, src, tile_size, band):
+    # Yields (ids, values) per tile: flattened polygon IDs (polygon i is i + 1,
+    # 0 = no polygon or nodata) and the pixel values under them
+    tree = shapely.STRtree(geometries)
+    grid = _grid_window(src, geometries)
+    fill = src.nodata if src.nodata is not None else 0
+    for tile in iter_windows(int(grid.width), int(grid.height), tile_size):
+        window = Window(grid.col_off + tile.col_off, grid.row_off + tile.row_off, tile.width, tile.height)
+        hits = np.sort(tree.query(shapely.box(*window_bounds(window, src.transform))))
+        if len(hits) == 0:
+            continue
+        ids = features.rasterize(
+            zip(geometries[hits], (hits + 1).tolist()),
+            out_shape=(int(window.height), int(window.width)),
+            transform=src.window_transform(window),
+            fill=0,
+            dtype="int32",
+        )
+        inside = (window.col_off >= 0 and window.row_off >= 0 and window.col_off + window.width <= src.width
+                  and window.row_off + window.height <= src.height)
+        values = src.read(band, window=window, boundless=not inside, fill_value=fill)
+        if src.nodata is not None:
+            ids[values == src.nodata] = 0
+        yield ids.ravel(), values.ravel()
+
+
+def zonal_sums(geometries, raster_path, tile_size=2048, band=1):
+    """Sum of pixel values and pixel count per geometry.
+
+    A pixel belongs to a polygon when its centre falls inside it (rasterstats'
+    default ``all_touched=False``); the raster's nodata pixels are ignored.
+    Like rasterstats' boundless reads, pixels beyond the raster edge count as
+    nodata, or as 0 when the raster has no nodata value. Polygons are assumed
+    not to overlap, as in CORINE; where they do, the later polygon takes the
+    shared pixels.
+    """
+    geometries = np.asarray(geometries)
+    n = len(geometries)
+    sums = np.zeros(n + 1)
+    counts = np.zeros(n + 1, dtype=np.int64)
+    if n == 0:
+        return sums[1:], counts[1:]
+    with rasterio.open(raster_path) as src:
+        for ids, values in _zone_pixels(geometries, src, tile_size, band):
+            sums += np.bincount(ids, weights=values, minlength=n + 1)
+            counts += np.bincount(ids, minlength=n + 1)
+    return sums[1:], counts[1:]
+
+
+def zonal_means(geometries, raster_path, tile_size=2048, band=1):
+    # NaN for polygons that contain no pixel centres (rasterstats returns None)
+    sums, counts = zonal_sums(geometries, raster_path, tile_size, band)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts
+
+
+def zonal_mins(geometries, raster_path, tile_size=2048, band=1):
+    # Smallest pixel value per geometry, same pixel rules as zonal_sums;
+    # NaN for polygons that contain no pixel centres
+    geometries = np.asarray(geometries)
+    mins = np.full(len(geometries) + 1, np.inf)
+    if len(geometries):
+        with rasterio.open(raster_path) as src:
+            for ids, values in _zone_pixels(geometries, src, tile_size, band):
+                keep = ids > 0  # np.minimum.at is slow; skip the background
+                np.minimum.at(mins, ids[keep], values[keep])
+    mins = mins[1:]
+    mins[np.isinf(mins)] = np.nan
+    return mins
@@ -0,0 +1,51 @@
+"""Run the suitability pipeline, skipping stages that are already up to date.
+
+    python run_pipeline.py                      # every stage
+    python run_pipeline.py terrain_score        # a stage and everything it depends on
+    python run_pipeline.py --dry-run            # show what would run
+    python run_pipeline.py -j 2 --force dem     # rerun the DEM stage regardless of the cache
+    python run_pipeline.py --plots png          # also write the diagnostic figures to plots/
+    python run_pipeline.py --force eirgrid --profile "trace centreline"   # cProfile one step
+
+Stage names, inputs and outputs are declared in pipeline/stages.py. Per-stage
+logs are written to .pipeline/logs/, and timing, memory and I/O reports (per
+stage and for the whole run) to .pipeline/reports/, see pipeline/instrument.py.
+Profiling only applies to stages that run, so force the stage if it's cached.
+Running a script directly keeps the old interactive figures; set
+SOLAR_PLOTS=png or off for headless runs (see pipeline/plots.py).
+"""
+import argparse
+import os
+import sys
+
+from pipeline.runner import run
+from pipeline.stages import STAGES
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the solar farm suitability pipeline.")
+    parser.add_argument("stages", nargs="*", help=f"target stages (default: all of {', '.join(s.name for s in STAGES)})")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="stages to run in parallel")
+    parser.add_argument("--force", action="append", default=[], metavar="STAGE", help="rerun STAGE even if cached")
+    parser.add_argument("--force-all", action="store_true", help="rerun every selected stage")
+    parser.add_argument("--plots", choices=["off", "png"], default="off",
+                        help="skip diagnostic figures, or render them to plots/ in the background")
+    parser.add_argument("--export-shp", action="store_true",
+                        help="also write shapefile copies of the GeoParquet layers for desktop GIS")
+    parser.add_argument("--profile", action="append", default=[], metavar="STEP",
+                        help="run the instrumented step STEP under cProfile (its name, or path if nested)")
+    parser.add_argument("--tracemalloc", action="append", default=[], metavar="STEP",
+                        help="trace the memory allocations of the instrumented step STEP")
+    parser.add_argument("--dry-run", action="store_true", help="report what would run without running it")
+    args = parser.parse_args()
+
+    force = [s.name for s in STAGES] if args.force_all else args.force
+    status = run(args.stages, jobs=args.jobs, force=force, dry_run=args.dry_run, plots=args.plots,
+                 export_shp=args.export_shp, profile=args.profile, trace=args.tracemalloc)
+    return 1 if any(s in ("failed", "blocked") for s in status.values()) else 0
+
+
+if __name__ == "__main__":
+    # Stage scripts use paths relative to the repo root
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.exit(main())
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+
+CRS = "EPSG:2157"
+
+
+@pytest.fixture
+def write_raster(tmp_path):
+    """Write a north-up EPSG:2157 GeoTIFF; returns its path."""
+    def write(name, bands, left=500000.0, top=700000.0, resolution=30.0, nodata=None, tags=None):
+        bands = np.asarray(bands)
+        if bands.ndim == 2:
+            bands = bands[None]
+        path = tmp_path / name
+        profile = {"driver": "GTiff", "height": bands.shape[1], "width": bands.shape[2], "count": bands.shape[0],
+                   "dtype": bands.dtype, "crs": CRS, "transform": from_origin(left, top, resolution, resolution),
+                   "nodata": nodata, "tiled": True, "blockxsize": 16, "blockysize": 16}
+        with rasterio.open(path, "w", **profile) as dst:
+            dst.write(bands)
+            for band, band_tags in enumerate(tags or [], start=1):
+                dst.update_tags(band, **band_tags)
+        return str(path)
+    return write
@@ -0,0 +1,82 @@
+"""Climatology's streaming per-month statistics against numpy over all hours."""
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from pipeline.climatology import Climatology
+
+LATITUDE = np.array([55.0, 54.5, 54.0])
+LONGITUDE = np.array([-10.0, -9.5, -9.0, -8.5])
+
+
+def _year(directory, year, seed):
+    # An hourly spv_cf file for `year`, with some NaN hours
+    rng = np.random.default_rng(seed)
+    time = pd.date_range(f"{year}-01-01", f"{year}-12-31 23:00", freq="h")
+    values = rng.gamma(2.0, 0.05, (len(time), len(LATITUDE), len(LONGITUDE)))
+    values[rng.random(values.shape) < 0.05] = np.nan
+    path = directory / f"solar_{year}.nc"
+    xr.Dataset({"spv_cf": (("time", "latitude", "longitude"), values)},
+               coords={"time": time, "latitude": LATITUDE, "longitude": LONGITUDE}).to_netcdf(path)
+    return str(path)
+
+
+def _expected(paths):
+    # Per-month mean, sample std and count of every hour in `paths`
+    data = xr.concat([xr.open_dataset(p)["spv_cf"].load() for p in paths], "time")
+    months = data["time"].dt.month.values
+    values = data.values
+    return (np.stack([np.nanmean(values[months == m], axis=0) for m in range(1, 13)]),
+            np.stack([np.nanstd(values[months == m], axis=0, ddof=1) for m in range(1, 13)]),
+            np.stack([np.count_nonzero(~np.isnan(values[months == m]), axis=0) for m in range(1, 13)]))
+
+
+@pytest.fixture
+def years(tmp_path):
+    return [_year(tmp_path, year, seed) for seed, year in enumerate((2019, 2020, 2021))]
+
+
+def test_merge_matches_numpy(tmp_path, years):
+    climatology = Climatology(str(tmp_path / "state.npz"), chunk_hours=100)
+    assert climatology.update(years) == 3
+    mean, std, count = _expected(years)
+    np.testing.assert_array_equal(climatology.layer_count().values, count)
+    np.testing.assert_allclose(climatology.layer_mean().values, mean, rtol=1e-12)
+    np.testing.assert_allclose(climatology.layer_std().values, std, rtol=1e-9)
+    assert list(climatology.layer_mean()["month"].values) == list(range(1, 13))
+
+
+def test_adding_a_year_reads_only_that_year(tmp_path, years):
+    state = str(tmp_path / "state.npz")
+    first = Climatology(state, chunk_hours=100)
+    assert first.update(years[:2]) == 2
+    first.save()
+
+    resumed = Climatology(state, chunk_hours=100)
+    assert resumed.update(years) == 1
+    resumed.save()
+    mean, std, count = _expected(years)
+    np.testing.assert_array_equal(resumed.layer_count().values, count)
+    np.testing.assert_allclose(resumed.layer_mean().values, mean, rtol=1e-12)
+    np.testing.assert_allclose(resumed.layer_std().values, std, rtol=1e-9)
+    assert Climatology(state).update(years) == 0
+
+
+def test_changed_file_rebuilds(tmp_path, years):
+    state = str(tmp_path / "state.npz")
+    climatology = Climatology(state)
+    climatology.update(years)
+    climatology.save()
+    _year(tmp_path, 2020, seed=99)  # replaces solar_2020.nc
+    rebuilt = Climatology(state)
+    assert rebuilt.update(years) == 3
+    np.testing.assert_allclose(rebuilt.layer_mean().values, _expected(years)[0], rtol=1e-12)
+
+
+def test_save_without_data_raises(tmp_path):
+    climatology = Climatology(str(tmp_path / "state.npz"))
+    assert climatology.update([]) == 0
+    with pytest.raises(ValueError, match="no climatology"):
+        climatology.save()
+    assert not (tmp_path / "state.npz").exists()
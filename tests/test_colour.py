@@ -0,0 +1,37 @@
+"""The ink lookup table against OpenCV's HSV tests on the colours themselves."""
+import cv2
+import numpy as np
+import pytest
+
+from pipeline.colour import classify, ink_lut
+
+RANGES = [(np.array([0, 100, 100]), np.array([10, 255, 255])),
+          (np.array([100, 50, 50]), np.array([130, 255, 255])),
+          (np.array([0, 0, 180]), np.array([180, 40, 255]))]
+
+
+def _direct(image, white_threshold):
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    mask = np.zeros(image.shape[:2], dtype=np.uint8)
+    for lower, upper in RANGES:
+        mask |= cv2.inRange(hsv, lower, upper)
+    mask[np.all(image >= white_threshold, axis=-1)] = 0
+    return mask
+
+
+@pytest.mark.parametrize("white_threshold", [240, 200])
+@pytest.mark.parametrize("chunk_blues", [16, 7])
+def test_lut_matches_opencv(white_threshold, chunk_blues):
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (300, 400, 3), dtype=np.uint8)
+    image[:20] = rng.integers(white_threshold - 5, 256, (20, 400, 3), dtype=np.uint8)  # near white
+    lut = ink_lut(RANGES, white_threshold, chunk_blues=chunk_blues)
+    np.testing.assert_array_equal(classify(image, lut, strip_rows=64), _direct(image, white_threshold))
+
+
+def test_excludes_are_blanked():
+    image = np.zeros((50, 60, 3), dtype=np.uint8)
+    image[..., 2] = 255  # pure red is ink
+    mask = classify(image, ink_lut(RANGES), excludes=[((10, 5), (19, 14))])
+    assert mask[5:15, 10:20].max() == 0
+    assert np.count_nonzero(mask) == 50 * 60 - 100
@@ -0,0 +1,84 @@
+"""The per-year CDS cache, served by the offline LocalClient."""
+import zipfile
+
+import pytest
+
+from pipeline import downloads
+from pipeline.downloads import LocalClient, cds_retrieve, request_key
+
+DATASET = "sis-energy-pecd"
+
+
+class Counting(LocalClient):
+    def __init__(self, root):
+        super().__init__(root)
+        self.years = []
+
+    def retrieve(self, dataset, request, target):
+        self.years.append(request["year"][0])
+        super().retrieve(dataset, request, target)
+
+
+class Interrupted(LocalClient):
+    # Writes part of the zip, then fails as a dropped connection would
+    def retrieve(self, dataset, request, target):
+        with open(target, "wb") as f:
+            f.write(b"PK\x03\x04 truncated")
+        raise ConnectionError("connection reset")
+
+
+def _request(years, variable="solar_photovoltaic_power_generation"):
+    return {"variable": [variable], "year": years, "month": ["01", "02"], "format": "zip"}
+
+
+@pytest.fixture
+def offline(tmp_path, monkeypatch):
+    monkeypatch.setattr(downloads, "CACHE_DIR", str(tmp_path / "cache"))
+    for year in (2020, 2021, 2022):
+        folder = tmp_path / "cds" / DATASET / str(year)
+        folder.mkdir(parents=True)
+        (folder / f"cf_{year}.nc").write_bytes(str(year).encode() * 100)
+    return str(tmp_path / "cds")
+
+
+def test_years_are_cached_and_reused(offline):
+    client = Counting(offline)
+    paths = cds_retrieve(DATASET, _request(["2020", "2021"]), client)
+    assert client.years == ["2020", "2021"]
+    with zipfile.ZipFile(paths[1]) as zf:
+        assert zf.namelist() == ["cf_2021.nc"]
+
+    # A larger request, with the years in another order, only fetches the new year
+    client = Counting(offline)
+    again = cds_retrieve(DATASET, _request([2022, 2021, 2020]), client)
+    assert client.years == ["2022"]
+    assert again[:2] == paths
+
+
+def test_changed_request_downloads_again(offline):
+    cds_retrieve(DATASET, _request(["2020"]), Counting(offline))
+    client = Counting(offline)
+    other = _request(["2020"], variable="solar_photovoltaic_power_capacity_factor")
+    assert request_key(DATASET, other) != request_key(DATASET, _request(["2020"]))
+    cds_retrieve(DATASET, other, client)
+    assert client.years == ["2020"]
+
+
+def test_part_files_are_promoted_only_when_complete(offline, tmp_path):
+    with pytest.raises(ConnectionError):
+        cds_retrieve(DATASET, _request(["2020"]), Interrupted(offline))
+    cache = tmp_path / "cache" / "cds"
+    assert [p.suffix for p in cache.iterdir()] == [".part"]
+
+    # The next run requests the year again and replaces the stale .part
+    client = Counting(offline)
+    (path,) = cds_retrieve(DATASET, _request(["2020"]), client)
+    assert client.years == ["2020"]
+    assert sorted(p.name for p in cache.iterdir()) == [path.split("/")[-1]]
+    with zipfile.ZipFile(path) as zf:
+        assert zf.testzip() is None
+
+
+def test_missing_offline_year(offline):
+    with pytest.raises(FileNotFoundError, match="2019"):
+        cds_retrieve(DATASET, _request(["2019"]), LocalClient(offline))
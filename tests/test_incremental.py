@@ -0,0 +1,112 @@
+"""Shard keys change with exactly the rows under the shard, and nothing else."""
+import importlib
+
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+
+from pipeline import incremental, shards
+from pipeline.shards import make_shards, run_sharded
+from pipeline.vectors import write_layer
+
+# 20 x 20 squares, none touching a shard edge, in 4 x 4 shards of 1 km
+LEFT, BOTTOM, SIZE = 500000.0, 700000.0, 1000
+calls = []
+
+
+def _layer(path, order=None, names=None):
+    x, y = np.meshgrid(np.arange(20) * 200 + LEFT + 50, np.arange(20) * 200 + BOTTOM + 50)
+    gdf = gpd.GeoDataFrame({"name": names if names is not None else [f"p{i}" for i in range(400)]},
+                           geometry=shapely.box(x.ravel(), y.ravel(), x.ravel() + 100, y.ravel() + 100),
+                           crs="EPSG:2157")
+    if order is not None:
+        gdf = gdf.iloc[order]
+    write_layer(gdf, str(path))
+    return str(path), gdf
+
+
+def _keys(path):
+    grid = make_shards((LEFT, BOTTOM, LEFT + 4 * SIZE - 1, BOTTOM + 4 * SIZE - 1), SIZE)
+    return grid, {shard: incremental.layer_region(path, shard.bounds)[0] for shard in grid}
+
+
+def count_task(shard, path):
+    calls.append(shard.name)
+    return len(incremental.layer_region(path, shard.bounds)[1] or ())
+
+
+def count_key(shard, path):
+    return incremental.layer_region(path, shard.bounds)[0]
+
+
+def _isolate(monkeypatch, tmp_path):
+    monkeypatch.setattr(incremental, "SHARD_DIR", str(tmp_path / "shards"))
+    monkeypatch.setattr(incremental, "INDEX_DIR", str(tmp_path / "shards" / "index"))
+    monkeypatch.setattr(incremental, "_indexes", {})
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    _isolate(monkeypatch, tmp_path)
+    calls.clear()
+
+
+def test_one_changed_row_changes_only_its_shards(tmp_path):
+    path, gdf = _layer(tmp_path / "a.parquet")
+    grid, before = _keys(path)
+    names = list(gdf["name"])
+    names[137] = "changed"
+    path, _ = _layer(tmp_path / "b.parquet", names=names)
+    _, after = _keys(path)
+
+    minx, miny, maxx, maxy = gdf.geometry.iloc[137].bounds
+    touched = {s for s in grid if s.bounds[0] <= maxx and s.bounds[2] >= minx
+               and s.bounds[1] <= maxy and s.bounds[3] >= miny}
+    assert len(touched) == 1
+    assert {s for s in grid if before[s] != after[s]} == touched
+
+
+def test_reordered_rows_keep_every_key(tmp_path):
+    path, _ = _layer(tmp_path / "a.parquet")
+    _, before = _keys(path)
+    path, _ = _layer(tmp_path / "b.parquet", order=np.random.default_rng(0).permutation(400))
+    _, after = _keys(path)
+    assert after == before
+
+
+def test_only_changed_shards_are_recomputed(tmp_path):
+    path, _ = _layer(tmp_path / "a.parquet")
+    grid, _ = _keys(path)
+    first = run_sharded(count_task, grid, path, workers=1, key=count_key)
+    assert len(calls) == 16
+    calls.clear()
+    assert run_sharded(count_task, grid, path, workers=1, key=count_key) == first
+    assert calls == []
+
+
+def test_disabled_recomputes_everything(tmp_path, monkeypatch):
+    path, _ = _layer(tmp_path / "a.parquet")
+    grid, _ = _keys(path)
+    run_sharded(count_task, grid, path, workers=1, key=count_key)
+    calls.clear()
+    monkeypatch.setenv("SOLAR_INCREMENTAL", "0")
+    importlib.reload(incremental)
+    try:
+        _isolate(monkeypatch, tmp_path)
+        assert shards.incremental.ENABLED is False
+        run_sharded(count_task, grid, path, workers=1, key=count_key)
+        assert sorted(calls) == sorted(s.name for s in grid)
+    finally:
+        monkeypatch.delenv("SOLAR_INCREMENTAL")
+        importlib.reload(incremental)
+
+
+def test_index_cleanup_spares_other_writers(tmp_path):
+    index_dir = tmp_path / "shards" / "index"
+    index_dir.mkdir(parents=True)
+    (index_dir / "a-0123456789abcdef.npz").write_bytes(b"earlier version")
+    (index_dir / "a-x1y2z3.part").write_bytes(b"another stage writing")
+    path, _ = _layer(tmp_path / "a.parquet")
+    incremental.layer_region(path, (LEFT, BOTTOM, LEFT + SIZE, BOTTOM + SIZE))
+    assert {p.name for p in index_dir.iterdir()} == {"a-x1y2z3.part", f"a-{incremental._file_key(path)}.npz"}
@@ -0,0 +1,72 @@
+"""Sweep scenarios against stage 2's zonal terrain scores and stage 3's buffer clip."""
+import itertools
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+
+from pipeline.clip import clip_to_union
+from pipeline.sweep import Bins, evaluate, merge_statistics, polygon_statistics
+from pipeline.terrain import reference_mask, terrain_mask
+from pipeline.zonal import zonal_means
+
+LEFT, TOP, RES = 500000.0, 700000.0, 30.0
+ROWS, COLS = 56, 76  # the last row and column of polygons straddle the DEM's edges
+LINE_X = LEFT + 39 * RES  # polygons lie 30-270 m or 330+ m from it, so a 300 m buffer cuts none
+BINS = Bins(slope=(1, 2, 3, 5, 8), aspect=tuple(range(45, 360, 45)), distance=(150, 300, 1000, 5000))
+CF = np.linspace(0.05, 0.2, 12)
+
+
+def _blocks():
+    # 8 x 8 pixel squares with 2-pixel gaps
+    boxes = [(c, r) for r in range(0, 60, 10) for c in range(0, 80, 10)]
+    return np.array([shapely.box(LEFT + c * RES, TOP - (r + 8) * RES, LEFT + (c + 8) * RES, TOP - r * RES)
+                     for c, r in boxes])
+
+
+@pytest.fixture
+def inputs(write_raster):
+    rng = np.random.default_rng(3)
+    y, x = np.mgrid[0:ROWS, 0:COLS]
+    dem = (np.sin(x / 6.0) * np.cos(y / 9.0) * 20 + rng.normal(0, 1.5, (ROWS, COLS)) + 8).astype(np.float32)
+    dem_path = write_raster("dem.tif", dem)
+    wide = COLS + 20
+    centres = LEFT - 10 * RES + (np.arange(wide) + 0.5) * RES
+    distance = np.tile(np.abs(centres - LINE_X), (ROWS + 20, 1)).astype(np.float32)
+    distance_path = write_raster("distance.tif", distance, left=LEFT - 10 * RES, top=TOP + 10 * RES)
+    cf = np.broadcast_to(CF[:, None, None], (12, 12, 12)).astype(np.float32)
+    cf_path = write_raster("cf.tif", cf, left=LEFT - 600, top=TOP + 600, resolution=300.0)
+    return dem, dem_path, distance_path, cf_path
+
+
+def test_scenarios_match_stages_2_and_3(inputs, write_raster):
+    dem, dem_path, distance_path, cf_path = inputs
+    geometries = _blocks()
+    # Two shards' worth, to go through merge_statistics as the stage script does
+    half = len(geometries) // 2
+    stats = merge_statistics([polygon_statistics(geometries[:half], dem_path, distance_path, cf_path, BINS, 16),
+                              polygon_statistics(geometries[half:], dem_path, distance_path, cf_path, BINS)])
+    rules = [(2, (135, 225)), (5, (90, 270)), (3, (315, 45)), (5, None)]
+    scenarios = pd.DataFrame(
+        [(slope, *(aspect or (np.nan, np.nan)), score, buffer)
+         for (slope, aspect), score, buffer in itertools.product(rules, [0.5, 0.9], [300, 5000])],
+        columns=["max_slope", "aspect_min", "aspect_max", "min_terrain_score", "buffer_m"])
+    result = evaluate(stats, BINS, scenarios, RES * RES)
+
+    land = gpd.GeoDataFrame(geometry=geometries, crs="EPSG:2157")
+    for row in result.itertuples():
+        if np.isnan(row.aspect_min):
+            mask = reference_mask(dem, RES, -RES, row.max_slope, (400, 400))  # no aspect passes
+        else:
+            mask = terrain_mask(dem, RES, -RES, row.max_slope, (row.aspect_min, row.aspect_max))
+        mask_path = write_raster(f"mask-{row.Index}.tif", mask.astype(np.uint8))
+        kept = land[zonal_means(geometries, mask_path) >= row.min_terrain_score]
+        clipped = clip_to_union(kept, [shapely.LineString([(LINE_X, TOP - 1e5), (LINE_X, TOP + 1e5)])
+                                       .buffer(row.buffer_m)])
+        assert row.polygons == len(clipped), row
+        assert row.suitable_km2 == pytest.approx(clipped.area.sum() / 1e6, rel=1e-12), row
+        if row.polygons:
+            assert row.mean_cf == pytest.approx(CF.mean(), rel=1e-6)
+
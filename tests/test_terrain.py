@@ -0,0 +1,60 @@
+"""terrain_mask must match the trigonometric reference_mask pixel for pixel, and
+the sweep's terrain classes must match terrain_mask."""
+import numpy as np
+import pytest
+
+from pipeline.terrain import class_mask, reference_mask, terrain_classes, terrain_mask
+
+ASPECT_RANGES = [(135, 225), (90, 270), (0, 90), (315, 45), (270, 90), (0, 360), (200, 190)]
+
+
+def _dem(rng, shape=(300, 400), relief=200.0):
+    # Smooth hills with sea below 0, plus pixel noise for steep slopes
+    y, x = np.mgrid[0:shape[0], 0:shape[1]]
+    waves = np.sin(x / rng.uniform(5, 40)) * np.cos(y / rng.uniform(5, 40))
+    return waves * relief + rng.normal(0, relief / 10, shape) + relief / 4
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("aspect_range", ASPECT_RANGES)
+@pytest.mark.parametrize("max_slope", [0.5, 5, 30])
+def test_random_slopes(seed, aspect_range, max_slope):
+    dem = _dem(np.random.default_rng(seed)).astype(np.float32)
+    expected = reference_mask(dem, 30.0, -30.0, max_slope, aspect_range)
+    actual = terrain_mask(dem, 30.0, -30.0, max_slope, aspect_range, chunk_rows=64)
+    assert np.count_nonzero(actual != expected) == 0
+
+
+@pytest.mark.parametrize("aspect_range", ASPECT_RANGES)
+def test_int16(aspect_range):
+    # Whole-metre steps put many gradients exactly on the slope and aspect edges
+    dem = _dem(np.random.default_rng(7), relief=40.0).round().astype(np.int16)
+    expected = reference_mask(dem, 10.0, -10.0, 5, aspect_range)
+    actual = terrain_mask(dem, 10.0, -10.0, 5, aspect_range)
+    assert np.count_nonzero(actual != expected) == 0
+
+
+@pytest.mark.parametrize("height", [0.0, 12.5, -3.0])
+def test_flat(height):
+    dem = np.full((50, 70), height, dtype=np.float32)
+    expected = reference_mask(dem, 30.0, -30.0)
+    assert np.count_nonzero(terrain_mask(dem, 30.0, -30.0) != expected) == 0
+    assert terrain_mask(dem, 30.0, -30.0).all() == (height > 0)
+
+
+SLOPE_EDGES = (1, 2, 3, 4, 5, 6, 8, 10, 15)
+ASPECT_EDGES = tuple(range(15, 360, 15))
+
+
+@pytest.mark.parametrize("aspect_range", [r for r in ASPECT_RANGES if r != (200, 190)] + [None])
+@pytest.mark.parametrize("max_slope", [2, 5, 10])
+def test_classes_int16(aspect_range, max_slope):
+    # Sweeping classes must reproduce terrain_mask, gradients on an edge included
+    dem = _dem(np.random.default_rng(7), relief=40.0).round().astype(np.int16)
+    classes = terrain_classes(dem, 10.0, -10.0, SLOPE_EDGES, ASPECT_EDGES, chunk_rows=64)
+    actual = class_mask(SLOPE_EDGES, ASPECT_EDGES, max_slope, aspect_range)[classes]
+    if aspect_range is None:
+        expected = reference_mask(dem, 10.0, -10.0, max_slope, (400, 400))  # no aspect passes
+    else:
+        expected = terrain_mask(dem, 10.0, -10.0, max_slope, aspect_range)
+    assert np.count_nonzero(actual != expected) == 0
@@ -0,0 +1,50 @@
+"""zonal_means / zonal_mins must give what rasterstats.zonal_stats gives."""
+import numpy as np
+import pytest
+import shapely
+from rasterstats import zonal_stats
+
+from pipeline.zonal import zonal_means, zonal_mins, zonal_sums
+
+
+def _polygons(rng, bounds, n=60):
+    # Non-overlapping Voronoi cells over `bounds`, some running off the raster
+    minx, miny, maxx, maxy = bounds
+    points = shapely.points(rng.uniform(minx, maxx, n), rng.uniform(miny, maxy, n))
+    cells = shapely.get_parts(shapely.voronoi_polygons(shapely.multipoints(points), extend_to=shapely.box(*bounds)))
+    cells = shapely.intersection(cells, shapely.box(*bounds))
+    # Holes and tiny slivers too
+    cells[0] = cells[0].difference(cells[0].centroid.buffer(40))
+    return np.concatenate([cells, [shapely.box(minx + 1, miny + 1, minx + 11, miny + 11)]])
+
+
+# Raster: 500000-503000 x 697000-700000 (100 x 100 px at 30 m); polygons reach 300 m past every edge
+EXTENT = (499700, 696700, 503300, 700300)
+
+
+@pytest.fixture(params=["binary", "nodata"])
+def raster(request, write_raster):
+    rng = np.random.default_rng(1)
+    if request.param == "binary":
+        return write_raster("mask.tif", (rng.random((100, 100)) < 0.7).astype("uint8"))
+    values = rng.uniform(0, 5000, (100, 100)).astype("float32")
+    values[rng.random((100, 100)) < 0.1] = -1
+    return write_raster("distance.tif", values, nodata=-1)
+
+
+@pytest.mark.parametrize("tile_size", [7, 2048])
+def test_matches_rasterstats(raster, tile_size):
+    polygons = _polygons(np.random.default_rng(2), EXTENT)
+    expected = zonal_stats(list(polygons), raster, stats=["mean", "count", "min"])
+
+    means = zonal_means(polygons, raster, tile_size=tile_size)
+    _, counts = zonal_sums(polygons, raster, tile_size=tile_size)
+    mins = zonal_mins(polygons, raster, tile_size=tile_size)
+
+    def column(name):
+        return np.array([np.nan if s[name] is None else s[name] for s in expected], dtype=float)
+
+    np.testing.assert_array_equal(counts, column("count"))
+    # rasterstats sums in the raster's dtype, float32 here
+    np.testing.assert_allclose(means, column("mean"), rtol=1e-6, equal_nan=True)
+    np.testing.assert_allclose(mins, column("min"), rtol=0, equal_nan=True)